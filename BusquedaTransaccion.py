@@ -1,28 +1,91 @@
-import os, json, boto3
+import os, json
 from botocore.exceptions import ClientError
+from utils_bulk import batch_get
+from utils_cache import TTLCache
+from utils_resp import resp
+from utils_ddb import tabla
+from utils_enrich import parse_enrich, enriquecer
 
 TABLE_NAME = os.environ.get("TABLA_TRANSACCION", "TablaTransacciones")
-dynamodb = boto3.resource("dynamodb")
 
-def _resp(code, data):
-    return {
-        "statusCode": code,
-        "headers": {"Content-Type":"application/json","Access-Control-Allow-Origin":"*"},
-        "body": json.dumps(data, default=str)
-    }
+IDS_MAX = int(os.environ.get("BUSQUEDA_IDS_MAX", "500"))
 
-def lambda_handler(event, context):
+# Las transacciones no cambian tras la carga: caché por contenedor (sólo encontradas)
+_cache = TTLCache(int(os.environ.get("CACHE_TX_MAX", "5000")), float(os.environ.get("CACHE_TX_TTL_SEG", "300")))
+
+def _ids_from_event(event):
+    # IDTransaccion=a,b,c en query string o {"ids": [...]} / [...] en el body (POST)
     params = event.get("queryStringParameters") or {}
-    tid = params.get("IDTransaccion")
-    if not tid:
-        return _resp(400, {"ok": False, "msg": "Falta IDTransaccion"})
-    tid = str(tid).strip()
+    raw = []
+    if params.get("IDTransaccion"):
+        raw.extend(str(params["IDTransaccion"]).split(","))
+    body = event.get("body")
+    if body:
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            payload = payload.get("ids") or payload.get("IDTransaccion") or []
+        if not isinstance(payload, list):
+            payload = [payload]
+        raw.extend(str(x) for x in payload)
+    ids = []
+    for x in raw:
+        x = x.strip()
+        if x and x not in ids:
+            ids.append(x)
+    return ids
+
+def lookup(table, ids):
+    # {id: item} para los encontrados, resolviendo primero desde la caché
+    found = {}
+    missing = []
+    for tid in ids:
+        it = _cache.get(tid)
+        if it is None:
+            missing.append(tid)
+        else:
+            found[tid] = it
+    if missing:
+        for it in batch_get(table, [{"IDTransaccion": tid} for tid in missing]):
+            found[it["IDTransaccion"]] = it
+            _cache.put(it["IDTransaccion"], it)
+    return found
 
-    table = dynamodb.Table(TABLE_NAME)
+def lambda_handler(event, context):
+    try:
+        ids = _ids_from_event(event)
+    except Exception as e:
+        return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
     try:
-        r = table.get_item(Key={"IDTransaccion": tid})
-        if "Item" not in r:
-            return _resp(404, {"ok": False, "msg": "Transacción no encontrada", "id": tid, "table": TABLE_NAME})
-        return _resp(200, {"ok": True, "data": r["Item"]})
-    except ClientError as e:
-        return _resp(500, {"ok": False, "msg": e.response.get("Error", {}).get("Message", str(e)), "table": TABLE_NAME})
+        enrich = parse_enrich(event.get("queryStringParameters"))
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+    if not ids:
+        return resp(400, {"ok": False, "msg": "Falta IDTransaccion"}, event)
+    if len(ids) > IDS_MAX:
+        return resp(400, {"ok": False, "msg": f"Máximo {IDS_MAX} IDTransaccion por consulta"}, event)
+    multi = len(ids) > 1 or bool(event.get("body"))
+
+    table = tabla(TABLE_NAME)
+    try:
+        found = lookup(table, ids)
+        if enrich:
+            # copias: los ítems de la caché de transacciones quedan como se leyeron
+            found = {t: dict(it) for t, it in found.items()}
+            enriquecer(list(found.values()))
+    except (ClientError, RuntimeError) as e:
+        msg = e.response.get("Error", {}).get("Message", str(e)) if isinstance(e, ClientError) else str(e)
+        return resp(500, {"ok": False, "msg": msg, "table": TABLE_NAME}, event)
+
+    if not multi:
+        tid = ids[0]
+        if tid not in found:
+            return resp(404, {"ok": False, "msg": "Transacción no encontrada", "id": tid, "table": TABLE_NAME}, event)
+        return resp(200, {"ok": True, "data": found[tid]}, event)
+
+    return resp(200, {
+        "ok": True, "count": len(found),
+        "data": [found[t] for t in ids if t in found],
+        "resultados": [{"id": t, "encontrado": t in found} for t in ids],
+        "faltantes": [t for t in ids if t not in found],
+        "table": TABLE_NAME,
+    }, event)
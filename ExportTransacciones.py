@@ -0,0 +1,225 @@
+import os, io, csv, json, zlib, time, uuid
+import boto3
+from botocore.exceptions import ClientError
+from utils_search import (SEARCH_INDEXES, parse_key, resolve_range, iter_items, parse_filter,
+                          parse_fields, projection_for, trim_fields)
+from utils_campos import STRING_FIELDS, DEC_FIELDS, INT_FIELDS
+from utils_resp import resp, dumps
+from utils_ddb import tabla
+from utils_enrich import parse_enrich, iter_enriquecidos, campos, campos_salida
+import utils_jobs as jobs
+import utils_checkpoint as ckpt
+
+TABLE_NAME = os.environ.get("TABLA_TRANSACCION", "TablaTransacciones")
+EXPORT_BUCKET = os.environ.get("EXPORT_BUCKET", "")
+PART_SIZE = int(os.environ.get("EXPORT_PART_MB", "8")) * 1024 * 1024  # mínimo S3: 5 MB
+TIPO_JOB = "exportacion"  # registro de estado en TABLA_IMPORT_JOBS (ver utils_jobs)
+
+CSV_COLUMNS = (["IDTransaccion","IDCliente","IDComercio","IDTarjeta","IDMoneda","IDCanal","IDEstado",
+                "Fecha","Hora","FechaHoraOrden"] + STRING_FIELDS + DEC_FIELDS + INT_FIELDS + ["FechaCarga"])
+
+class _S3Sink:
+    # Multipart upload: sólo una parte en memoria a la vez
+    def __init__(self, bucket, key):
+        self.s3 = boto3.client("s3")
+        self.bucket, self.key = bucket, key
+        self.upload_id = self.s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        self.parts, self.buf = [], bytearray()
+
+    def write(self, b):
+        self.buf += b
+        if len(self.buf) >= PART_SIZE:
+            self._part()
+
+    def _part(self):
+        n = len(self.parts) + 1
+        r = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                PartNumber=n, Body=bytes(self.buf))
+        self.parts.append({"PartNumber": n, "ETag": r["ETag"]})
+        self.buf = bytearray()
+
+    def close(self):
+        if self.buf or not self.parts:
+            self._part()
+        self.s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                          MultipartUpload={"Parts": self.parts})
+
+    def abort(self):
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+class _FileSink:
+    def __init__(self, path):
+        self.f = open(path, "wb")
+
+    def write(self, b):
+        self.f.write(b)
+
+    def close(self):
+        self.f.close()
+
+    def abort(self):
+        self.f.close()
+
+class _Encoder:
+    # Codifica fila a fila (NDJSON o CSV), con gzip incremental opcional
+    def __init__(self, sink, formato, columns, gz):
+        self.sink, self.formato, self.columns = sink, formato, columns
+        self.z = zlib.compressobj(6, zlib.DEFLATED, 31) if gz else None
+        self.bytes = 0
+        if formato == "csv":
+            self.text = io.StringIO()
+            self.writer = csv.DictWriter(self.text, fieldnames=columns, extrasaction="ignore")
+            self.writer.writeheader()
+            self._emit(self.text.getvalue().encode())
+
+    def _emit(self, b):
+        if self.z is not None:
+            b = self.z.compress(b)
+        if b:
+            self.bytes += len(b)
+            self.sink.write(b)
+
+    def row(self, it):
+        if self.formato == "csv":
+            self.text.seek(0)
+            self.text.truncate()
+            self.writer.writerow(it)
+            self._emit(self.text.getvalue().encode())
+        else:
+            self._emit(dumps(it) + b"\n")
+
+    def close(self):
+        if self.z is not None:
+            tail = self.z.flush()
+            self.bytes += len(tail)
+            self.sink.write(tail)
+
+def _destino(ev, key_name, key, formato, gz, http):
+    # Vía HTTP sólo se escribe en EXPORT_BUCKET con nombre generado;
+    # path/bucket/key explícitos son para invocación directa
+    if ev.get("path") and not http:
+        return ev["path"]
+    bucket = EXPORT_BUCKET if http else (ev.get("bucket") or EXPORT_BUCKET)
+    if not bucket:
+        return None
+    name = (None if http else ev.get("key")) or (f"exports/{key_name}={key}/{time.strftime('%Y%m%dT%H%M%S')}-"
+                             f"{uuid.uuid4().hex[:8]}.{formato}" + (".gz" if gz else ""))
+    return f"s3://{bucket}/{name}"
+
+def _exportar(key_name, key, ini, fin, fields, filter_expr, enrich, formato, gz, destino):
+    # Recorre el rango y escribe el archivo. Devuelve (status, body)
+    index_tries = SEARCH_INDEXES[key_name]
+    t0 = time.time()
+    filas = 0
+    try:
+        if destino.startswith("s3://"):
+            b, _, k = destino[5:].partition("/")
+            sink = _S3Sink(b, k)
+        else:
+            sink = _FileSink(destino)
+    except (ClientError, OSError) as e:
+        return 500, {"ok": False, "msg": str(e), "destino": destino}
+    try:
+        items = iter_items(tabla(TABLE_NAME), index_tries, key, ini, fin,
+                           filter_expr=filter_expr, projection=projection_for(index_tries, campos(fields, enrich)))
+        if enrich:
+            items = iter_enriquecidos(items)
+        fields = campos_salida(fields, enrich)
+        enc = _Encoder(sink, formato, fields or CSV_COLUMNS, gz)
+        for it in items:
+            if fields:
+                it = trim_fields([it], fields)[0]
+            enc.row(it)
+            filas += 1
+        enc.close()
+        sink.close()
+    except Exception as e:
+        sink.abort()
+        msg = e.response.get("Error", {}).get("Message", str(e)) if isinstance(e, ClientError) else str(e)
+        return 500, {"ok": False, "msg": msg, "destino": destino}
+
+    return 200, {"ok": True, "destino": destino, "filas": filas, "bytes": enc.bytes,
+                 "formato": formato, "gzip": gz, "segundos": round(time.time() - t0, 3),
+                 "table": TABLE_NAME}
+
+def _vista(j):
+    # Registro de una exportación asíncrona -> respuesta de /transacciones/exportar/{id}
+    return {"ok": True, "job": j["IDJob"], "estado": j.get("Estado", "PENDIENTE"), "destino": j.get("Destino"),
+            "filas": int(j["Filas"]) if j.get("Filas") is not None else None,
+            "bytes": int(j["Bytes"]) if j.get("Bytes") is not None else None,
+            "creado": float(j["Creado"]) if j.get("Creado") else None,
+            "fin": float(j["Fin"]) if j.get("Fin") else None, "error": j.get("Error")}
+
+def lambda_handler(event, context):
+    # GET /transacciones/exportar/{id}: estado de una exportación asíncrona
+    job_id = (event.get("pathParameters") or {}).get("id")
+    if job_id:
+        j = jobs.estado().get(job_id)
+        if j is None or j.get("Tipo") != TIPO_JOB:
+            return resp(404, {"ok": False, "msg": "Exportación no encontrada", "job": job_id}, event)
+        return resp(200, _vista(j), event)
+
+    # Parámetros en query string (GET) o en el body / evento directo
+    ev = dict(event.get("queryStringParameters") or {})
+    http = "requestContext" in event  # HTTP API v2 omite body/queryStringParameters si vienen vacíos
+    if isinstance(event.get("body"), str) and event["body"]:
+        try:
+            payload = json.loads(event["body"])
+        except Exception as e:
+            return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
+        if not isinstance(payload, dict):
+            return resp(400, {"ok": False, "msg": "Se espera un objeto JSON"}, event)
+        ev.update(payload)
+    elif not http:
+        ev.update(event)
+
+    key_name = next((k for k in SEARCH_INDEXES if ev.get(k) not in (None, "")), None)
+    if key_name is None:
+        return resp(400, {"ok": False, "msg": "Falta IDCliente, IDComercio o IDTarjeta"}, event)
+    formato = str(ev.get("formato") or "ndjson").lower()
+    if formato not in ("ndjson", "csv"):
+        return resp(400, {"ok": False, "msg": "formato debe ser ndjson o csv"}, event)
+    gz = str(ev.get("gzip", "")).lower() in ("1", "true", "si", "sí")
+    try:
+        key = parse_key(ev, key_name)
+        ini, fin = resolve_range(ev)
+        fields = parse_fields(ev)
+        filter_expr = parse_filter(ev)
+        enrich = parse_enrich(ev)
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+
+    if not http and ev.get("job"):
+        # invocación asíncrona lanzada por el POST/GET: destino ya generado
+        jobs.estado().fijar(ev["job"], Estado="EN_CURSO")
+        code, data = _exportar(key_name, key, ini, fin, fields, filter_expr, enrich, formato, gz, ev["destino"])
+        if code == 200:
+            jobs.estado().fijar(ev["job"], Estado="COMPLETO", Filas=data["filas"], Bytes=data["bytes"],
+                                Fin=jobs._ahora())
+        else:
+            jobs.estado().fijar(ev["job"], Estado="ERROR", Error=data["msg"], Fin=jobs._ahora())
+        return resp(code, data, event)
+
+    destino = _destino(ev, key_name, key, formato, gz, http)
+    if not destino:
+        return resp(400, {"ok": False, "msg": "Falta destino: 'path', 'bucket' o EXPORT_BUCKET"}, event)
+
+    if http and ckpt.en_lambda(context):
+        # HTTP API corta la integración a los 30 s: la exportación sigue en una invocación
+        # asíncrona y se responde ya con el destino y dónde consultar el estado
+        job_id = uuid.uuid4().hex
+        ahora = jobs._ahora()
+        jobs.estado().crear({"IDJob": job_id, "Tipo": TIPO_JOB, "Estado": "PENDIENTE", "Destino": destino,
+                             "Creado": ahora, "Expira": int(ahora) + jobs.TTL_DIAS * 86400})
+        payload = {k: v for k, v in ev.items() if k not in ("path", "bucket", "key")}
+        payload.update(job=job_id, destino=destino)
+        try:
+            ckpt.reinvocar(context, payload)
+        except ClientError as e:
+            jobs.estado().fijar(job_id, Estado="ERROR", Error=str(e), Fin=jobs._ahora())
+            return resp(500, {"ok": False, "msg": f"No se pudo iniciar la exportación: {e}", "job": job_id}, event)
+        return resp(202, {"ok": True, "job": job_id, "estado": "PENDIENTE", "destino": destino,
+                          "url": f"/transacciones/exportar/{job_id}"}, event)
+
+    code, data = _exportar(key_name, key, ini, fin, fields, filter_expr, enrich, formato, gz, destino)
+    return resp(code, data, event)
@@ -1,18 +1,17 @@
 import json
 import os
-import boto3
 from decimal import Decimal
 from botocore.exceptions import ClientError
+from utils_bulk import BulkWriter, DETECTAR_CAMBIOS, HASH_ATTR, content_hash, conteos
+from utils_resp import resp
+from utils_ddb import tabla
+from utils_jobs import crear as crear_job
 
 TABLE_DET = os.environ.get("TABLA_COMERCIO", "TablaComercio")
 TABLE_AGR = os.environ.get("TABLA_COMERCIOS_AGREG", "TablaComercios")
 
-ddb = boto3.resource('dynamodb')
-t_det = ddb.Table(TABLE_DET)
-t_agr = ddb.Table(TABLE_AGR)
-
-def _resp(status, body):
-    return {"statusCode": status, "headers": {"content-type": "application/json"}, "body": json.dumps(body, default=str)}
+t_det = tabla(TABLE_DET)
+t_agr = tabla(TABLE_AGR)
 
 def _to_int(x):
     try:
@@ -32,13 +31,74 @@ def _to_dec(x):
         except Exception:
             return None
 
+def escribir(items):
+    # Reparte cada fila entre detalle (TablaComercio) y agregados (TablaComercios).
+    # Devuelve (stats detalle, stats agregados, rechazadas); propaga ClientError.
+    # El detalle omite las filas sin cambios. Los agregados se escriben siempre: comparten
+    # ítems con los contadores ADD de /import/transacciones y el hash no los refleja.
+    rechazadas = 0
+    with BulkWriter(t_det, ["IDComercio"], detect_changes=DETECTAR_CAMBIOS) as bw_det, \
+         BulkWriter(t_agr, ["Tipo","ID"]) as bw_agr:
+
+        for it in items:
+            if not isinstance(it, dict):
+                rechazadas += 1
+                continue
+            it = dict(it)
+
+            # Detección de agregados mensuales (TablaComercios)
+            if all(k in it for k in ("Tipo","ID","Agregado","Grupo")):
+                row = {
+                    "Tipo": _to_int(it.get("Tipo")) or 0,
+                    "ID":   _to_int(it.get("ID")) or 0,
+                    "Agregado": str(it.get("Agregado")).strip(),
+                    "Grupo":    str(it.get("Grupo")).strip(),
+                }
+                for c in ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic",
+                          "Promedio","TotalMonto","TotalFraude","Composicion"]:
+                    dv = _to_dec(it.get(c))
+                    if dv is not None: row[c] = dv
+                bw_agr.put_item(Item=row)
+                continue
+
+            # Detalle de comercios (TablaComercio)
+            idc = it.get("IDComercio") or it.get("ComercioID")
+            if idc is None:
+                rechazadas += 1
+                continue
+            try:
+                idc_int = int(str(idc).strip())
+            except Exception:
+                idc_int = idc  # dejar como string si no es convertible
+
+            row = {k: v for k, v in it.items() if v is not None and v != ""}
+            row["IDComercio"] = idc_int
+            if "ComercioID" not in row:
+                row["ComercioID"] = idc_int
+            if DETECTAR_CAMBIOS:
+                row[HASH_ATTR] = content_hash(row)
+            bw_det.put_item(Item=row)
+    return bw_det.stats, bw_agr.stats, rechazadas
+
+def procesar_lote(items):
+    # Un chunk de un job asíncrono: stats combinadas de ambas tablas
+    det, agr, rechazadas = escribir(items)
+    cd, ca = conteos(det), conteos(agr)
+    return dict({k: det[k] + agr[k] for k in agr}, **{k: cd[k] + ca[k] for k in cd}), rechazadas
+
 def lambda_handler(event, context):
+    params = event.get("queryStringParameters") or {}
     try:
         body = event.get("body")
-        if not body: return _resp(400, {"ok": False, "msg": "Body vacío"})
+        if not body: return resp(400, {"ok": False, "msg": "Body vacío"}, event)
         payload = json.loads(body)
     except Exception as e:
-        return _resp(400, {"ok": False, "msg": f"JSON inválido: {e}"})
+        return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
+
+    # modo=job: se encola y se responde enseguida con el ID (ver /import/jobs/{id})
+    if params.get("modo") == "job" or (isinstance(payload, dict) and payload.get("modo") == "job"):
+        code, data = crear_job("comercios", payload)
+        return resp(code, data, event)
 
     # admitir lista directa o {"data": [...]}
     items = []
@@ -49,51 +109,16 @@ def lambda_handler(event, context):
         if isinstance(items, dict):
             items = [items]
     else:
-        return _resp(400, {"ok": False, "msg": "JSON debe ser lista o {'data': [...]}"})
-
-    ins_det = ins_agr = 0
+        return resp(400, {"ok": False, "msg": "JSON debe ser lista o {'data': [...]}"}, event)
 
     try:
-        with t_det.batch_writer(overwrite_by_pkeys=["IDComercio"]) as bw_det, \
-             t_agr.batch_writer(overwrite_by_pkeys=["Tipo","ID"]) as bw_agr:
-
-            for it in items:
-                if not isinstance(it, dict):
-                    continue
-                it = dict(it)
-
-                # Detección de agregados mensuales (TablaComercios)
-                if all(k in it for k in ("Tipo","ID","Agregado","Grupo")):
-                    row = {
-                        "Tipo": _to_int(it.get("Tipo")) or 0,
-                        "ID":   _to_int(it.get("ID")) or 0,
-                        "Agregado": str(it.get("Agregado")).strip(),
-                        "Grupo":    str(it.get("Grupo")).strip(),
-                    }
-                    for c in ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic",
-                              "Promedio","TotalMonto","TotalFraude","Composicion"]:
-                        dv = _to_dec(it.get(c))
-                        if dv is not None: row[c] = dv
-                    bw_agr.put_item(Item=row); ins_agr += 1
-                    continue
-
-                # Detalle de comercios (TablaComercio)
-                idc = it.get("IDComercio") or it.get("ComercioID")
-                if idc is None:
-                    continue
-                try:
-                    idc_int = int(str(idc).strip())
-                except Exception:
-                    idc_int = idc  # dejar como string si no es convertible
-
-                row = {k: v for k, v in it.items() if v is not None and v != ""}
-                row["IDComercio"] = idc_int
-                if "ComercioID" not in row:
-                    row["ComercioID"] = idc_int
-                bw_det.put_item(Item=row); ins_det += 1
-
+        det, agr, rechazadas = escribir(items)
     except ClientError as e:
-        return _resp(500, {"ok": False, "msg": e.response["Error"]["Message"]})
+        return resp(500, {"ok": False, "msg": e.response["Error"]["Message"]}, event)
 
-    return _resp(200, {"ok": True, "insertados_detalle": ins_det, "insertados_agregados": ins_agr,
-                       "tabla_detalle": TABLE_DET, "tabla_agregados": TABLE_AGR})
\ No newline at end of file
+    cd = conteos(det)
+    return resp(200, {"ok": True, "insertados_detalle": cd["insertados"], "actualizados_detalle": cd["actualizados"],
+                      "sin_cambios_detalle": cd["sin_cambios"], "insertados_agregados": agr["escritos"],
+                      "rechazados": rechazadas,
+                      "escritura": {"detalle": det, "agregados": agr},
+                      "tabla_detalle": TABLE_DET, "tabla_agregados": TABLE_AGR}, event)
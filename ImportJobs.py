@@ -0,0 +1,13 @@
+from utils_jobs import estado, vista
+from utils_resp import resp
+
+def lambda_handler(event, context):
+    # GET /import/jobs/{id}: progreso y contadores de un job asíncrono
+    job_id = (event.get("pathParameters") or {}).get("id") or \
+             (event.get("queryStringParameters") or {}).get("id")
+    if not job_id:
+        return resp(400, {"ok": False, "msg": "Falta id"}, event)
+    j = estado().get(job_id)
+    if j is None:
+        return resp(404, {"ok": False, "msg": "Job no encontrado", "job": job_id}, event)
+    return resp(200, vista(j), event)
@@ -0,0 +1,109 @@
+import os, json
+import utils_jobs as jobs
+import utils_checkpoint as ckpt
+from utils_bulk import conteos
+import ImportTransacciones
+import ImportComercios
+
+# Consumidor de la cola de jobs (SQS con ReportBatchItemFailures, o LocalCola).
+# Mensajes: {"job", "tipo", "chunk", "ref"} = un chunk guardado, o
+# {"job", "tipo", "dividir": origen, "formato"} = objeto a partir en chunks.
+MAX_INTENTOS = int(os.environ.get("JOBS_MAX_INTENTOS", "5"))  # < maxReceiveCount de la cola
+MARGEN_MS    = int(os.environ.get("JOBS_MARGEN_MS", "30000"))  # al dividir: tiempo reservado antes del timeout
+
+PROCESADORES = {
+    "transacciones": ImportTransacciones.procesar_lote,
+    "comercios": ImportComercios.procesar_lote,
+}
+
+def _checkpoint_uri(job_id):
+    # Junto a los chunks del job. Sin JOBS_BUCKET (cola local, en proceso) no hay
+    # reentregas ni timeouts que retomar
+    return f"s3://{jobs.BUCKET}/{jobs.PREFIJO}{job_id}/dividir" if jobs.BUCKET else None
+
+def _dividir(msg, context=None):
+    # Recorre el objeto en streaming y encola sus chunks. Cada tanda encolada queda
+    # en un checkpoint (filas y chunks): una reentrega, o el mensaje que continúa
+    # cuando se acaba el tiempo de la invocación, retoma desde ahí con los mismos
+    # números de chunk, que no se cuentan dos veces
+    from ImportTransaccionesArchivo import iter_rows, _formato
+    src = msg["dividir"]
+    formato = _formato(src, msg)
+    job_id, tipo = msg["job"], msg["tipo"]
+    uri = _checkpoint_uri(job_id)
+    ck = (ckpt.cargar(uri) if uri else None) or {"filas": 0, "chunks": 0}
+    saltar = filas = ck["filas"]
+    n = ck["chunks"]
+    buf, pendientes = [], []
+
+    def enviar():
+        jobs.cola().enviar(pendientes[:])
+        pendientes.clear()
+        if uri:
+            ckpt.guardar(uri, {"filas": filas, "chunks": n})
+
+    def cortar():
+        nonlocal n
+        ref = jobs.payloads().put(job_id, n, buf)
+        pendientes.append({"job": job_id, "tipo": tipo, "chunk": n, "ref": ref})
+        n += 1
+        buf.clear()
+        if len(pendientes) >= 10:
+            enviar()
+
+    for i, row in enumerate(iter_rows(src, formato)):
+        if i < saltar:
+            continue
+        buf.append(row)
+        filas += 1
+        if len(buf) >= jobs.CHUNK_FILAS:
+            cortar()
+            if uri and not pendientes and ckpt.remaining_ms(context) < MARGEN_MS:
+                # recién guardado el checkpoint: sigue otro mensaje antes del timeout
+                jobs.cola().enviar([msg])
+                return
+    if buf:
+        cortar()
+    if pendientes:
+        enviar()
+    jobs.fijar_chunks(job_id, n, filas)
+    if uri:
+        ckpt.borrar(uri)
+
+def procesar(msg, ultimo_intento=True, context=None):
+    # Procesa un mensaje; las fallas se propagan para que la cola lo reintente,
+    # salvo en el último intento, donde el chunk queda contado como error
+    if "dividir" in msg:
+        try:
+            return _dividir(msg, context)
+        except Exception as e:
+            if not ultimo_intento:
+                raise
+            jobs.estado().fijar(msg["job"], Estado="ERROR", Error=f"dividir: {e}", Fin=jobs._ahora())
+            return
+    t0 = jobs._ahora()
+    try:
+        stats, rechazadas = PROCESADORES[msg["tipo"]](jobs.payloads().get(msg["ref"]))
+    except Exception as e:
+        if not ultimo_intento:
+            raise
+        jobs.registrar(msg["job"], msg["chunk"], {"ChunksError": 1}, t0, Error=f"chunk {msg['chunk']}: {e}")
+        return
+    c = conteos(stats)
+    jobs.registrar(msg["job"], msg["chunk"], {
+        "ChunksOk": 1, "Insertados": c["insertados"], "Actualizados": c["actualizados"],
+        "SinCambios": c["sin_cambios"], "Rechazados": rechazadas,
+        "Reintentados": stats["reintentados"], "Throttled": stats["throttled"],
+        "Descartados": stats["descartados"],
+    }, t0)
+    jobs.payloads().delete(msg["ref"])
+
+def lambda_handler(event, context):
+    fallidos = []
+    for rec in event.get("Records", []):
+        intento = int(rec.get("attributes", {}).get("ApproximateReceiveCount", "1"))
+        try:
+            procesar(json.loads(rec["body"]), ultimo_intento=intento >= MAX_INTENTOS, context=context)
+        except Exception:
+            fallidos.append({"itemIdentifier": rec["messageId"]})
+    return {"batchItemFailures": fallidos}
@@ -1,20 +1,30 @@
 import json
 import os
-from datetime import datetime, timezone
-import boto3
+from datetime import datetime, timezone, date, time as dt_time
+from functools import lru_cache
 from decimal import Decimal
 from botocore.exceptions import ClientError
+from utils_agregados import MESES, add_counter, apply_counter_sets
+from utils_bulk import BulkWriter, DETECTAR_CAMBIOS, HASH_ATTR, content_hash, conteos
+from utils_resp import resp
+from utils_ddb import tabla
+from utils_shards import HOT, shard_key
+from utils_jobs import crear as crear_job
+from utils_enrich import CAMPOS_COMERCIO
+from utils_campos import STRING_FIELDS, DEC_FIELDS, INT_FIELDS
+from utils_velocidad import TABLE_VEL, acumular as _acum_tarjeta
 
 TABLE_NAME = os.environ.get("TABLA_TRANSACCION", "TablaTransaccion")
-ddb = boto3.resource('dynamodb')
-table = ddb.Table(TABLE_NAME)
-
-def _resp(status, body):
-    return {
-        "statusCode": status,
-        "headers": {"content-type": "application/json"},
-        "body": json.dumps(body, default=str)
-    }
+TABLE_AGR  = os.environ.get("TABLA_COMERCIOS_AGREG", "TablaComercios")
+AGREGADOS_EN_IMPORT = os.environ.get("AGREGADOS_EN_IMPORT", "1") == "1"
+VELOCIDAD_EN_IMPORT = os.environ.get("VELOCIDAD_EN_IMPORT", "1") == "1"
+# 1 = no escribir los espejos legacy (ClienteID/ComercioID/TarjetaID, FechaHoraISO)
+SOLO_ESQUEMA_NUEVO = os.environ.get("SOLO_ESQUEMA_NUEVO", "0") == "1"
+# 0 = no copiar NombreComercio/Sector en cada transacción (se leen con enrich=comercio)
+DENORMALIZAR_COMERCIO = os.environ.get("DENORMALIZAR_COMERCIO", "1") == "1"
+table = tabla(TABLE_NAME)
+t_agr = tabla(TABLE_AGR)
+t_vel = tabla(TABLE_VEL)
 
 def _to_int_or_none(x):
     try:
@@ -48,113 +58,345 @@ def _parse_dt(fecha:str, hora:str):
             raise ValueError(f"Fecha/Hora inválidas: {fecha} {hora}")
     return dt.replace(tzinfo=timezone.utc)
 
-def _fmt_hash(fecha, hora): return _parse_dt(fecha, hora).strftime("%Y-%m-%d#%H:%M:%S")
-def _fmt_iso (fecha, hora): return _parse_dt(fecha, hora).strftime("%Y-%m-%dT%H:%M:%S")
+# Agregados mensuales por comercio en TablaComercios: Tipo = año, ID = IDComercio
+AGREG_COMERCIO = "Comercio"
+
+# Lo que se lee de cada fila existente para restarla (además de clave y hash)
+_PREVIOS = ["IDComercio", "IDTarjeta", "FechaHoraOrden", "Monto", "Fraude"]
+# Metadatos de carga que no cuentan como cambio de contenido
+_SIN_HASH = ("FechaCarga",)
+
+def _acum_comercio(acc, row, signo=1):
+    if row.get("IDComercio") is None:
+        return
+    monto = (row.get("Monto") or Decimal(0)) * signo
+    f = row["FechaHoraOrden"]
+    mes = MESES[int(f[5:7]) - 1]
+    add_counter(acc, (AGREG_COMERCIO, int(f[:4]), row["IDComercio"]),
+                {mes: monto, "TotalMonto": monto, "TotalFraude": signo if row.get("Fraude") else 0,
+                 "Cantidad": signo},
+                {"Agregado": AGREG_COMERCIO, "Grupo": row.get("NombreComercio") or str(row["IDComercio"])})
+
+# HASH_ATTR de una fila escrita cuyos contadores no se pudieron aplicar: PENDIENTE + JSON
+# con, por cada familia pendiente (C = comercio, T = tarjeta), la versión de la fila que
+# esos contadores todavía reflejan (null = ninguna). No coincide con ningún hash: la
+# próxima importación reescribe la fila, resta esa versión y suma la nueva.
+PENDIENTE = "~"
+FAMILIAS = (("C",) if AGREGADOS_EN_IMPORT else ()) + (("T",) if VELOCIDAD_EN_IMPORT else ())
+
+def _acum(fam, acc, row, signo=1):
+    if fam == "C":
+        _acum_comercio(acc, row, signo)
+    else:
+        _acum_tarjeta(acc, row, ("Tarjeta",), signo)
+
+def _clave(fam, row):
+    # Clave del acumulador a la que aporta la fila (la que arman _acum_comercio / acumular)
+    f = row.get("FechaHoraOrden")
+    if fam == "C":
+        return (AGREG_COMERCIO, int(f[:4]), row["IDComercio"]) if f and row.get("IDComercio") is not None else None
+    return ("Tarjeta", row["IDTarjeta"], f[:10]) if f and row.get("IDTarjeta") is not None else None
+
+def _contado(prev):
+    # Versión de una fila guardada que refleja cada familia de contadores
+    h = prev.get(HASH_ATTR)
+    if not (isinstance(h, str) and h.startswith(PENDIENTE)):
+        return {fam: prev for fam in FAMILIAS}
+    marca = json.loads(h[len(PENDIENTE):])
+    out = {}
+    for fam in FAMILIAS:
+        v = marca[fam] if fam in marca else prev
+        if v is not None and v is not prev and v.get("Monto") is not None:
+            v = dict(v, Monto=Decimal(v["Monto"]))
+        out[fam] = v
+    return out
+
+def _version(row):
+    # Lo que se guarda de una versión en la marca PENDIENTE (enteros de DynamoDB como int)
+    return {k: int(row[k]) if k in _ENTEROS and isinstance(row[k], Decimal) else
+            str(row[k]) if isinstance(row[k], Decimal) else row[k]
+            for k in _PREVIOS if row.get(k) is not None}
+
+class Contadores:
+    # Contadores de las filas confirmadas, hasta aplicarlos: agregados por comercio/año y
+    # velocidad por tarjeta/día. Conserva esas filas (y la versión que reemplazaron) para
+    # marcarlas con PENDIENTE si no se pueden aplicar.
+    def __init__(self):
+        self.acc = {}
+        self.filas = {}    # IDTransaccion -> fila confirmada
+        self.contado = {}  # IDTransaccion -> {familia: versión restada}
+        self.aplicados = 0   # UpdateItem de contadores
+        self.pendientes = 0  # filas marcadas con PENDIENTE
+
+    def on_written(self, rows):
+        for r in rows:
+            self.filas[r["IDTransaccion"]] = r
+            for fam in FAMILIAS:
+                _acum(fam, self.acc, r)
+
+    def on_replaced(self, rows):
+        # Versión anterior de las filas reemplazadas: se resta de los mismos contadores
+        # que suma on_written, así reimportar una fila modificada no la cuenta dos veces
+        for r in rows:
+            contado = self.contado[r["IDTransaccion"]] = _contado(r)
+            for fam, v in contado.items():
+                if v is not None and v.get("FechaHoraOrden"):  # ítem legacy sin migrar: no se ubica
+                    _acum(fam, self.acc, v, -1)
+
+    def aplicar(self):
+        # Un UpdateItem ADD por clave en la tabla que corresponde.
+        # Si alguno falla, las filas que aportaban a las claves sin aplicar se reescriben
+        # con PENDIENTE y se propaga el ClientError. Una clave partida en varios UpdateItem
+        # (MAX_ADDS) que falla a medias se vuelve a sumar entera.
+        com, tar = {}, {}
+        for k, slot in self.acc.items():
+            (com if k[0] == AGREG_COMERCIO else tar)[k[1:]] = slot
+        filas, contado = self.filas, self.contado
+        self.acc, self.filas, self.contado = {}, {}, {}
+        try:
+            self.aplicados += apply_counter_sets([(t_agr, com, lambda k: {"Tipo": k[0], "ID": k[1]}),
+                                                  (t_vel, tar, lambda k: {"IDTarjeta": k[0], "Dia": k[1]})])
+        except ClientError:
+            sin_aplicar = {(AGREG_COMERCIO,) + k for k in com} | {("Tarjeta",) + k for k in tar}
+            self._marcar(filas, contado, sin_aplicar)
+            raise
+
+    def _marcar(self, filas, contado, sin_aplicar):
+        marcadas = []
+        for tid, row in filas.items():
+            versiones = contado.get(tid) or dict.fromkeys(FAMILIAS)
+            marca = {fam: (None if v is None else _version(v)) for fam, v in versiones.items()
+                     if _clave(fam, row) in sin_aplicar or (v is not None and _clave(fam, v) in sin_aplicar)}
+            if marca:
+                marcadas.append(dict(row, **{HASH_ATTR: PENDIENTE + json.dumps(marca, separators=(",", ":"))}))
+        if not marcadas or not DETECTAR_CAMBIOS:
+            return  # sin detección de cambios, reintentar ya reescribe y suma todo
+        try:
+            with BulkWriter(table, ["IDTransaccion"]) as bw:
+                for row in marcadas:
+                    bw.put_item(Item=row)
+            self.pendientes += bw.stats["escritos"]
+        except ClientError:
+            pass  # la marca es lo único que permite recuperarlos: sin ella quedan sin contar
 
-STRING_FIELDS = [
-    "CodigoAutorizacion","Estado","Canal","CodigoMoneda",
-    "NombreComercio","Sector","Producto",
-    "NombreCompleto","DNI","telefono","email","Tarjeta"
-]
-DEC_FIELDS = ["MontoBruto","TasaCambio","Monto"]
-INT_FIELDS = ["IndicadorAprobada","LatenciaAutorizacionMs","Fraude"]
+def writer(cont, **kw):
+    # BulkWriter de TablaTransaccion: contadores de lo confirmado en cont (Contadores) y,
+    # con IMPORT_DETECTAR_CAMBIOS=1, sin reescribir las filas que no cambiaron
+    return BulkWriter(table, ["IDTransaccion"], on_written=cont.on_written if FAMILIAS else None,
+                      detect_changes=DETECTAR_CAMBIOS, prev_attrs=_PREVIOS,
+                      on_replaced=cont.on_replaced if FAMILIAS else None, **kw)
+
+# Esquema declarativo: (campo, tipo, alias legacy de entrada, atributo espejo)
+SCHEMA = (
+    [("IDCliente", "int", "ClienteID", "ClienteID"),
+     ("IDComercio", "int", "ComercioID", "ComercioID"),
+     ("IDTarjeta", "int", "TarjetaID", "TarjetaID"),
+     ("IDMoneda", "int", None, None),
+     ("IDCanal", "int", None, None),
+     ("IDEstado", "int", None, None)]
+    + [(k, "str", None, None) for k in STRING_FIELDS]
+    + [(k, "dec", None, None) for k in DEC_FIELDS]
+    + [(k, "int", None, None) for k in INT_FIELDS]
+)
+if SOLO_ESQUEMA_NUEVO:
+    # los alias legacy se siguen aceptando en la entrada; sólo deja de escribirse el espejo
+    SCHEMA = [(f, t, alias, None) for f, t, alias, _ in SCHEMA]
+if not DENORMALIZAR_COMERCIO:
+    SCHEMA = [s for s in SCHEMA if s[0] not in CAMPOS_COMERCIO]
+REQUIRED = ("IDTransaccion", "IDCliente", "IDComercio", "Fecha", "Hora")
+_NULLS = frozenset(("", "NULL", "null"))
+
+def _fast_int(x):
+    t = type(x)
+    if t is int:
+        return x
+    if t is str:
+        if x in _NULLS:
+            return None
+        try:
+            return int(x)  # int() ya ignora espacios alrededor
+        except ValueError:
+            return None
+    return _to_int_or_none(x)
+
+def _fast_dec(x):
+    if type(x) is str:
+        if x in _NULLS:
+            return None
+        try:
+            return Decimal(x)
+        except ArithmeticError:
+            pass  # "1,234.50", "1 234" ... -> camino lento
+    elif type(x) is int:
+        return Decimal(x)
+    return _to_dec_or_none(x)
+
+def _fast_str(x):
+    return x.strip() if type(x) is str else str(x).strip()
+
+_CONV = {"int": _fast_int, "dec": _fast_dec, "str": _fast_str}
+
+def _compile(schema):
+    # Plan de conversión armado una sola vez: (campo, alias, conversor, espejo, es_str)
+    return [(f, alias, _CONV[t], mirror, t == "str") for f, t, alias, mirror in schema]
+
+_PLAN = _compile(SCHEMA)
+
+@lru_cache(maxsize=8192)
+def _fecha_norm(fecha):
+    try:
+        return date.fromisoformat(fecha).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=100000)
+def _hora_norm(hora):
+    try:
+        return dt_time.fromisoformat(hora).strftime("%H:%M:%S")
+    except ValueError:
+        return None
+
+def _fecha_hora(fecha, hora):
+    # Cada Fecha/Hora distinta se parsea una vez; formatos no ISO van por _parse_dt
+    f, h = _fecha_norm(fecha), _hora_norm(hora)
+    if f is None or h is None:
+        dt = _parse_dt(fecha, hora)
+        return dt.strftime("%Y-%m-%d#%H:%M:%S"), dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{f}#{h}", f"{f}T{h}"
+
+@lru_cache(maxsize=4096)
+def _fecha_carga(s):
+    # Suele repetirse en todo el archivo: se convierte una vez por valor
+    try:
+        if " " in s and "T" not in s:
+            dt = datetime.strptime(s, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            return dt.strftime("%Y-%m-%dT%H:%M:%S%z")
+        return s
+    except Exception:
+        return s
+
+def normalize_row(it):
+    # Fila cruda (JSON/CSV) -> ítem de TablaTransaccion; None si faltan requeridos
+    tid = it["IDTransaccion"] if "IDTransaccion" in it else it.get("TransaccionID")
+    if tid in (None, ""):
+        return None
+    clean = {"IDTransaccion": str(tid)}
+    for f, alias, conv, mirror, is_str in _PLAN:
+        v = it.get(f)
+        if v is None and alias is not None and f not in it:
+            v = it.get(alias)
+        if v is None or v == "":
+            if f in REQUIRED:
+                # omitimos fila incompleta
+                return None
+            continue
+        v = conv(v)
+        if v is not None:
+            clean[f] = v
+            if mirror:
+                clean[mirror] = v
+    fecha, hora = it.get("Fecha"), it.get("Hora")
+    if fecha in (None, "") or hora in (None, ""):
+        return None
+
+    # Fecha/Hora y derivados
+    clean["Fecha"] = fecha = str(fecha)
+    clean["Hora"]  = hora = str(hora)
+    clean["FechaHoraOrden"], iso = _fecha_hora(fecha, hora)
+    if not SOLO_ESQUEMA_NUEVO:
+        clean["FechaHoraISO"] = iso
+
+    # FechaCarga opcional
+    fc = it.get("FechaCarga")
+    if fc:
+        clean["FechaCarga"] = _fecha_carga(str(fc))
+
+    # Comercios hot: clave repartida para GSI_IDComercioShard_Fecha
+    if HOT and clean.get("IDComercio") in HOT:
+        clean["IDComercioShard"] = shard_key(clean["IDComercio"], clean["IDTransaccion"])
+
+    if DETECTAR_CAMBIOS:
+        clean[HASH_ATTR] = content_hash(clean, _SIN_HASH)
+    return clean
+
+# Atributos enteros (y sus espejos): DynamoDB los devuelve como Decimal
+_ENTEROS = frozenset(a for f, t, _alias, mirror in SCHEMA if t == "int" for a in (f, mirror) if a)
+
+def hash_guardado(item):
+    # HASH_ATTR de un ítem leído de la tabla, con los tipos de normalize_row. Un
+    # decimal importado como "12.50" vuelve como 12.5: no coincide y la próxima
+    # importación reescribe la fila, como con cualquier cambio
+    fila = {k: int(v) if k in _ENTEROS and isinstance(v, Decimal) else v for k, v in item.items()}
+    return content_hash(fila, _SIN_HASH)
+
+def normalize_batch(items):
+    # Normaliza un lote completo en una pasada; devuelve (filas, rechazadas)
+    rows, rejected = [], 0
+    for it in items:
+        try:
+            row = normalize_row(it) if isinstance(it, dict) else None
+        except ValueError:
+            row = None  # Fecha/Hora inválidas: se rechaza la fila, no el lote
+        if row is None:
+            rejected += 1
+        else:
+            rows.append(row)
+    return rows, rejected
+
+def importar(items):
+    # Normaliza, escribe y aplica los contadores de un lote. Devuelve (stats de escritura,
+    # rechazadas, Contadores, ClientError | None). Los contadores de lo ya
+    # confirmado se aplican aunque la escritura falle a mitad: al reintentar, esas filas
+    # no cambiaron y no se volverían a sumar.
+    cont = Contadores()
+    bw = writer(cont)
+    rejected = 0
+    error = None
+    try:
+        with bw:
+            rows, rejected = normalize_batch(items)
+            for row in rows:
+                bw.put_item(Item=row)
+    except ClientError as e:
+        error = e
+    finally:
+        try:
+            cont.aplicar()
+        except ClientError as e:
+            error = error or e
+    return bw.stats, rejected, cont, error
+
+def procesar_lote(items):
+    # Un chunk de un job asíncrono: mismo flujo que el POST síncrono
+    stats, rejected, _, error = importar(items)
+    if error is not None:
+        raise error
+    return stats, rejected
 
 def lambda_handler(event, context):
+    params = event.get("queryStringParameters") or {}
     try:
         body = event.get("body")
         if not body:
-            return _resp(400, {"ok": False, "msg": "Body vacío"})
-        items = json.loads(body)
+            return resp(400, {"ok": False, "msg": "Body vacío"}, event)
+        items = payload = json.loads(body)
         if isinstance(items, dict):
             items = items.get("data", [items])
         if not isinstance(items, list):
-            return _resp(400, {"ok": False, "msg": "Se espera una lista o {'data': [...]}"})
+            return resp(400, {"ok": False, "msg": "Se espera una lista o {'data': [...]}"}, event)
     except Exception as e:
-        return _resp(400, {"ok": False, "msg": f"JSON inválido: {e}"})
+        return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
 
-    inserted = 0
-    try:
-        with table.batch_writer(overwrite_by_pkeys=["IDTransaccion"]) as bw:
-            for it in items:
-                if not isinstance(it, dict):
-                    continue
-                it = dict(it)
-
-                # Normalización nombres nuevos y legacy
-                it.setdefault("IDTransaccion", it.get("TransaccionID"))
-                it.setdefault("IDCliente", it.get("ClienteID"))
-                it.setdefault("IDComercio", it.get("ComercioID"))
-                it.setdefault("IDTarjeta", it.get("TarjetaID"))
-
-                # Requeridos mínimos
-                required = ("IDTransaccion", "IDCliente", "IDComercio", "Fecha", "Hora")
-                if not all(k in it and it[k] not in (None, "") for k in required):
-                    # omitimos fila incompleta
-                    continue
-
-                clean = {}
-
-                # PK
-                clean["IDTransaccion"] = str(it["IDTransaccion"])
-
-                # IDs (enteros) + espejos legacy
-                clean["IDCliente"]  = _to_int_or_none(it.get("IDCliente"))
-                clean["IDComercio"] = _to_int_or_none(it.get("IDComercio"))
-                if clean["IDCliente"] is not None:
-                    clean["ClienteID"] = clean["IDCliente"]
-                if clean["IDComercio"] is not None:
-                    clean["ComercioID"] = clean["IDComercio"]
-
-                idt = _to_int_or_none(it.get("IDTarjeta"))
-                if idt is not None:
-                    clean["IDTarjeta"] = idt
-                    clean["TarjetaID"] = idt
-
-                # IDs opcionales
-                for k in ("IDMoneda","IDCanal","IDEstado"):
-                    v = _to_int_or_none(it.get(k))
-                    if v is not None:
-                        clean[k] = v
-
-                # Strings descriptivos
-                for k in STRING_FIELDS:
-                    v = it.get(k)
-                    if v not in (None, ""):
-                        clean[k] = str(v).strip()
-
-                # Montos y números
-                for k in DEC_FIELDS:
-                    dv = _to_dec_or_none(it.get(k))
-                    if dv is not None:
-                        clean[k] = dv
-                for k in INT_FIELDS:
-                    iv = _to_int_or_none(it.get(k))
-                    if iv is not None:
-                        clean[k] = iv
-
-                # Fecha/Hora y derivados
-                clean["Fecha"] = str(it["Fecha"])
-                clean["Hora"]  = str(it["Hora"])
-                clean["FechaHoraOrden"] = _fmt_hash(clean["Fecha"], clean["Hora"])
-                clean["FechaHoraISO"]   = _fmt_iso (clean["Fecha"], clean["Hora"])
-
-                # FechaCarga opcional
-                fc = it.get("FechaCarga")
-                if fc:
-                    try:
-                        s = str(fc)
-                        if " " in s and "T" not in s:
-                            dt = datetime.strptime(s, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-                            clean["FechaCarga"] = dt.strftime("%Y-%m-%dT%H:%M:%S%z")
-                        else:
-                            clean["FechaCarga"] = s
-                    except Exception:
-                        clean["FechaCarga"] = str(fc)
-
-                # Escribir
-                bw.put_item(Item={k: v for k, v in clean.items() if v is not None})
-                inserted += 1
-    except ClientError as e:
-        return _resp(500, {"ok": False, "msg": e.response["Error"]["Message"]})
+    # modo=job: se encola y se responde enseguida con el ID (ver /import/jobs/{id})
+    if params.get("modo") == "job" or (isinstance(payload, dict) and payload.get("modo") == "job"):
+        code, data = crear_job("transacciones", payload)
+        return resp(code, data, event)
 
-    return _resp(200, {"ok": True, "insertados": inserted, "tabla": TABLE_NAME})
\ No newline at end of file
+    # Un UpdateItem ADD por comercio/año y por tarjeta/día con todo lo cargado en este lote
+    stats, rejected, cont, error = importar(items)
+    c = dict(conteos(stats), rechazados=rejected, agregados_actualizados=cont.aplicados)
+    if error is not None:
+        # lo confirmado ya tiene sus contadores (o quedó marcado para sumarlos al reintentar)
+        return resp(500, {"ok": False, "msg": error.response["Error"]["Message"], **c,
+                          "contadores_pendientes": cont.pendientes, "escritura": stats}, event)
+    return resp(200, {"ok": True, **c, "escritura": stats, "tabla": TABLE_NAME}, event)
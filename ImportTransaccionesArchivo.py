@@ -0,0 +1,145 @@
+import os, io, csv, json, gzip, time
+from botocore.exceptions import ClientError
+from utils_bulk import BATCH, WORKERS, conteos
+from utils_resp import resp
+from utils_jobs import origen
+import utils_checkpoint as ckpt
+import ImportTransacciones as imp
+
+# Importación en streaming desde S3 o archivo local (NDJSON o CSV, opcionalmente .gz).
+# Evento: {"bucket": "...", "key": "..."} | {"path": "..."} [+ "formato": "ndjson"|"csv"]
+CHECKPOINT_FILAS = int(os.environ.get("IMPORT_CHECKPOINT_FILAS", "5000"))
+MARGEN_MS        = int(os.environ.get("IMPORT_MARGEN_MS", "20000"))
+AUTO_REINVOCAR   = os.environ.get("IMPORT_AUTO_REINVOCAR", "1") == "1"
+
+def _source(ev, http):
+    # ValueError si el origen no está permitido (ver utils_jobs.origen)
+    rec = (ev.get("Records") or [{}])[0].get("s3")
+    if rec and not http:  # notificación de S3
+        return f"s3://{rec['bucket']['name']}/{rec['object']['key']}"
+    return origen(ev, http)
+
+def _open_binary(src):
+    if src.startswith("s3://"):
+        b, k = ckpt.split_s3(src)
+        return ckpt.s3().get_object(Bucket=b, Key=k)["Body"]
+    return open(src, "rb")
+
+def _formato(src, ev):
+    f = (ev.get("formato") or "").lower()
+    if f:
+        return f
+    base = src[:-3] if src.endswith(".gz") else src
+    return "csv" if base.lower().endswith(".csv") else "ndjson"
+
+def iter_rows(src, formato):
+    # Decodifica fila a fila; nunca materializa el archivo completo
+    raw = _open_binary(src)
+    try:
+        stream = gzip.GzipFile(fileobj=raw) if src.endswith(".gz") else raw
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        if formato == "csv":
+            for row in csv.DictReader(text):
+                yield row
+        else:
+            for line in text:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None  # línea mal formada: se cuenta como rechazada
+    finally:
+        raw.close()
+
+def lambda_handler(event, context):
+    ev = event
+    http = "requestContext" in event  # HTTP API v2 omite body/queryStringParameters si vienen vacíos
+    if isinstance(event.get("body"), str):
+        try:
+            ev = json.loads(event["body"])
+        except Exception as e:
+            return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
+    elif http:
+        ev = {}
+    if not isinstance(ev, dict):
+        return resp(400, {"ok": False, "msg": "Se espera un objeto JSON"}, event)
+    try:
+        src = _source(ev, http)
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+    if not src:
+        return resp(400, {"ok": False, "msg": "Falta 'key'" if http else "Falta 'path' o 'bucket'/'key'"}, event)
+    formato = _formato(src, ev)
+    if formato not in ("ndjson", "csv"):
+        return resp(400, {"ok": False, "msg": "formato debe ser ndjson o csv"}, event)
+
+    # Checkpoint: filas ya confirmadas, guardado junto al origen (<origen>.checkpoint.json)
+    ck = (None if ev.get("reiniciar") else ckpt.cargar(src)) or {"filas": 0, "insertados": 0, "rechazados": 0}
+    saltar = ck["filas"]
+    leidas = rechazadas = 0
+    cont = imp.Contadores()
+    t0 = time.time()
+    completo = True
+
+    def totales(bw):
+        # Acumulado del archivo: invocaciones anteriores (checkpoint) + esta
+        return dict({k: ck.get(k, 0) + v for k, v in conteos(bw.stats).items()},
+                    rechazados=ck["rechazados"] + rechazadas)
+
+    def checkpoint(bw):
+        # Sólo avanza el checkpoint con las filas ya confirmadas en DynamoDB
+        bw.sync()
+        cont.aplicar()
+        ckpt.guardar(src, dict(totales(bw), filas=saltar + leidas))
+
+    # la detección de cambios lee el hash guardado por ventana de flush_size filas
+    bw = imp.writer(cont, flush_size=BATCH * WORKERS * 4)
+    error = None
+    try:
+        with bw:
+            for n, raw in enumerate(iter_rows(src, formato)):
+                if n < saltar:
+                    continue
+                leidas += 1
+                try:
+                    row = imp.normalize_row(raw) if isinstance(raw, dict) else None
+                except ValueError:
+                    row = None
+                if row is None:
+                    rechazadas += 1
+                else:
+                    bw.put_item(Item=row)
+                if leidas % CHECKPOINT_FILAS == 0:
+                    checkpoint(bw)
+                    if ckpt.remaining_ms(context) < MARGEN_MS:
+                        completo = False
+                        break
+            checkpoint(bw)
+    except ClientError as e:
+        error = e.response["Error"]["Message"]
+    except OSError as e:  # origen local inexistente, checkpoint no escribible
+        error = str(e)
+    finally:
+        # contadores de lo confirmado desde el último checkpoint: al retomar desde él,
+        # esas filas no cambiaron y no se volverían a sumar
+        try:
+            cont.aplicar()
+        except ClientError as e:
+            error = error or e.response["Error"]["Message"]
+    if error is not None:
+        return resp(500, {"ok": False, "msg": error, "origen": src, **totales(bw),
+                          "contadores_pendientes": cont.pendientes, "escritura": bw.stats}, event)
+
+    if completo:
+        ckpt.borrar(src)
+    elif AUTO_REINVOCAR:
+        ckpt.reinvocar(context, {k: v for k, v in ev.items() if k != "reiniciar"})
+
+    dur = max(time.time() - t0, 1e-6)
+    return resp(200, {
+        "ok": True, "completo": completo, "origen": src, "formato": formato,
+        "filas_procesadas": saltar + leidas, **totales(bw),
+        "filas_por_seg": round(leidas / dur, 1),
+        "escritura": bw.stats, "tabla": imp.TABLE_NAME,
+    }, event)
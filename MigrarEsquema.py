@@ -0,0 +1,213 @@
+import os, json, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from utils_bulk import Budget, sleep_backoff, HASH_ATTR, MAX_INTENTOS
+from utils_ddb import tabla
+from utils_metrics import llamar, THROTTLE_CODES
+from utils_resp import resp
+from utils_shards import HOT, shard_key
+from ImportTransacciones import hash_guardado, PENDIENTE
+import utils_checkpoint as ckpt
+
+# Migración de TablaTransaccion al esquema compacto: Scan paralelo por segmentos
+# y, por cada ítem con atributos legacy, un UpdateItem que completa IDCliente /
+# IDComercio / IDTarjeta / FechaHoraOrden (e IDComercioShard de comercios hot)
+# y quita ClienteID / ComercioID / TarjetaID / FechaHoraISO.
+# Evento: {"segmentos": 8, "checkpoint": "s3://bucket/key", "simular": false, "reiniciar": false}
+TABLE_NAME = os.environ.get("TABLA_TRANSACCION", "TablaTransaccion")
+SEGMENTOS  = int(os.environ.get("MIGRAR_SEGMENTOS", "8"))
+HILOS      = int(os.environ.get("MIGRAR_HILOS", "16"))          # UpdateItem concurrentes
+PAGINA     = int(os.environ.get("MIGRAR_PAGINA", "1000"))       # Limit de cada Scan
+MAX_WPS    = float(os.environ.get("MIGRAR_MAX_WPS", "0"))       # ítems/s; 0 = sin límite
+CHECKPOINT = os.environ.get("MIGRAR_CHECKPOINT", "")
+MARGEN_MS  = int(os.environ.get("MIGRAR_MARGEN_MS", "30000"))
+AUTO_REINVOCAR = os.environ.get("MIGRAR_AUTO_REINVOCAR", "1") == "1"
+
+# espejo legacy -> atributo del esquema nuevo
+ESPEJOS = {"ClienteID": "IDCliente", "ComercioID": "IDComercio", "TarjetaID": "IDTarjeta"}
+LEGACY = tuple(ESPEJOS) + ("FechaHoraISO",)
+
+def _checkpoint_uri(ev):
+    # Sólo S3: la migración se re-invoca en otros contenedores, que no ven /tmp.
+    # ValueError si no hay una ubicación s3:// configurada
+    uri = ev.get("checkpoint") or CHECKPOINT
+    if not uri and os.environ.get("JOBS_BUCKET"):
+        uri = f"s3://{os.environ['JOBS_BUCKET']}/migraciones/{TABLE_NAME}"
+    if not uri:
+        raise ValueError("Falta 'checkpoint' (s3://bucket/key), MIGRAR_CHECKPOINT o JOBS_BUCKET")
+    if not str(uri).startswith("s3://"):
+        raise ValueError("'checkpoint' debe ser s3://bucket/key")
+    return uri
+
+def _scan_kw(segmento, total, lek):
+    filtro = Attr(LEGACY[0]).exists()
+    for a in LEGACY[1:]:
+        filtro = filtro | Attr(a).exists()
+    # ítems completos: el HashContenido se recalcula sobre el ítem migrado
+    kw = {"Segment": segmento, "TotalSegments": total, "Limit": PAGINA, "FilterExpression": filtro}
+    if lek:
+        kw["ExclusiveStartKey"] = lek
+    return kw
+
+def update_para(it):
+    # UpdateItem que lleva un ítem al esquema compacto. Sólo toca los atributos
+    # migrados; si el ítem tiene HashContenido lo recalcula sobre el ítem migrado
+    # (el guardado cubría los espejos, salvo una marca PENDIENTE) y exige que no haya
+    # cambiado desde el Scan.
+    # None si no hay nada que hacer.
+    sets, names, values = [], {}, {}
+    migrado = {k: v for k, v in it.items() if k not in LEGACY}
+
+    def set_si_falta(attr, v):
+        n = len(sets)
+        names[f"#s{n}"], values[f":s{n}"] = attr, v
+        sets.append(f"#s{n} = if_not_exists(#s{n}, :s{n})")
+        migrado.setdefault(attr, v)
+
+    for legacy, nuevo in ESPEJOS.items():
+        if legacy in it and nuevo not in it:
+            set_si_falta(nuevo, it[legacy])
+    if "FechaHoraOrden" not in it and it.get("FechaHoraISO"):
+        set_si_falta("FechaHoraOrden", it["FechaHoraISO"].replace("T", "#", 1))
+    idc = it.get("IDComercio", it.get("ComercioID"))
+    if HOT and "IDComercioShard" not in it and idc is not None and int(idc) in HOT:
+        set_si_falta("IDComercioShard", shard_key(int(idc), it["IDTransaccion"]))
+    quitar = [a for a in LEGACY if a in it]
+    for i, a in enumerate(quitar):
+        names[f"#r{i}"] = a
+    if not sets and not quitar:
+        return None
+    # no recrear ítems borrados entre el Scan y la escritura
+    cond = Attr("IDTransaccion").exists()
+    if it.get(HASH_ATTR):
+        if not it[HASH_ATTR].startswith(PENDIENTE):  # la marca de contadores pendientes se conserva
+            names["#h"], values[":h"] = HASH_ATTR, hash_guardado(migrado)
+            sets.append("#h = :h")
+        cond = cond & Attr(HASH_ATTR).eq(it[HASH_ATTR])
+    expr = []
+    if sets:
+        expr.append("SET " + ", ".join(sets))
+    if quitar:
+        expr.append("REMOVE " + ", ".join(f"#r{i}" for i in range(len(quitar))))
+    kw = {"Key": {"IDTransaccion": it["IDTransaccion"]}, "UpdateExpression": " ".join(expr),
+          "ConditionExpression": cond, "ExpressionAttributeNames": names}
+    if values:
+        kw["ExpressionAttributeValues"] = values
+    return kw
+
+class Migracion:
+    def __init__(self, table, ck, simular=False):
+        self.table = table
+        self.ck = ck
+        self.simular = simular
+        self.lock = threading.Lock()
+        self.budget = Budget(MAX_WPS)
+        self.pool = ThreadPoolExecutor(max_workers=HILOS)
+
+    def _sumar(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                self.ck[k] = self.ck.get(k, 0) + v
+
+    def _migrar(self, it):
+        kw = update_para(it)
+        if kw is None or self.simular:
+            return "migrados" if kw else "sin_cambios"
+        self.budget.take(1)
+        for intento in range(MAX_INTENTOS):
+            try:
+                llamar("UpdateItem", self.table.update_item, kw, TABLE_NAME,
+                       clave=it["IDTransaccion"], intento=intento)
+                return "migrados"
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code == "ConditionalCheckFailedException":
+                    return "ausentes"
+                if code not in THROTTLE_CODES:
+                    return "errores"
+                self._sumar(throttled=1)
+                sleep_backoff(intento)
+        return "errores"
+
+    def segmento(self, n, debe_parar):
+        seg = self.ck["segmentos"][str(n)]
+        while not seg["fin"] and not debe_parar():
+            r = llamar("Scan", self.table.scan, _scan_kw(n, self.ck["total_segmentos"], seg["lek"]),
+                       TABLE_NAME, clave=n)
+            res = {}
+            for estado in self.pool.map(self._migrar, r.get("Items", [])):
+                res[estado] = res.get(estado, 0) + 1
+            # el checkpoint del segmento avanza sólo con la página ya escrita
+            with self.lock:
+                seg["lek"] = r.get("LastEvaluatedKey")
+                seg["fin"] = seg["lek"] is None
+            self._sumar(escaneados=r.get("ScannedCount", 0), **res)
+
+def lambda_handler(event, context):
+    ev = event
+    if isinstance(event.get("body"), str):
+        try:
+            ev = json.loads(event["body"])
+        except Exception as e:
+            return resp(400, {"ok": False, "msg": f"JSON inválido: {e}"}, event)
+    try:
+        uri = _checkpoint_uri(ev)
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+    simular = bool(ev.get("simular"))
+    ck = None if ev.get("reiniciar") or simular else ckpt.cargar(uri)
+    if ck is None:
+        # la cantidad de segmentos queda fija hasta terminar: cambiarla invalida los LEK
+        total = int(ev.get("segmentos") or SEGMENTOS)
+        ck = {"total_segmentos": total, "segmentos": {str(i): {"lek": None, "fin": False} for i in range(total)},
+              "escaneados": 0, "migrados": 0, "sin_cambios": 0, "ausentes": 0, "errores": 0, "throttled": 0}
+    m = Migracion(tabla(TABLE_NAME), ck, simular=simular)
+    t0 = time.time()
+    migrados0 = ck["migrados"]
+    parar = threading.Event()
+
+    def debe_parar():
+        if not parar.is_set() and ckpt.remaining_ms(context) < MARGEN_MS:
+            parar.set()
+        return parar.is_set()
+
+    def checkpoint_periodico():
+        while not listo.wait(5):
+            with m.lock:
+                data = json.loads(json.dumps(m.ck, default=str))
+            if not simular:
+                ckpt.guardar(uri, data)
+
+    listo = threading.Event()
+    guardador = threading.Thread(target=checkpoint_periodico, daemon=True)
+    guardador.start()
+    try:
+        with ThreadPoolExecutor(max_workers=ck["total_segmentos"]) as ex:
+            list(ex.map(lambda n: m.segmento(n, debe_parar), range(ck["total_segmentos"])))
+    except ClientError as e:
+        return resp(500, {"ok": False, "msg": e.response["Error"]["Message"], "checkpoint": uri}, event)
+    finally:
+        listo.set()
+        guardador.join()
+        m.pool.shutdown()
+
+    completo = all(s["fin"] for s in ck["segmentos"].values())
+    if simular:
+        pass
+    elif completo:
+        ckpt.borrar(uri)
+    else:
+        ckpt.guardar(uri, json.loads(json.dumps(ck, default=str)))
+        if AUTO_REINVOCAR:
+            ckpt.reinvocar(context, {k: v for k, v in ev.items() if k != "reiniciar"})
+
+    dur = max(time.time() - t0, 1e-6)
+    return resp(200, {
+        "ok": True, "completo": completo, "simular": simular, "tabla": TABLE_NAME, "checkpoint": uri,
+        "segmentos": ck["total_segmentos"],
+        "pendientes": sorted(int(n) for n, s in ck["segmentos"].items() if not s["fin"]),
+        "escaneados": ck["escaneados"], "migrados": ck["migrados"], "sin_cambios": ck["sin_cambios"],
+        "ausentes": ck["ausentes"], "errores": ck["errores"], "throttled": ck["throttled"],
+        "migrados_por_seg": round((ck["migrados"] - migrados0) / dur, 1),
+    }, event)
@@ -0,0 +1,150 @@
+import os, math
+from decimal import Decimal
+from datetime import date
+from botocore.exceptions import ClientError
+from utils_search import SEARCH_INDEXES, parse_key, resolve_range, iter_items, parse_filter, projection_for
+from utils_resp import resp
+from utils_ddb import tabla
+
+TABLE_NAME = os.environ.get("TABLA_TRANSACCION", "TablaTransacciones")
+
+GROUP_BY = ("day", "week", "month", "Canal", "Estado")
+# Sólo se leen los atributos que entran en el resumen
+CAMPOS = ["Fecha", "Canal", "Estado", "Monto", "LatenciaAutorizacionMs", "Fraude", "IndicadorAprobada"]
+
+# Percentiles aproximados con histograma logarítmico (error relativo ~1%)
+_ALPHA = 0.01
+_GAMMA = (1 + _ALPHA) / (1 - _ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+
+class _Sketch:
+    # Memoria acotada por el rango de valores, no por la cantidad de ítems
+    def __init__(self):
+        self.pos, self.neg = {}, {}
+        self.zero = self.n = 0
+
+    def add(self, v):
+        v = float(v)
+        self.n += 1
+        if v == 0:
+            self.zero += 1
+            return
+        bins = self.pos if v > 0 else self.neg
+        b = math.ceil(math.log(abs(v)) / _LOG_GAMMA)
+        bins[b] = bins.get(b, 0) + 1
+
+    def quantile(self, q):
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        ordered = [(-2 * _GAMMA ** b / (_GAMMA + 1), c) for b, c in sorted(self.neg.items(), reverse=True)]
+        ordered.append((0.0, self.zero))
+        ordered += [(2 * _GAMMA ** b / (_GAMMA + 1), c) for b, c in sorted(self.pos.items())]
+        acc = 0
+        for v, c in ordered:
+            acc += c
+            if acc > rank:
+                return round(v, 2)
+        return None
+
+class _Acum:
+    def __init__(self):
+        self.count = self.fraude = self.aprobadas = 0
+        self.monto = Decimal(0)
+        self.n_monto = 0
+        self.lat = 0
+        self.n_lat = 0
+        self.sk_monto = _Sketch()
+        self.sk_lat = _Sketch()
+
+    def add(self, it):
+        self.count += 1
+        m = it.get("Monto")
+        if m is not None:
+            self.monto += Decimal(m)
+            self.n_monto += 1
+            self.sk_monto.add(m)
+        lat = it.get("LatenciaAutorizacionMs")
+        if lat is not None:
+            self.lat += int(lat)
+            self.n_lat += 1
+            self.sk_lat.add(lat)
+        if int(it.get("Fraude") or 0):
+            self.fraude += 1
+        if int(it.get("IndicadorAprobada") or 0):
+            self.aprobadas += 1
+
+    def result(self):
+        return {
+            "count": self.count,
+            "Monto": {
+                "sum": self.monto,
+                "avg": round(self.monto / self.n_monto, 2) if self.n_monto else None,
+                "p50": self.sk_monto.quantile(0.50),
+                "p95": self.sk_monto.quantile(0.95),
+                "p99": self.sk_monto.quantile(0.99),
+            },
+            "LatenciaAutorizacionMs": {
+                "avg": round(self.lat / self.n_lat, 2) if self.n_lat else None,
+                "p50": self.sk_lat.quantile(0.50),
+                "p95": self.sk_lat.quantile(0.95),
+                "p99": self.sk_lat.quantile(0.99),
+            },
+            "fraudes": self.fraude,
+            "tasa_fraude": round(self.fraude / self.count, 4) if self.count else None,
+            "aprobadas": self.aprobadas,
+        }
+
+def _group_key(it, group_by):
+    fecha = it.get("Fecha") or (it.get("FechaHoraOrden") or it.get("FechaHoraISO") or "")[:10]
+    if group_by == "day":
+        return fecha
+    if group_by == "month":
+        return fecha[:7]
+    if group_by == "week":
+        try:
+            y, w, _ = date.fromisoformat(fecha).isocalendar()
+            return f"{y}-W{w:02d}"
+        except ValueError:
+            return fecha
+    return it.get(group_by) or "N/A"
+
+def lambda_handler(event, context):
+    params = event.get("queryStringParameters") or {}
+    key_name = next((k for k in SEARCH_INDEXES if params.get(k) not in (None, "")), None)
+    if key_name is None:
+        return resp(400, {"ok": False, "msg": "Falta IDCliente, IDComercio o IDTarjeta"}, event)
+    group_by = params.get("group_by") or "day"
+    if group_by not in GROUP_BY:
+        return resp(400, {"ok": False, "msg": f"group_by debe ser uno de {', '.join(GROUP_BY)}"}, event)
+    try:
+        key = parse_key(params, key_name)
+        ini, fin = resolve_range(params)
+        filter_expr = parse_filter(params)
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+
+    total = _Acum()
+    grupos = {}
+    table = tabla(TABLE_NAME)
+    index_tries = SEARCH_INDEXES[key_name]
+    rango = {"desde": ini, "hasta": fin}  # sin fechas: el mes resuelto por iter_items
+    try:
+        for it in iter_items(table, index_tries, key, ini, fin, filter_expr=filter_expr,
+                             projection=projection_for(index_tries, CAMPOS), rango=rango):
+            total.add(it)
+            g = _group_key(it, group_by)
+            acc = grupos.get(g)
+            if acc is None:
+                acc = grupos[g] = _Acum()
+            acc.add(it)
+    except ClientError as e:
+        # totales parciales serían engañosos: no se devuelven
+        return resp(500, {"ok": False, "msg": e.response.get("Error", {}).get("Message", str(e))}, event)
+
+    return resp(200, {
+        "ok": True, key_name: key, "group_by": group_by, "desde": rango["desde"], "hasta": rango["hasta"],
+        "total": total.result(),
+        "grupos": [dict(grupo=g, **grupos[g].result()) for g in sorted(grupos)],
+        "table": TABLE_NAME,
+    }, event)
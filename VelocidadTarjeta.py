@@ -0,0 +1,43 @@
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from utils_search import parse_key
+from utils_velocidad import TABLE_VEL, parse_ventanas, parse_hasta, inicio, sumar
+from utils_metrics import llamar
+from utils_resp import resp
+from utils_ddb import tabla
+
+def leer_dias(table, id_tarjeta, desde, hasta):
+    # {Dia: ítem} del rango; en la práctica una sola página
+    kw = {"KeyConditionExpression": Key("IDTarjeta").eq(id_tarjeta) & Key("Dia").between(desde, hasta)}
+    dias = {}
+    while True:
+        r = llamar("Query", table.query, kw, TABLE_VEL, clave=id_tarjeta)
+        for it in r.get("Items", []):
+            dias[it["Dia"]] = it
+        if "LastEvaluatedKey" not in r:
+            return dias
+        kw["ExclusiveStartKey"] = r["LastEvaluatedKey"]
+
+def lambda_handler(event, context):
+    # GET /transacciones/velocidad-tarjeta?IDTarjeta=...&minutos=60&horas=24&dias=7[&hasta=...]
+    params = event.get("queryStringParameters") or {}
+    try:
+        key = parse_key(params, "IDTarjeta")
+        ventanas = parse_ventanas(params)
+        ref = parse_hasta(params)
+    except ValueError as e:
+        return resp(400, {"ok": False, "msg": str(e)}, event)
+
+    # Un solo Query cubre todas las ventanas pedidas
+    desde = min(inicio(ref, u, n) for u, n in ventanas.items())
+    try:
+        dias = leer_dias(tabla(TABLE_VEL), key, desde.strftime("%Y-%m-%d"), ref.strftime("%Y-%m-%d"))
+    except ClientError as e:
+        return resp(500, {"ok": False, "msg": e.response["Error"]["Message"], "table": TABLE_VEL}, event)
+
+    return resp(200, {
+        "ok": True, "IDTarjeta": key, "hasta": ref.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ventanas": [dict(unidad=u, n=n, desde=inicio(ref, u, n).strftime("%Y-%m-%dT%H:%M:%S"),
+                          **sumar(dias, ref, u, n)) for u, n in ventanas.items()],
+        "table": TABLE_VEL,
+    }, event)
@@ -0,0 +1,94 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from bisect import bisect
+
+# Generadores sintéticos con sesgo realista: pocos comercios concentran la
+# mayoría de las transacciones (Zipf) y unas pocas tarjetas tienen historiales
+# muy largos. Mismo formato de entrada que /import/transacciones y /import/comercios.
+ESTADOS = [("Aprobada", 90), ("Rechazada", 8), ("Pendiente", 2)]
+CANALES = [("POS", 55), ("ECOM", 35), ("ATM", 10)]
+SECTORES = ["Supermercados", "Combustible", "Restaurantes", "Farmacias", "Electrónica", "Viajes"]
+MONEDAS = ["PEN", "USD"]
+
+class Zipf:
+    # Muestreo de 1..n con probabilidad ~ 1/k^s (s > 1 concentra más)
+    def __init__(self, n, s, rnd):
+        self.n, self.rnd = n, rnd
+        self.cum = list(accumulate(1.0 / k ** s for k in range(1, n + 1)))
+
+    def __call__(self):
+        return bisect(self.cum, self.rnd.random() * self.cum[-1]) + 1
+
+def _pesado(opciones, rnd):
+    return rnd.choices([o for o, _ in opciones], [w for _, w in opciones])[0]
+
+class Universo:
+    # Claves compartidas entre generadores y escenarios de consulta
+    def __init__(self, semilla=7, comercios=2000, clientes=20000, tarjetas_largas=50,
+                 sesgo_comercio=1.1, meses=12, hasta=datetime(2025, 6, 30, 23, 59, 59)):
+        self.rnd = random.Random(semilla)
+        self.comercios, self.clientes = comercios, clientes
+        self.meses, self.hasta = meses, hasta
+        self.comercio = Zipf(comercios, sesgo_comercio, self.rnd)
+        self.cliente = Zipf(clientes, 0.6, self.rnd)
+        # Cada cliente tiene 1-3 tarjetas; unas pocas tarjetas concentran historiales largos
+        self.tarjetas = {c: [c * 10 + i for i in range(1 + c % 3)] for c in range(1, clientes + 1)}
+        self.largas = [self.tarjetas[c][0] for c in range(1, tarjetas_largas + 1)]
+
+    def tarjeta(self, cliente):
+        if self.rnd.random() < 0.2:
+            return self.rnd.choice(self.largas)
+        return self.rnd.choice(self.tarjetas[cliente])
+
+    def instante(self):
+        dias = self.meses * 30
+        return self.hasta - timedelta(seconds=self.rnd.randrange(dias * 86400))
+
+def transacciones(u, n, inicio=0):
+    # Lista de filas crudas como las recibe el importador
+    rnd = u.rnd
+    carga = u.hasta.strftime("%Y-%m-%d %H:%M:%S")
+    filas = []
+    for i in range(inicio, inicio + n):
+        cliente = u.cliente()
+        tarjeta = u.tarjeta(cliente)
+        if tarjeta in u.largas:
+            cliente = tarjeta // 10
+        comercio = u.comercio()
+        dt = u.instante()
+        estado = _pesado(ESTADOS, rnd)
+        monto = round(rnd.lognormvariate(3.5, 1.1), 2)
+        moneda = rnd.choice(MONEDAS)
+        tasa = 1.0 if moneda == "PEN" else 3.75
+        filas.append({
+            "IDTransaccion": f"TX{i:09d}",
+            "IDCliente": cliente, "IDComercio": comercio, "IDTarjeta": tarjeta,
+            "IDMoneda": MONEDAS.index(moneda) + 1, "IDCanal": rnd.randint(1, 3), "IDEstado": rnd.randint(1, 3),
+            "Fecha": dt.strftime("%Y-%m-%d"), "Hora": dt.strftime("%H:%M:%S"),
+            "CodigoAutorizacion": f"{rnd.randrange(10 ** 6):06d}",
+            "Estado": estado, "Canal": _pesado(CANALES, rnd), "CodigoMoneda": moneda,
+            "NombreComercio": f"Comercio {comercio}", "Sector": SECTORES[comercio % len(SECTORES)],
+            "Producto": rnd.choice(["Crédito", "Débito"]),
+            "NombreCompleto": f"Cliente {cliente}", "DNI": f"{40000000 + cliente:08d}",
+            "telefono": f"9{cliente:08d}", "email": f"cliente{cliente}@example.com",
+            "Tarjeta": f"4111********{tarjeta % 10000:04d}",
+            "MontoBruto": round(monto / tasa, 2), "TasaCambio": tasa, "Monto": monto,
+            "IndicadorAprobada": 1 if estado == "Aprobada" else 0,
+            "LatenciaAutorizacionMs": int(rnd.lognormvariate(5, 0.5)),
+            "Fraude": 1 if rnd.random() < 0.01 else 0,
+            "FechaCarga": carga,
+        })
+    return filas
+
+def comercios(u):
+    # Detalle de comercios más una fila de agregados mensuales por cada uno
+    filas = []
+    for c in range(1, u.comercios + 1):
+        filas.append({"IDComercio": c, "NombreComercio": f"Comercio {c}",
+                      "Sector": SECTORES[c % len(SECTORES)], "Ciudad": "Lima"})
+        filas.append({"Tipo": u.hasta.year, "ID": c, "Agregado": "Comercio", "Grupo": f"Comercio {c}",
+                      **{m: round(u.rnd.uniform(0, 5000), 2) for m in
+                         ("Ene", "Feb", "Mar", "Abr", "May", "Jun")},
+                      "TotalMonto": 15000.0, "TotalFraude": 2})
+    return filas
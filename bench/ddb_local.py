@@ -0,0 +1,399 @@
+import re, time, random, threading, zlib
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+from types import SimpleNamespace
+from boto3.dynamodb.conditions import AttributeBase
+from botocore.exceptions import ClientError
+
+# DynamoDB en memoria para los benchmarks: misma API de recurso que usan los
+# handlers (Table.query/scan/get_item/put_item/update_item y meta.client con
+# batch_write_item/batch_get_item), GSIs ordenados, páginas de 1 MB, números
+# devueltos como Decimal y latencia de red simulada por llamada.
+PAGINA_BYTES = 1024 * 1024
+
+def _dec(v):
+    # DynamoDB devuelve todo número como Decimal
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return Decimal(str(v))
+    if isinstance(v, dict):
+        return {k: _dec(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_dec(x) for x in v]
+    return v
+
+def _size(item):
+    # Aproximación del tamaño facturable de un ítem
+    return sum(len(k) + (len(v) if isinstance(v, str) else 8) for k, v in item.items())
+
+def _val(x, item):
+    return item.get(x.name) if isinstance(x, AttributeBase) else x
+
+def evaluar(cond, item):
+    e = cond.get_expression()
+    op, v = e["operator"], e["values"]
+    if op == "AND":
+        return evaluar(v[0], item) and evaluar(v[1], item)
+    if op == "OR":
+        return evaluar(v[0], item) or evaluar(v[1], item)
+    if op == "NOT":
+        return not evaluar(v[0], item)
+    if op == "attribute_exists":
+        return v[0].name in item
+    if op == "attribute_not_exists":
+        return v[0].name not in item
+    a = _val(v[0], item)
+    if a is None:
+        return False
+    if op == "=":
+        return a == _val(v[1], item)
+    if op == "<>":
+        return a != _val(v[1], item)
+    if op == "<":
+        return a < _val(v[1], item)
+    if op == "<=":
+        return a <= _val(v[1], item)
+    if op == ">":
+        return a > _val(v[1], item)
+    if op == ">=":
+        return a >= _val(v[1], item)
+    if op == "BETWEEN":
+        return _val(v[1], item) <= a <= _val(v[2], item)
+    if op == "IN":
+        return a in v[1]
+    if op == "begins_with":
+        return str(a).startswith(v[1])
+    raise ValueError(f"operador no soportado: {op}")
+
+def _key_conds(cond):
+    # KeyConditionExpression -> (atributo hash, valor, condición de rango | None)
+    e = cond.get_expression()
+    if e["operator"] == "AND":
+        h = e["values"][0].get_expression()
+        return h["values"][0].name, h["values"][1], e["values"][1]
+    return e["values"][0].name, e["values"][1], None
+
+def _range_bounds(rc):
+    # condición de rango -> (lo, hi, incluye_lo, incluye_hi); None = sin cota
+    if rc is None:
+        return None, None, True, True
+    e = rc.get_expression()
+    op, v = e["operator"], e["values"]
+    if op == "BETWEEN":
+        return v[1], v[2], True, True
+    if op == "=":
+        return v[1], v[1], True, True
+    if op == "<":
+        return None, v[1], True, False
+    if op == "<=":
+        return None, v[1], True, True
+    if op == ">":
+        return v[1], None, False, True
+    if op == ">=":
+        return v[1], None, True, True
+    if op == "begins_with":
+        return v[1], v[1] + "￿", True, True
+    raise ValueError(f"condición de rango no soportada: {op}")
+
+def _projection(item, expr, names):
+    names = names or {}
+    campos = [names.get(f.strip(), f.strip()) for f in expr.split(",")]
+    return {k: item[k] for k in campos if k in item}
+
+def _rango(entry):
+    return entry[0]
+
+class _Index:
+    # hash -> lista ordenada de (rango, pk); sin rango, el orden es por pk
+    def __init__(self, hash_attr, range_attr):
+        self.hash_attr, self.range_attr = hash_attr, range_attr
+        self.parts = {}
+
+    def _entry(self, item, pk):
+        if self.hash_attr not in item or (self.range_attr and self.range_attr not in item):
+            return None
+        r = item[self.range_attr] if self.range_attr else None
+        return item[self.hash_attr], (r, pk)
+
+    def add(self, item, pk):
+        e = self._entry(item, pk)
+        if e is not None:
+            insort(self.parts.setdefault(e[0], []), e[1])
+
+    def remove(self, item, pk):
+        e = self._entry(item, pk)
+        if e is not None:
+            lst = self.parts.get(e[0], [])
+            i = bisect_left(lst, e[1])
+            if i < len(lst) and lst[i] == e[1]:
+                del lst[i]
+
+class LocalTable:
+    def __init__(self, name, hash_key, range_key=None, gsis=None, latencia_ms=0.0):
+        self.name = name
+        self.hash_key, self.range_key = hash_key, range_key
+        self.items = {}
+        self.indexes = {n: _Index(h, r) for n, (h, r) in (gsis or {}).items()}
+        self.base = _Index(hash_key, range_key)  # Query sobre la tabla: sólo la partición pedida
+        self.latencia = latencia_ms / 1000.0
+        self.lock = threading.RLock()
+        self.stats = {"llamadas": 0, "rcu": 0.0, "wcu": 0.0}
+        self.meta = SimpleNamespace(client=None)
+
+    # ---- utilidades internas ----
+    def _pk(self, item):
+        return (item[self.hash_key], item[self.range_key]) if self.range_key else (item[self.hash_key],)
+
+    def _llamada(self, rcu=0.0, wcu=0.0):
+        with self.lock:
+            self.stats["llamadas"] += 1
+            self.stats["rcu"] += rcu
+            self.stats["wcu"] += wcu
+
+    def _red(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def cargar(self, items):
+        # Carga directa sin costo ni latencia (preparación de escenarios)
+        for it in items:
+            self._put(_dec(it))
+
+    def vaciar(self):
+        # Deja la tabla vacía, sin costo (escenarios que deben arrancar de cero)
+        with self.lock:
+            self.items.clear()
+            for ix in list(self.indexes.values()) + [self.base]:
+                ix.parts.clear()
+
+    def _put(self, item):
+        pk = self._pk(item)
+        with self.lock:
+            old = self.items.get(pk)
+            if old is not None:
+                for ix in self.indexes.values():
+                    ix.remove(old, pk)
+                self.base.remove(old, pk)
+            self.items[pk] = item
+            for ix in self.indexes.values():
+                ix.add(item, pk)
+            self.base.add(item, pk)
+        return -(-_size(item) // 1024)  # WCU: 1 KB
+
+    # ---- API de recurso ----
+    def put_item(self, Item, **kw):
+        self._red()
+        self._llamada(wcu=self._put(_dec(Item)))
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kw):
+        self._red()
+        it = self.items.get(self._pk(_dec(Key)))
+        self._llamada(rcu=0.5 * max(1, -(-_size(it or {}) // 4096)))
+        if it is None:
+            return {}
+        return {"Item": _projection(it, ProjectionExpression, ExpressionAttributeNames)
+                if ProjectionExpression else dict(it)}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, **kw):
+        # Cláusulas SET (valor o if_not_exists), REMOVE y ADD, en cualquier orden;
+        # ConditionExpression como condición de boto3 (Attr)
+        self._red()
+        if len(UpdateExpression.encode()) > 4096:  # límite de DynamoDB por expresión
+            raise ClientError({"Error": {"Code": "ValidationException",
+                                         "Message": "Invalid UpdateExpression: Expression size has exceeded the maximum allowed size"}},
+                              "UpdateItem")
+        names, vals = ExpressionAttributeNames or {}, _dec(ExpressionAttributeValues or {})
+        partes = re.split(r"\b(SET|REMOVE|ADD)\b", UpdateExpression)
+        if partes[0].strip():
+            raise ValueError(f"UpdateExpression no soportada: {UpdateExpression}")
+        key = _dec(Key)
+        with self.lock:
+            old = self.items.get(self._pk(key))
+            if ConditionExpression is not None and not evaluar(ConditionExpression, old or {}):
+                self._llamada(wcu=1)
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException",
+                                             "Message": "The conditional request failed"}}, "UpdateItem")
+            it = dict(old or key)
+            for clausula, cuerpo in zip(partes[1::2], partes[2::2]):
+                if clausula == "ADD":
+                    for part in cuerpo.split(","):
+                        a, v = part.split()
+                        a = names.get(a, a)
+                        it[a] = it.get(a, 0) + vals[v]
+                elif clausula == "REMOVE":
+                    for a in cuerpo.split(","):
+                        it.pop(names.get(a.strip(), a.strip()), None)
+                else:
+                    for a, a2, v2, v in re.findall(r"(#?\w+) = (?:if_not_exists\((#?\w+), (:\w+)\)|(:\w+))", cuerpo):
+                        a = names.get(a, a)
+                        if v2:
+                            it.setdefault(a, vals[v2])
+                        else:
+                            it[a] = vals[v]
+            self._llamada(wcu=max(self._put(it), -(-_size(old or {}) // 1024)))
+        return {}
+
+    def scan(self, Segment=0, TotalSegments=1, Limit=None, ExclusiveStartKey=None, FilterExpression=None,
+             ProjectionExpression=None, ExpressionAttributeNames=None, **kw):
+        # Segmentos por hash de la clave primaria; dentro de cada uno, orden por clave
+        self._red()
+        with self.lock:
+            pks = sorted(pk for pk in self.items if zlib.crc32(repr(pk).encode()) % TotalSegments == Segment)
+            if ExclusiveStartKey:
+                pks = pks[bisect_right(pks, self._pk(_dec(ExclusiveStartKey))):]
+            out, leidos, bytes_, last = [], 0, 0, None
+            for pk in pks:
+                it = self.items[pk]
+                leidos += 1
+                bytes_ += _size(it)
+                last = it
+                if FilterExpression is None or evaluar(FilterExpression, it):
+                    out.append(_projection(it, ProjectionExpression, ExpressionAttributeNames)
+                               if ProjectionExpression else dict(it))
+                if (Limit and leidos >= Limit) or bytes_ >= PAGINA_BYTES:
+                    break
+        self._llamada(rcu=0.5 * max(1, -(-bytes_ // 4096)))
+        res = {"Items": out, "Count": len(out), "ScannedCount": leidos}
+        if last is not None and leidos < len(pks):
+            res["LastEvaluatedKey"] = {k: last[k] for k in (self.hash_key, self.range_key) if k}
+        return res
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, **kw):
+        self._red()
+        if IndexName is not None and IndexName not in self.indexes:
+            raise ClientError({"Error": {"Code": "ValidationException",
+                                         "Message": f"The table does not have the specified index: {IndexName}"}},
+                              "Query")
+        h_attr, h_val, rc = _key_conds(KeyConditionExpression)
+        ix = self.base if IndexName is None else self.indexes[IndexName]
+        lst = ix.parts.get(h_val, [])
+        lo, hi, inc_lo, inc_hi = _range_bounds(rc)
+        with self.lock:
+            a = 0 if lo is None else (bisect_left if inc_lo else bisect_right)(lst, lo, key=_rango)
+            b = len(lst) if hi is None else (bisect_right if inc_hi else bisect_left)(lst, hi, key=_rango)
+            window = lst[a:b]
+        if ExclusiveStartKey:
+            esk = _dec(ExclusiveStartKey)
+            pos = (esk.get(ix.range_attr) if ix.range_attr else None, self._pk(esk))
+            window = [e for e in window if (e > pos if ScanIndexForward else e < pos)]
+        if not ScanIndexForward:
+            window = window[::-1]
+        out, leidos, bytes_ = [], 0, 0
+        last = None
+        for r, pk in window:
+            it = self.items[pk]
+            leidos += 1
+            bytes_ += _size(it)
+            last = it
+            if FilterExpression is None or evaluar(FilterExpression, it):
+                out.append(_projection(it, ProjectionExpression, ExpressionAttributeNames)
+                           if ProjectionExpression else dict(it))
+            if (Limit and leidos >= Limit) or bytes_ >= PAGINA_BYTES:
+                break
+        self._llamada(rcu=0.5 * max(1, -(-bytes_ // 4096)))
+        res = {"Items": out, "Count": len(out), "ScannedCount": leidos}
+        if last is not None and (leidos < len(window) or leidos == Limit):
+            lek = {self.hash_key: last[self.hash_key]}
+            if self.range_key:
+                lek[self.range_key] = last[self.range_key]
+            if ix.range_attr:
+                lek[ix.hash_attr], lek[ix.range_attr] = last[ix.hash_attr], last[ix.range_attr]
+            res["LastEvaluatedKey"] = lek
+        return res
+
+class LocalClient:
+    # Cliente de bajo nivel compartido: batch_write_item / batch_get_item.
+    # no_procesados: fracción de ítems devueltos como Unprocessed* para ejercitar reintentos
+    def __init__(self, tables, no_procesados=0.0, semilla=0):
+        self.tables = tables
+        self.no_procesados = no_procesados
+        self.rnd = random.Random(semilla)
+        self.lock = threading.Lock()
+
+    def _skip(self):
+        if not self.no_procesados:
+            return False
+        with self.lock:
+            return self.rnd.random() < self.no_procesados
+
+    def batch_write_item(self, RequestItems, **kw):
+        out = {}
+        for name, reqs in RequestItems.items():
+            if len(reqs) > 25:
+                raise ClientError({"Error": {"Code": "ValidationException",
+                                             "Message": "Too many items requested for the BatchWriteItem call"}},
+                                  "BatchWriteItem")
+            t = self.tables[name]
+            t._red()
+            wcu = 0
+            for r in reqs:
+                if self._skip():
+                    out.setdefault(name, []).append(r)
+                else:
+                    wcu += t._put(_dec(r["PutRequest"]["Item"]))
+            t._llamada(wcu=wcu)
+        return {"UnprocessedItems": out}
+
+    def batch_get_item(self, RequestItems, **kw):
+        resp, un = {}, {}
+        for name, req in RequestItems.items():
+            t = self.tables[name]
+            t._red()
+            rcu = 0.0
+            for k in req["Keys"]:
+                if self._skip():
+                    un.setdefault(name, dict(req, Keys=[]))["Keys"].append(k)
+                    continue
+                it = t.items.get(t._pk(_dec(k)))
+                rcu += 0.5 * max(1, -(-_size(it or {}) // 4096))
+                if it is not None:
+                    pe = req.get("ProjectionExpression")
+                    resp.setdefault(name, []).append(_projection(it, pe, req.get("ExpressionAttributeNames"))
+                                                     if pe else dict(it))
+            t._llamada(rcu=rcu)
+        return {"Responses": resp, "UnprocessedKeys": un}
+
+class LocalResource:
+    def __init__(self, tables, no_procesados=0.0):
+        self.tables = {t.name: t for t in tables}
+        self.client = LocalClient(self.tables, no_procesados)
+        for t in tables:
+            t.meta.client = self.client
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def stats(self):
+        return {n: dict(t.stats) for n, t in self.tables.items()}
+
+    def reset_stats(self):
+        for t in self.tables.values():
+            t.stats = {"llamadas": 0, "rcu": 0.0, "wcu": 0.0}
+
+GSI_NUEVOS = {
+    "GSI_IDCliente_Fecha": ("IDCliente", "FechaHoraOrden"),
+    "GSI_IDComercio_Fecha": ("IDComercio", "FechaHoraOrden"),
+    "GSI_IDTarjeta_Fecha": ("IDTarjeta", "FechaHoraOrden"),
+    "GSI_IDComercioShard_Fecha": ("IDComercioShard", "FechaHoraOrden"),
+}
+GSI_LEGACY = {
+    "GSI_Cliente_Fecha": ("ClienteID", "FechaHoraISO"),
+    "GSI_Comercio_Fecha": ("ComercioID", "FechaHoraISO"),
+    "GSI_Tarjeta_Fecha": ("TarjetaID", "FechaHoraISO"),
+}
+
+def recurso_local(tx="TablaTransaccion", det="TablaComercio", agr="TablaComercios",
+                  legacy=False, latencia_ms=0.0, no_procesados=0.0, vel="TablaVelocidadTarjeta"):
+    # Tablas como en serverless.yml; legacy=True agrega los GSI_*_Fecha anteriores
+    gsis = dict(GSI_NUEVOS, **(GSI_LEGACY if legacy else {}))
+    return LocalResource([
+        LocalTable(tx, "IDTransaccion", gsis=gsis, latencia_ms=latencia_ms),
+        LocalTable(det, "IDComercio", latencia_ms=latencia_ms),
+        LocalTable(agr, "Tipo", "ID", latencia_ms=latencia_ms),
+        LocalTable(vel, "IDTarjeta", "Dia", latencia_ms=latencia_ms),
+    ], no_procesados=no_procesados)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""Benchmark offline de importadores y búsquedas contra DynamoDB en memoria.
+
+Uso (desde la raíz del repo):
+    python bench/run.py                       # corre todo y compara con bench/baseline.json
+    python bench/run.py --escenarios busqueda_comercio,resumen
+    python bench/run.py --guardar             # reescribe la baseline con esta corrida
+
+Sale con código 1 si algún escenario empeora respecto de la baseline más allá
+de la tolerancia (p50/p95 más --margen-ms, y filas/s) o del 2% (bytes,
+llamadas y capacidad consumida, que no dependen de la máquina). Los tiempos
+sí dependen de ella: para evaluar un cambio, regenerar antes la baseline
+localmente con --guardar.
+"""
+import os, sys, gc, json, time, random, argparse, tempfile, importlib, platform
+from datetime import timedelta
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(AQUI))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# Como en serverless.yml: todos los handlers ven los mismos nombres de tabla
+for var, tabla in (("TABLA_TRANSACCION", "TablaTransaccion"), ("TABLA_COMERCIO", "TablaComercio"),
+                   ("TABLA_COMERCIOS_AGREG", "TablaComercios"),
+                   ("TABLA_VELOCIDAD_TARJETA", "TablaVelocidadTarjeta")):
+    os.environ.setdefault(var, tabla)
+# Sin líneas EMF por llamada salvo que se pida (METRICAS_MUESTREO=1 mide su costo)
+os.environ.setdefault("METRICAS_MUESTREO", "0")
+# En AWS la genera el deploy (CursorSecret); sin clave no hay cursores
+os.environ.setdefault("CURSOR_SECRET", "bench")
+
+import utils_ddb
+import utils_jobs
+import utils_velocidad
+import datos
+from ddb_local import recurso_local
+
+BASELINE = os.path.join(AQUI, "baseline.json")
+HANDLERS = ["ImportTransacciones", "ImportComercios", "BusquedaCliente", "BusquedaComercio",
+            "BusquedaTarjeta", "BusquedaTransaccion", "ResumenTransacciones", "ExportTransacciones",
+            "ImportJobs", "VelocidadTarjeta"]
+TOL_DETERMINISTA = 0.02
+
+def _cargar_handlers(res):
+    # Los handlers obtienen sus tablas de utils_ddb.tabla al importarse: se entregan las locales
+    utils_ddb.tabla = res.Table
+    return {m: importlib.import_module(m) for m in HANDLERS}
+
+def _pct(xs, p):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, int(round(p / 100.0 * len(xs) + 0.5)) - 1))]
+
+class Medicion:
+    def __init__(self, res):
+        self.res = res
+        self.lat, self.filas, self.bytes = [], 0, 0
+        res.reset_stats()
+        # los datos ya cargados no entran en las pasadas del GC durante la medición
+        gc.collect()
+        gc.freeze()
+        self.t0 = time.perf_counter()
+
+    def llamar(self, handler, event, filas_de=None):
+        t = time.perf_counter()
+        r = handler(event, None)
+        self.lat.append((time.perf_counter() - t) * 1000)
+        if not 200 <= r.get("statusCode", 0) < 300:
+            raise RuntimeError(f"{handler.__module__}: {r.get('statusCode')} {r.get('body', '')[:300]}")
+        self.bytes += len(r["body"])
+        if filas_de:
+            self.filas += filas_de(r)
+        return r
+
+    def resultado(self):
+        seg = max(time.perf_counter() - self.t0, 1e-9)
+        st = self.res.stats().values()
+        return {
+            "invocaciones": len(self.lat), "filas": self.filas,
+            "filas_seg": round(self.filas / seg, 1),
+            "p50_ms": round(_pct(self.lat, 50), 2), "p95_ms": round(_pct(self.lat, 95), 2),
+            "p99_ms": round(_pct(self.lat, 99), 2),
+            "bytes": self.bytes,
+            "llamadas": sum(s["llamadas"] for s in st),
+            "rcu": round(sum(s["rcu"] for s in st), 1), "wcu": round(sum(s["wcu"] for s in st), 1),
+        }
+
+def _body(r):
+    b = r["body"]
+    if r.get("isBase64Encoded"):
+        import base64, gzip
+        b = gzip.decompress(base64.b64decode(b))
+    return json.loads(b)
+
+# ---------------------------------------------------------------- escenarios
+
+def _transacciones(ctx):
+    # Un único set por corrida: las repeticiones y los escenarios de consulta ven los mismos datos
+    if ctx.filas_tx is None:
+        ctx.filas_tx = datos.transacciones(ctx.u, ctx.args.filas)
+    return ctx.filas_tx
+
+def _procesadas(b):
+    return b["insertados"] + b["actualizados"] + b["sin_cambios"]
+
+def _vaciar(ctx, modulo, tabla):
+    # Cada corrida de un escenario de importación carga sobre la tabla vacía; si no,
+    # las repeticiones medirían una reimportación (filas sin cambios)
+    ctx.res.Table(getattr(ctx.h[modulo], tabla)).vaciar()
+
+def import_transacciones(ctx):
+    filas = _transacciones(ctx)
+    _vaciar(ctx, "ImportTransacciones", "TABLE_NAME")
+    m = Medicion(ctx.res)
+    lote = ctx.args.lote
+    for i in range(0, len(filas), lote):
+        m.llamar(ctx.h["ImportTransacciones"].lambda_handler, {"body": json.dumps(filas[i:i + lote])},
+                 lambda r: _procesadas(_body(r)))
+    ctx.cargado = True
+    return m.resultado()
+
+def reimport_transacciones(ctx):
+    # El mismo archivo otra vez con el Monto de 1 de cada 50 filas corregido: las demás
+    # se resuelven con la lectura del hash y no se escriben
+    imp = ctx.h["ImportTransacciones"]
+    filas = _transacciones(ctx)
+    _vaciar(ctx, "ImportTransacciones", "TABLE_NAME")
+    ctx.res.Table(imp.TABLE_NAME).cargar(imp.normalize_batch(filas)[0])
+    ctx.cargado = True
+    filas = [dict(f, Monto=round(f["Monto"] + 1, 2)) if i % 50 == 0 else f for i, f in enumerate(filas)]
+    m = Medicion(ctx.res)
+    lote = ctx.args.lote
+    for i in range(0, len(filas), lote):
+        m.llamar(imp.lambda_handler, {"body": json.dumps(filas[i:i + lote])}, lambda r: _procesadas(_body(r)))
+    return m.resultado()
+
+def import_job(ctx):
+    # Modo job: el POST sólo guarda chunks y encola; los workers corren en la cola local.
+    # p50/p95 = respuesta del POST; filas/s = hasta que el job queda COMPLETO
+    filas = _transacciones(ctx)
+    _vaciar(ctx, "ImportTransacciones", "TABLE_NAME")
+    m = Medicion(ctx.res)
+    r = m.llamar(ctx.h["ImportTransacciones"].lambda_handler,
+                 {"body": json.dumps(filas), "queryStringParameters": {"modo": "job"}})
+    ctx.cola.esperar()
+    job = _body(ctx.h["ImportJobs"].lambda_handler({"pathParameters": {"id": _body(r)["job"]}}, None))
+    if job["estado"] != "COMPLETO":
+        raise RuntimeError(f"job {job['job']}: {job['estado']} {job.get('error')}")
+    m.filas += _procesadas(job)
+    ctx.cargado = True
+    return m.resultado()
+
+def import_comercios(ctx):
+    filas = ctx.filas_com = ctx.filas_com or datos.comercios(ctx.u)
+    _vaciar(ctx, "ImportComercios", "TABLE_DET")
+    m = Medicion(ctx.res)
+    lote = ctx.args.lote
+    for i in range(0, len(filas), lote):
+        m.llamar(ctx.h["ImportComercios"].lambda_handler, {"body": json.dumps(filas[i:i + lote])},
+                 lambda r: (lambda b: b["insertados_detalle"] + b["actualizados_detalle"] + b["sin_cambios_detalle"]
+                            + b["insertados_agregados"])(_body(r)))
+    return m.resultado()
+
+def _preparar(ctx):
+    # Sin el escenario de importación, se carga el mismo set directo en la tabla
+    if ctx.cargado:
+        return
+    imp = ctx.h["ImportTransacciones"]
+    rows, _ = imp.normalize_batch(_transacciones(ctx))
+    ctx.res.Table(imp.TABLE_NAME).cargar(rows)
+    # Contadores de velocidad como los dejaría la importación
+    vel = {}
+    for r in rows:
+        utils_velocidad.acumular(vel, r)
+    ctx.res.Table(utils_velocidad.TABLE_VEL).cargar(
+        dict(slot["add"], **slot["set"], IDTarjeta=k[0], Dia=k[1]) for k, slot in vel.items())
+    ctx.cargado = True
+
+def _rango(ctx, rnd):
+    # 40% mes del último movimiento, 40% un mes concreto, 20% ventana de 7 días
+    x = rnd.random()
+    if x < 0.4:
+        return {}
+    hasta = ctx.u.hasta
+    if x < 0.8:
+        k = rnd.randrange(ctx.u.meses)
+        y, mth = divmod(hasta.year * 12 + hasta.month - 1 - k, 12)
+        return {"fecha": f"{y}-{mth + 1:02d}"}
+    fin = hasta - timedelta(days=rnd.randrange(ctx.u.meses * 30))
+    return {"desde": (fin - timedelta(days=6)).strftime("%Y-%m-%d"), "hasta": fin.strftime("%Y-%m-%d")}
+
+def _headers(ctx):
+    return {"accept-encoding": "gzip"} if ctx.args.gzip else {}
+
+def _preparar_comercios(ctx):
+    # Detalle de comercios (TablaComercio) para los joins de enrich=comercio
+    if ctx.comercios_cargados:
+        return
+    filas = ctx.filas_com = ctx.filas_com or datos.comercios(ctx.u)
+    imp = ctx.h["ImportComercios"]
+    ctx.res.Table(imp.TABLE_DET).cargar(f for f in filas if "IDComercio" in f)
+    ctx.comercios_cargados = True
+
+def _busqueda(ctx, modulo, key_name, clave, extra=None):
+    _preparar(ctx)
+    rnd = random.Random(ctx.args.semilla + 1)
+    m = Medicion(ctx.res)
+    h = ctx.h[modulo].lambda_handler
+    for _ in range(ctx.args.consultas):
+        params = dict(_rango(ctx, rnd), **{key_name: str(clave(rnd))}, **(extra or {}))
+        r = m.llamar(h, {"queryStringParameters": params, "headers": _headers(ctx)}, lambda r: _body(r)["count"])
+        # 30% sigue el cursor una o dos páginas más
+        paginas = 2 if rnd.random() < 0.3 else 0
+        while paginas and _body(r).get("cursor"):
+            params = dict(params, cursor=_body(r)["cursor"])
+            r = m.llamar(h, {"queryStringParameters": params, "headers": _headers(ctx)},
+                         lambda r: _body(r)["count"])
+            paginas -= 1
+    return m.resultado()
+
+def _zipf(n, s, rnd):
+    z = datos.Zipf(n, s, rnd)
+    return lambda _rnd: z()
+
+def busqueda_cliente(ctx):
+    rnd = random.Random(ctx.args.semilla + 2)
+    return _busqueda(ctx, "BusquedaCliente", "IDCliente", _zipf(ctx.u.clientes, 0.6, rnd))
+
+def busqueda_comercio(ctx):
+    rnd = random.Random(ctx.args.semilla + 3)
+    return _busqueda(ctx, "BusquedaComercio", "IDComercio", _zipf(ctx.u.comercios, 1.1, rnd))
+
+def busqueda_enrich(ctx):
+    # Mismas consultas que busqueda_cliente, con el comercio unido desde TablaComercio
+    _preparar_comercios(ctx)
+    rnd = random.Random(ctx.args.semilla + 2)
+    return _busqueda(ctx, "BusquedaCliente", "IDCliente", _zipf(ctx.u.clientes, 0.6, rnd),
+                     {"enrich": "comercio", "fields": "IDTransaccion,Fecha,Hora,Monto,IDComercio"})
+
+def busqueda_tarjeta(ctx):
+    # La mitad de las consultas apunta a tarjetas con historial largo
+    largas, tarjetas = ctx.u.largas, ctx.u.tarjetas
+    return _busqueda(ctx, "BusquedaTarjeta", "IDTarjeta",
+                     lambda rnd: rnd.choice(largas) if rnd.random() < 0.5
+                     else rnd.choice(tarjetas[rnd.randint(1, ctx.u.clientes)]))
+
+def busqueda_multi_tarjeta(ctx):
+    # Caso de fraude: 10 tarjetas (la mitad de historial largo) en un solo POST, con rango común
+    _preparar(ctx)
+    rnd = random.Random(ctx.args.semilla + 6)
+    m = Medicion(ctx.res)
+    h = ctx.h["BusquedaTarjeta"].lambda_handler
+    largas, tarjetas = ctx.u.largas, ctx.u.tarjetas
+    for _ in range(max(1, ctx.args.consultas // 4)):
+        claves = rnd.sample(largas, 5) + [rnd.choice(tarjetas[rnd.randint(1, ctx.u.clientes)]) for _ in range(5)]
+        body = dict(_rango(ctx, rnd), IDTarjeta=claves)
+        m.llamar(h, {"body": json.dumps(body), "headers": _headers(ctx)}, lambda r: _body(r)["count"])
+    return m.resultado()
+
+def busqueda_transaccion(ctx):
+    _preparar(ctx)
+    rnd = random.Random(ctx.args.semilla + 4)
+    m = Medicion(ctx.res)
+    h = ctx.h["BusquedaTransaccion"].lambda_handler
+    n = ctx.args.filas
+    for i in range(ctx.args.consultas):
+        if i % 2:
+            ids = [f"TX{rnd.randrange(n):09d}" for _ in range(50)]
+            m.llamar(h, {"body": json.dumps({"ids": ids}), "headers": _headers(ctx)}, lambda r: _body(r)["count"])
+        else:
+            m.llamar(h, {"queryStringParameters": {"IDTransaccion": f"TX{rnd.randrange(n):09d}"},
+                         "headers": _headers(ctx)}, lambda r: 1)
+    return m.resultado()
+
+def velocidad_tarjeta(ctx):
+    # Últimos 60 min / 24 h / 7 días (o 30 días) de una tarjeta; la mitad, de historial largo
+    _preparar(ctx)
+    rnd = random.Random(ctx.args.semilla + 7)
+    m = Medicion(ctx.res)
+    h = ctx.h["VelocidadTarjeta"].lambda_handler
+    largas, tarjetas = ctx.u.largas, ctx.u.tarjetas
+    for _ in range(ctx.args.consultas):
+        t = rnd.choice(largas) if rnd.random() < 0.5 else rnd.choice(tarjetas[rnd.randint(1, ctx.u.clientes)])
+        hasta = ctx.u.hasta - timedelta(seconds=rnd.randrange(ctx.u.meses * 30 * 86400))
+        params = {"IDTarjeta": str(t), "hasta": hasta.strftime("%Y-%m-%dT%H:%M:%S")}
+        if rnd.random() < 0.3:
+            params["dias"] = "30"
+        m.llamar(h, {"queryStringParameters": params}, lambda r: 1)
+    return m.resultado()
+
+def resumen(ctx):
+    _preparar(ctx)
+    rnd = random.Random(ctx.args.semilla + 5)
+    comercio = datos.Zipf(ctx.u.comercios, 1.1, rnd)
+    m = Medicion(ctx.res)
+    h = ctx.h["ResumenTransacciones"].lambda_handler
+    for _ in range(max(1, ctx.args.consultas // 4)):
+        params = {"IDComercio": str(comercio()), "group_by": rnd.choice(["day", "month", "Canal", "Estado"]),
+                  "desde": (ctx.u.hasta - timedelta(days=ctx.u.meses * 30)).strftime("%Y-%m-%d"),
+                  "hasta": ctx.u.hasta.strftime("%Y-%m-%d")}
+        m.llamar(h, {"queryStringParameters": params}, lambda r: _body(r)["total"]["count"])
+    return m.resultado()
+
+def exportar(ctx):
+    # Exporta el historial completo de los comercios más activos a un archivo local
+    _preparar(ctx)
+    m = Medicion(ctx.res)
+    h = ctx.h["ExportTransacciones"].lambda_handler
+    with tempfile.TemporaryDirectory() as tmp:
+        for c in range(1, 6):
+            m.llamar(h, {"IDComercio": c, "path": os.path.join(tmp, f"{c}.ndjson.gz"), "gzip": True,
+                         "desde": (ctx.u.hasta - timedelta(days=ctx.u.meses * 30)).strftime("%Y-%m-%d"),
+                         "hasta": ctx.u.hasta.strftime("%Y-%m-%d")},
+                     lambda r: _body(r)["filas"])
+    return m.resultado()
+
+ESCENARIOS = {f.__name__: f for f in [import_transacciones, reimport_transacciones, import_job, import_comercios,
+                                      busqueda_cliente, busqueda_comercio, busqueda_enrich, busqueda_tarjeta, busqueda_multi_tarjeta, busqueda_transaccion,
+                                      velocidad_tarjeta, resumen, exportar]}
+
+def _repetir(ctx, escenario, n):
+    # Mediana por métrica de n corridas idénticas; cada una arranca con el contenedor "frío"
+    corridas = []
+    for _ in range(max(1, n)):
+        ctx.h["BusquedaTransaccion"]._cache.data.clear()
+        importlib.import_module("utils_enrich")._cache.data.clear()  # después de parchear utils_ddb.tabla
+        corridas.append(escenario(ctx))
+    return {k: sorted(c[k] for c in corridas)[len(corridas) // 2] for k in corridas[0]}
+
+# ---------------------------------------------------------------- baseline
+
+def comparar(base, actual, tol, margen_ms=0.0):
+    # Lista de regresiones (escenario, métrica, baseline, actual); margen_ms absorbe
+    # el ruido de unos pocos ms en las colas de latencia
+    peor = []
+    for esc, cur in actual.items():
+        b = base.get(esc)
+        if not b:
+            continue
+        for k in ("p50_ms", "p95_ms"):  # p99 se informa, pero con pocas muestras es casi el máximo
+            if b.get(k) and cur[k] > b[k] * (1 + tol) + margen_ms:
+                peor.append((esc, k, b[k], cur[k]))
+        if b.get("filas_seg") and cur["filas_seg"] < b["filas_seg"] / (1 + tol):
+            peor.append((esc, "filas_seg", b["filas_seg"], cur["filas_seg"]))
+        for k in ("bytes", "llamadas", "rcu", "wcu"):
+            if b.get(k) and cur[k] > b[k] * (1 + TOL_DETERMINISTA):
+                peor.append((esc, k, b[k], cur[k]))
+    return peor
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    ap.add_argument("--filas", type=int, default=20000, help="transacciones sintéticas")
+    ap.add_argument("--lote", type=int, default=500, help="filas por invocación de importador")
+    ap.add_argument("--consultas", type=int, default=200, help="consultas por escenario de búsqueda")
+    ap.add_argument("--latencia-ms", type=float, default=2.0, help="latencia simulada por llamada a DynamoDB")
+    ap.add_argument("--no-procesados", type=float, default=0.0, help="fracción de Unprocessed* simulados")
+    ap.add_argument("--legacy", action="store_true", help="incluye los GSI_*_Fecha legacy")
+    ap.add_argument("--gzip", action="store_true", help="las búsquedas envían Accept-Encoding: gzip")
+    ap.add_argument("--repeticiones", type=int, default=3, help="corridas por escenario (se informa la mediana)")
+    ap.add_argument("--semilla", type=int, default=7)
+    ap.add_argument("--tolerancia", type=float, default=0.5, help="margen relativo para tiempos y filas/seg")
+    ap.add_argument("--margen-ms", type=float, default=3.0, help="margen absoluto para latencias")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--guardar", action="store_true", help="guarda esta corrida como baseline")
+    ap.add_argument("--salida", help="escribe el resultado JSON en este archivo")
+    args = ap.parse_args(argv)
+
+    nombres = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    desconocidos = [e for e in nombres if e not in ESCENARIOS]
+    if desconocidos:
+        ap.error(f"escenarios desconocidos: {', '.join(desconocidos)}")
+
+    parametros = {k: getattr(args, k) for k in ("filas", "lote", "consultas", "latencia_ms", "no_procesados",
+                                               "legacy", "gzip", "semilla", "repeticiones")}
+    res = recurso_local(os.environ["TABLA_TRANSACCION"], os.environ["TABLA_COMERCIO"],
+                        os.environ["TABLA_COMERCIOS_AGREG"], legacy=args.legacy, latencia_ms=args.latencia_ms, no_procesados=args.no_procesados,
+                        vel=os.environ["TABLA_VELOCIDAD_TARJETA"])
+    # Jobs asíncronos: cola de hilos y estado en memoria en lugar de SQS/S3/DynamoDB
+    cola = utils_jobs.LocalCola()
+    utils_jobs.configurar(cola=cola, payloads=utils_jobs.MemoriaPayloads(), estado=utils_jobs.MemoriaJobs())
+    ctx = argparse.Namespace(args=args, res=res, h=_cargar_handlers(res), cola=cola,
+                             u=datos.Universo(semilla=args.semilla), cargado=False,
+                             comercios_cargados=False, filas_tx=None, filas_com=None)
+
+    resultados = {}
+    print(f"{'escenario':<22}{'inv':>6}{'filas/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>12}"
+          f"{'llamadas':>10}{'rcu':>10}{'wcu':>10}")
+    for n in nombres:
+        r = resultados[n] = _repetir(ctx, ESCENARIOS[n], args.repeticiones)
+        print(f"{n:<22}{r['invocaciones']:>6}{r['filas_seg']:>11}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['bytes']:>12}"
+              f"{r['llamadas']:>10}{r['rcu']:>10}{r['wcu']:>10}")
+
+    doc = {"parametros": parametros, "python": platform.python_version(), "escenarios": resultados}
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+
+    if args.guardar:
+        previo = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previo = json.load(f)
+        if previo.get("parametros") == parametros:
+            resultados = dict(previo.get("escenarios", {}), **resultados)
+        with open(args.baseline, "w") as f:
+            json.dump(dict(doc, escenarios=resultados), f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("sin baseline: use --guardar para crearla")
+        return 0
+    with open(args.baseline) as f:
+        base = json.load(f)
+    if base.get("parametros") != parametros:
+        print("la baseline se generó con otros parámetros; no se compara")
+        return 0
+    peor = comparar(base.get("escenarios", {}), resultados, args.tolerancia, args.margen_ms)
+    for esc, k, b, c in peor:
+        print(f"REGRESIÓN {esc}.{k}: {b} -> {c}")
+    if not peor:
+        print("sin regresiones respecto de la baseline")
+    return 1 if peor else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Verificación offline contra DynamoDB en memoria (mismo ddb_local que el benchmark).
+
+Compara las respuestas de los handlers con un cálculo por fuerza bruta sobre
+los ítems cargados:
+  - búsquedas (merged_page): merge por fecha entre índices legacy, nuevos y
+    shards de comercios hot, sin IDTransaccion repetidos, paginado con cursor,
+    con rango, con filtros, multi-clave y sin fechas (mes del último movimiento)
+  - normalize_row contra la normalización campo a campo original
+  - /transacciones/velocidad-tarjeta contra la suma de las filas de la ventana
+
+Uso (desde la raíz del repo):
+    python bench/verificar.py
+    python bench/verificar.py --filas 5000 --semilla 3
+
+Sale con código 1 si alguna comparación falla.
+"""
+import os, sys, json, random, argparse
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(AQUI))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+for var, tabla in (("TABLA_TRANSACCION", "TablaTransaccion"), ("TABLA_COMERCIO", "TablaComercio"),
+                   ("TABLA_COMERCIOS_AGREG", "TablaComercios"),
+                   ("TABLA_VELOCIDAD_TARJETA", "TablaVelocidadTarjeta")):
+    os.environ.setdefault(var, tabla)
+os.environ.setdefault("METRICAS_MUESTREO", "0")
+os.environ.setdefault("CURSOR_SECRET", "verificar")
+# El comercio 1 (el más activo del universo) se lee por shards
+os.environ.setdefault("COMERCIOS_HOT", "1:4")
+
+import utils_ddb
+import datos
+from ddb_local import recurso_local
+
+LEGACY = {"IDCliente": "ClienteID", "IDComercio": "ComercioID", "IDTarjeta": "TarjetaID"}
+NUEVOS = ("IDCliente", "IDComercio", "IDTarjeta", "FechaHoraOrden", "IDComercioShard")
+ESPEJOS = ("ClienteID", "ComercioID", "TarjetaID", "FechaHoraISO")
+
+class Fallas:
+    def __init__(self):
+        self.n, self.casos = 0, 0
+
+    def check(self, ok, msg):
+        self.casos += 1
+        if not ok:
+            self.n += 1
+            if self.n <= 20:
+                print("  FALLA:", msg)
+
+def _body(r):
+    return json.loads(r["body"])
+
+def _ts(it):
+    # como utils_search._sort_ts, pero escrito aparte
+    v = it.get("FechaHoraOrden") or it.get("FechaHoraISO")
+    return v[:10] + " " + v[11:19]
+
+# ---------------------------------------------------------------- búsquedas
+
+def cargar(res, filas, rnd):
+    # Importa con el handler (espejos, shards, contadores) y después deja un 10%
+    # de filas sólo con atributos legacy y otro 10% sólo con los nuevos, para
+    # que el merge vea ítems en uno, dos o más flujos
+    import ImportTransacciones as imp
+    for i in range(0, len(filas), 500):
+        r = imp.lambda_handler({"body": json.dumps(filas[i:i + 500])}, None)
+        assert r["statusCode"] == 200, r["body"]
+    t = res.Table(imp.TABLE_NAME)
+    cambiadas = []
+    for it in list(t.items.values()):
+        x = rnd.random()
+        if x < 0.1:
+            cambiadas.append({k: v for k, v in it.items() if k not in NUEVOS})
+        elif x < 0.2:
+            cambiadas.append({k: v for k, v in it.items() if k not in ESPEJOS})
+    t.cargar(cambiadas)
+    return list(t.items.values())
+
+def esperado(items, key_name, claves, ini=None, fin=None, canales=None, monto_min=None):
+    # Fuerza bruta: filas de las claves (por el atributo nuevo o su espejo) en el
+    # rango; sin rango, el mes del movimiento más reciente
+    legacy = LEGACY[key_name]
+    out = []
+    for it in items:
+        if it.get(key_name) not in claves and it.get(legacy) not in claves:
+            continue
+        if ini is not None and not ini <= _ts(it)[:10] <= fin:
+            continue
+        if canales is not None and it.get("Canal") not in canales:
+            continue
+        if monto_min is not None and not (it.get("Monto") is not None and it["Monto"] >= monto_min):
+            continue
+        out.append(it)
+    if ini is None and out:
+        mes = max(_ts(it) for it in out)[:7]
+        out = [it for it in out if _ts(it)[:7] == mes]
+    return out
+
+def paginar(h, params, post=False):
+    # Todas las páginas de una búsqueda; (filas, páginas)
+    filas, paginas, p = [], 0, dict(params)
+    while True:
+        ev = {"body": json.dumps(p)} if post else {"queryStringParameters": p}
+        b = _body(h.lambda_handler(ev, None))
+        assert b.get("ok"), b
+        filas += b["data"]
+        paginas += 1
+        if not b["cursor"]:
+            return filas, paginas
+        p = dict(params, cursor=b["cursor"])
+
+def verificar_busquedas(f, items, hs, u, rnd):
+    por_clave = {k: sorted({int(it.get(k) or it.get(LEGACY[k])) for it in items
+                            if it.get(k) or it.get(LEGACY[k])}) for k in LEGACY}
+    muestras = {
+        "IDCliente": rnd.sample(por_clave["IDCliente"], 15),
+        "IDComercio": [1, 2, 3] + rnd.sample(por_clave["IDComercio"], 7),
+        "IDTarjeta": u.largas[:5] + rnd.sample(por_clave["IDTarjeta"], 10),
+    }
+    consultas = [
+        ({"desde": "2000-01-01", "hasta": "2100-12-31"}, ("2000-01-01", "2100-12-31")),
+        ({"fecha": "2025-02"}, ("2025-02-01", "2025-02-28")),
+        ({}, None),
+        ({"desde": "2024-10-01", "hasta": "2025-03-15", "Canal": "POS,Web", "monto_min": "30"},
+         ("2024-10-01", "2025-03-15")),
+    ]
+    handler = {"IDCliente": hs["BusquedaCliente"], "IDComercio": hs["BusquedaComercio"],
+               "IDTarjeta": hs["BusquedaTarjeta"]}
+    for key_name, claves in muestras.items():
+        grupos = [[c] for c in claves] + [claves[:5]]
+        for grupo in grupos:
+            for params, rango in consultas:
+                ini, fin = rango or (None, None)
+                canales = set(params["Canal"].split(",")) if "Canal" in params else None
+                mm = Decimal(params["monto_min"]) if "monto_min" in params else None
+                exp = esperado(items, key_name, set(grupo), ini, fin, canales, mm)
+                multi = len(grupo) > 1
+                q = dict(params, limit="7")
+                if multi:
+                    q[key_name] = grupo
+                else:
+                    q[key_name] = str(grupo[0])
+                got, _ = paginar(handler[key_name], q, post=multi)
+                ids = [x["IDTransaccion"] for x in got]
+                caso = f"{key_name}={grupo} {params}"
+                f.check(len(ids) == len(set(ids)), f"{caso}: IDTransaccion repetidos")
+                f.check(set(ids) == {it["IDTransaccion"] for it in exp},
+                        f"{caso}: {len(set(ids))} filas, esperadas {len(exp)}")
+                ts = [_ts(x) for x in got]
+                f.check(all(a >= b for a, b in zip(ts, ts[1:])), f"{caso}: fuera de orden")
+
+    # Cursores: firmados y atados a la consulta
+    h = hs["BusquedaCliente"]
+    p = {"IDCliente": str(muestras["IDCliente"][0]), "desde": "2000-01-01", "hasta": "2100-12-31", "limit": "1"}
+    cur = _body(h.lambda_handler({"queryStringParameters": p}, None))["cursor"]
+    if cur:
+        body, sig = cur.split(".")
+        alterado = ("A" if body[0] != "A" else "B") + body[1:] + "." + sig
+        r = h.lambda_handler({"queryStringParameters": dict(p, cursor=alterado)}, None)
+        f.check(r["statusCode"] == 400, "cursor alterado aceptado")
+        r = h.lambda_handler({"queryStringParameters": dict(p, cursor=cur, hasta="2100-12-30")}, None)
+        f.check(r["statusCode"] == 400, "cursor de otra consulta aceptado")
+
+# ---------------------------------------------------------------- normalización
+
+def _int_ref(x):
+    try:
+        if x in (None, "", "NULL", "null"):
+            return None
+        return int(str(x).strip())
+    except Exception:
+        return None
+
+def _dec_ref(x):
+    if x in (None, "", "NULL", "null"):
+        return None
+    try:
+        return Decimal(str(x).strip().replace(" ", "").replace(",", ""))
+    except Exception:
+        try:
+            return Decimal(str(float(x)))
+        except Exception:
+            return None
+
+def _dt_ref(fecha, hora):
+    try:
+        dt = datetime.fromisoformat(f"{fecha}T{hora}")
+    except ValueError:
+        try:
+            dt = datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M:%S")
+        except Exception:
+            raise ValueError(f"Fecha/Hora inválidas: {fecha} {hora}")
+    return dt
+
+def normalizar_ref(it):
+    # La normalización campo a campo anterior al esquema compilado
+    from utils_campos import STRING_FIELDS, DEC_FIELDS, INT_FIELDS
+    it = dict(it)
+    it.setdefault("IDTransaccion", it.get("TransaccionID"))
+    it.setdefault("IDCliente", it.get("ClienteID"))
+    it.setdefault("IDComercio", it.get("ComercioID"))
+    it.setdefault("IDTarjeta", it.get("TarjetaID"))
+    if not all(k in it and it[k] not in (None, "") for k in ("IDTransaccion", "IDCliente", "IDComercio", "Fecha", "Hora")):
+        return None
+    clean = {"IDTransaccion": str(it["IDTransaccion"])}
+    for k in ("IDCliente", "IDComercio", "IDTarjeta", "IDMoneda", "IDCanal", "IDEstado"):
+        v = _int_ref(it.get(k))
+        if v is not None:
+            clean[k] = v
+            if k in LEGACY:
+                clean[LEGACY[k]] = v
+    for k in STRING_FIELDS:
+        v = it.get(k)
+        if v not in (None, ""):
+            clean[k] = str(v).strip()
+    for k in DEC_FIELDS:
+        v = _dec_ref(it.get(k))
+        if v is not None:
+            clean[k] = v
+    for k in INT_FIELDS:
+        v = _int_ref(it.get(k))
+        if v is not None:
+            clean[k] = v
+    clean["Fecha"], clean["Hora"] = str(it["Fecha"]), str(it["Hora"])
+    dt = _dt_ref(clean["Fecha"], clean["Hora"])
+    clean["FechaHoraOrden"] = dt.strftime("%Y-%m-%d#%H:%M:%S")
+    clean["FechaHoraISO"] = dt.strftime("%Y-%m-%dT%H:%M:%S")
+    fc = it.get("FechaCarga")
+    if fc:
+        s = str(fc)
+        try:
+            if " " in s and "T" not in s:
+                s = datetime.strptime(s, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S%z")
+        except Exception:
+            pass
+        clean["FechaCarga"] = s
+    return clean
+
+def _variantes(fila, rnd):
+    # La fila tal cual, como CSV (todo string), con alias legacy y con valores sucios
+    yield fila
+    yield {k: str(v) for k, v in fila.items()}
+    legacy = dict(fila)
+    for nuevo, viejo in LEGACY.items():
+        legacy[viejo] = legacy.pop(nuevo)
+    legacy["TransaccionID"] = legacy.pop("IDTransaccion")
+    yield legacy
+    sucia = dict(fila)
+    sucia["Monto"] = rnd.choice(["1,234.50", " 12.5 ", "1 234", "NULL", "", "abc", 7, 7.25])
+    sucia["IDTarjeta"] = rnd.choice(["", "null", " 42 ", "x1", None])
+    sucia["Fraude"] = rnd.choice(["1", "0", "", "no"])
+    sucia["Estado"] = rnd.choice(["  Aprobada ", "", None])
+    sucia["Hora"] = rnd.choice([fila["Hora"], fila["Hora"][:5], "25:00:00", ""])
+    sucia["Fecha"] = rnd.choice([fila["Fecha"], fila["Fecha"].replace("-0", "-"), "2025-02-30"])
+    sucia["FechaCarga"] = rnd.choice(["2025-01-01 10:00:00", "2025-01-01T10:00:00", "ayer", ""])
+    sucia["Extra"] = "ignorado"
+    yield sucia
+    sin = dict(fila)
+    sin.pop(rnd.choice(["IDCliente", "IDComercio", "Fecha", "Hora", "IDTarjeta", "Monto"]))
+    yield sin
+
+def verificar_normalizacion(f, filas, rnd):
+    import ImportTransacciones as imp
+    from utils_bulk import HASH_ATTR
+    n = 0
+    for fila in filas:
+        for v in _variantes(fila, rnd):
+            try:
+                ref = normalizar_ref(v)
+            except ValueError:
+                ref = ValueError
+            try:
+                got = imp.normalize_row(v)
+                if got is not None:
+                    got = {k: x for k, x in got.items() if k not in (HASH_ATTR, "IDComercioShard")}
+            except ValueError:
+                got = ValueError
+            f.check(got == ref, f"normalize_row({v}) = {got}, esperado {ref}")
+            n += 1
+    # normalize_batch: mismas filas, las inválidas sólo cuentan como rechazadas
+    variantes = [v for fila in filas[:200] for v in _variantes(fila, rnd)]
+    rows, rechazadas = imp.normalize_batch(variantes)
+    f.check(len(rows) + rechazadas == len(variantes), "normalize_batch pierde filas")
+    return n
+
+# ---------------------------------------------------------------- velocidad
+
+def verificar_velocidad(f, items, h, u, rnd):
+    por_tarjeta = {}
+    for it in items:
+        idt = it.get("IDTarjeta", it.get("TarjetaID"))
+        if idt is not None:
+            por_tarjeta.setdefault(int(idt), []).append(it)
+    tarjetas = u.largas[:10] + rnd.sample(sorted(por_tarjeta), 10)
+    pasos = {"minutos": timedelta(minutes=1), "horas": timedelta(hours=1), "dias": timedelta(days=1)}
+    for idt in tarjetas:
+        filas = por_tarjeta.get(idt, [])
+        refs = [u.hasta] + [datetime.strptime(_ts(x), "%Y-%m-%d %H:%M:%S") + timedelta(seconds=rnd.randrange(-90, 90))
+                            for x in rnd.sample(filas, min(3, len(filas)))]
+        for ref in refs:
+            ventanas = {"minutos": rnd.choice([1, 5, 60, 1440]), "horas": rnd.choice([1, 6, 30]),
+                        "dias": rnd.choice([1, 7, 30])}
+            q = dict({k: str(v) for k, v in ventanas.items()}, IDTarjeta=str(idt),
+                     hasta=ref.strftime("%Y-%m-%dT%H:%M:%S"))
+            b = _body(h.lambda_handler({"queryStringParameters": q}, None))
+            assert b.get("ok"), b
+            for w in b["ventanas"]:
+                unidad, n = w["unidad"], w["n"]
+                if unidad == "minutos":
+                    base = ref.replace(second=0)
+                elif unidad == "horas":
+                    base = ref.replace(minute=0, second=0)
+                else:
+                    base = ref.replace(hour=0, minute=0, second=0)
+                ini, fin = base - pasos[unidad] * (n - 1), base + pasos[unidad]
+                dentro = [x for x in filas
+                          if ini <= datetime.strptime(_ts(x), "%Y-%m-%d %H:%M:%S") < fin]
+                exp = (len(dentro), sum((x.get("Monto") or Decimal(0) for x in dentro), Decimal(0)),
+                       sum(1 for x in dentro if x.get("Fraude")))
+                got = (int(w["cantidad"]), Decimal(str(w["monto"])), int(w["fraude"]))
+                f.check(got == exp, f"IDTarjeta={idt} hasta={ref} {unidad}={n}: {got}, esperado {exp}")
+
+# ----------------------------------------------------------------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--filas", type=int, default=20000)
+    ap.add_argument("--semilla", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    res = recurso_local(os.environ["TABLA_TRANSACCION"], os.environ["TABLA_COMERCIO"],
+                        os.environ["TABLA_COMERCIOS_AGREG"], legacy=True,
+                        vel=os.environ["TABLA_VELOCIDAD_TARJETA"])
+    utils_ddb.tabla = res.Table
+    import importlib
+    hs = {m: importlib.import_module(m) for m in ("BusquedaCliente", "BusquedaComercio", "BusquedaTarjeta",
+                                                  "VelocidadTarjeta")}
+    rnd = random.Random(args.semilla)
+    u = datos.Universo(semilla=args.semilla, comercios=200, clientes=2000)
+    filas = datos.transacciones(u, args.filas)
+
+    total = 0
+    f = Fallas()
+    n = verificar_normalizacion(f, filas[:2000], rnd)
+    print(f"normalizacion: {n} filas, {f.n} fallas")
+    total += f.n
+
+    items = cargar(res, filas, rnd)
+    f = Fallas()
+    verificar_busquedas(f, items, hs, u, rnd)
+    print(f"busquedas: {f.casos} comprobaciones, {f.n} fallas")
+    total += f.n
+
+    f = Fallas()
+    verificar_velocidad(f, items, hs["VelocidadTarjeta"], u, rnd)
+    print(f"velocidad: {f.casos} ventanas, {f.n} fallas")
+    total += f.n
+
+    print("ok" if not total else f"{total} fallas")
+    return 1 if total else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from utils_metrics import llamar, THROTTLE_CODES
+from utils_bulk import MAX_INTENTOS, sleep_backoff
+
+# Contadores incrementales: se acumulan en memoria por clave y se aplican con
+# un UpdateItem ADD por clave (coalesce de todas las filas del lote), o varios
+# si la clave acumula más de MAX_ADDS atributos.
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("AGREGADOS_HILOS", "16")))
+
+MESES = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
+
+def add_counter(acc, key, adds, sets=None):
+    # acc: {key: {"add": {attr: n}, "set": {attr: v}}}
+    slot = acc.get(key)
+    if slot is None:
+        slot = acc[key] = {"add": {}, "set": {}}
+    a = slot["add"]
+    for k, v in adds.items():
+        a[k] = a.get(k, 0) + v
+    for k, v in (sets or {}).items():
+        slot["set"].setdefault(k, v)
+
+# Tope de atributos ADD por UpdateItem: una tarjeta con mucha actividad en un día
+# suma cientos de contadores de hora/minuto, y la expresión no puede pasar de 4 KB
+# (con 100 atributos queda en ~1,5 KB)
+MAX_ADDS = int(os.environ.get("AGREGADOS_MAX_ATRIBUTOS", "100"))
+
+def _update_args(key, slot):
+    # Uno o más UpdateItem para la clave; los SET (if_not_exists) van en cada uno
+    names, values, setp = {}, {}, []
+    for n, (k, v) in enumerate(slot["set"].items()):
+        names[f"#s{n}"] = k
+        values[f":s{n}"] = v
+        setp.append(f"#s{n} = if_not_exists(#s{n}, :s{n})")
+    adds = list(slot["add"].items())
+    out = []
+    for i in range(0, len(adds), MAX_ADDS):
+        n_, v_, add = dict(names), dict(values), []
+        for n, (k, v) in enumerate(adds[i:i + MAX_ADDS]):
+            n_[f"#a{n}"] = k
+            v_[f":a{n}"] = v if isinstance(v, Decimal) else Decimal(v)
+            add.append(f"#a{n} :a{n}")
+        expr = "ADD " + ", ".join(add)
+        if setp:
+            expr += " SET " + ", ".join(setp)
+        out.append({"Key": key, "UpdateExpression": expr,
+                    "ExpressionAttributeNames": n_, "ExpressionAttributeValues": v_})
+    return out
+
+def _aplicar(t, kw):
+    # UpdateItem con reintento (backoff + jitter) de los throttles
+    intento = 0
+    while True:
+        try:
+            return llamar("UpdateItem", t.update_item, kw, t.name, intento=intento)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in THROTTLE_CODES or intento >= MAX_INTENTOS:
+                raise
+            intento += 1
+            sleep_backoff(intento)
+
+def apply_counter_sets(sets):
+    # UpdateItem de los acumuladores de varias tablas [(table, acc, key_fn)], en una
+    # sola tanda del pool. key_fn convierte la clave del acumulador en la Key de
+    # DynamoDB. Devuelve la cantidad de UpdateItem ejecutados. Si alguno falla, en
+    # cada acc quedan sólo los atributos sin aplicar y se propaga el ClientError.
+    jobs = [(t, acc, k, kw) for t, acc, key_fn in sets for k, slot in acc.items() if slot["add"]
+            for kw in _update_args(key_fn(k), slot)]
+    fs = [(_pool.submit(_aplicar, t, kw), acc, k, kw) for t, acc, k, kw in jobs]
+    wait([f for f, *_ in fs])
+    error = None
+    for f, acc, k, kw in fs:
+        if f.exception() is None:
+            add = acc[k]["add"]
+            for n, a in kw["ExpressionAttributeNames"].items():
+                if n.startswith("#a"):
+                    add.pop(a, None)
+        elif error is None:
+            error = f.exception()
+    for _, acc, _ in sets:
+        for k in [k for k, slot in acc.items() if not slot["add"]]:
+            del acc[k]
+    if error is not None:
+        raise error
+    return len(jobs)
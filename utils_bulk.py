@@ -0,0 +1,244 @@
+import os, time, random, threading, hashlib, base64
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError
+from utils_metrics import llamar, resumen_escritura, THROTTLE_CODES
+
+# Escritura masiva compartida por los importadores: BatchWriteItem de 25 ítems
+# en paralelo, reintento de UnprocessedItems con backoff exponencial + jitter,
+# presupuesto de filas/seg y de-duplicación por clave antes de enviar.
+WORKERS      = int(os.environ.get("IMPORT_WORKERS", "8"))
+MAX_WPS      = float(os.environ.get("IMPORT_MAX_WPS", "0"))  # 0 = sin límite
+MAX_INTENTOS = int(os.environ.get("IMPORT_MAX_INTENTOS", "8"))
+BACKOFF_BASE = 0.05
+BACKOFF_MAX  = 5.0
+BATCH = 25
+
+# Detección de cambios: cada ítem guarda un hash de su contenido y, al reimportar,
+# las filas cuyo hash coincide con el guardado no se vuelven a escribir
+DETECTAR_CAMBIOS = os.environ.get("IMPORT_DETECTAR_CAMBIOS", "1") == "1"
+HASH_ATTR = "HashContenido"
+
+def content_hash(item, skip=()):
+    # Hash estable del ítem (orden de atributos indistinto); skip = metadatos que no cuentan.
+    # 8 bytes en base64 (11 caracteres): va en cada ítem y en cada copia de los GSI
+    partes = [f"{k}={v!r}" for k, v in sorted(item.items()) if k != HASH_ATTR and k not in skip]
+    h = hashlib.blake2b("\x1f".join(partes).encode(), digest_size=8).digest()
+    return base64.urlsafe_b64encode(h).rstrip(b"=").decode()
+
+def conteos(stats):
+    # insertados / actualizados / sin_cambios; sin detección de cambios todo lo escrito cuenta como insertado
+    return {"insertados": stats.get("insertados", stats["escritos"]),
+            "actualizados": stats.get("actualizados", 0), "sin_cambios": stats.get("sin_cambios", 0)}
+
+class Budget:
+    # Token bucket de filas/segundo compartido por los hilos de escritura
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, n):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= n or self.tokens >= self.rate:
+                    self.tokens -= n
+                    return
+                wait_s = (n - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+def sleep_backoff(intento):
+    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** intento))))
+
+class BulkWriter:
+    # Reemplazo de table.batch_writer(overwrite_by_pkeys=...) con la misma API put_item.
+    # on_written(items) se invoca (bajo lock) con cada grupo de ítems confirmados.
+    # flush_size=None acumula todo el payload y de-duplica por clave antes de enviar;
+    # con un número, la de-duplicación es por ventana (para lecturas en streaming).
+    # detect_changes=True lee por lotes el HASH_ATTR guardado (más prev_attrs) antes de
+    # cada envío y omite las filas sin cambios; on_replaced(items) recibe, bajo lock,
+    # la versión anterior de cada fila reemplazada ya confirmada.
+    def __init__(self, table, key_attrs, workers=None, max_wps=None, on_written=None, flush_size=None,
+                 detect_changes=False, prev_attrs=(), on_replaced=None):
+        self.table = table
+        self.client = table.meta.client
+        self.key_attrs = list(key_attrs)
+        self.workers = workers or WORKERS
+        self.budget = Budget(MAX_WPS if max_wps is None else max_wps)
+        self.on_written = on_written
+        self.flush_size = flush_size
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = None
+        self.futures = set()
+        self.stats = {"escritos": 0, "reintentados": 0, "throttled": 0, "descartados": 0, "duplicados": 0}
+        self.detect_changes = detect_changes
+        if detect_changes:
+            self.prev_attrs = list(dict.fromkeys(self.key_attrs + [HASH_ATTR] + list(prev_attrs)))
+            self.on_replaced = on_replaced
+            self.previos = {}  # clave -> versión guardada de las filas a reemplazar
+            self.en_vuelo = set()  # claves enviadas y todavía sin confirmar
+            self.stats.update(insertados=0, actualizados=0, sin_cambios=0)
+
+    def __enter__(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.sync()
+        finally:
+            self.pool.shutdown(wait=True)
+            if any(self.stats.values()):
+                resumen_escritura(self.table.name, self.stats, time.perf_counter() - self.t0)
+        return False
+
+    def _key(self, item):
+        return tuple(item.get(a) for a in self.key_attrs)
+
+    def put_item(self, Item):
+        k = self._key(Item)
+        if k in self.pending:
+            self.stats["duplicados"] += 1
+        self.pending[k] = Item
+        if self.flush_size and len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        items = list(self.pending.values())
+        self.pending = {}
+        if self.detect_changes and items:
+            # una clave que vuelve en otra ventana se lee después de confirmada
+            # la escritura anterior; si no, el hash leído sería el viejo
+            with self.lock:
+                repetida = any(self._key(it) in self.en_vuelo for it in items)
+            if repetida:
+                self._drain(0)
+            items = self._cambiados(items)
+            with self.lock:
+                self.en_vuelo.update(self._key(it) for it in items)
+        for i in range(0, len(items), BATCH):
+            # acota la cola en memoria a unas pocas tandas por hilo
+            self._drain(self.workers * 2)
+            self.futures.add(self.pool.submit(self._write, items[i:i + BATCH]))
+
+    def _cambiados(self, items):
+        # Un BatchGetItem por cada 100 claves: quedan las filas nuevas y las distintas
+        # de lo guardado. La lectura y la escritura no son atómicas; una escritura
+        # concurrente de la misma clave entre ambas puede quedar pisada, como antes.
+        prev = {self._key(p): p for p in
+                batch_get(self.table, [{a: it[a] for a in self.key_attrs} for it in items],
+                          projection=self.prev_attrs, workers=self.workers)}
+        out = []
+        for it in items:
+            k = self._key(it)
+            p = prev.get(k)
+            if p is None:
+                out.append(it)
+            elif p.get(HASH_ATTR) == it.get(HASH_ATTR):
+                self.stats["sin_cambios"] += 1
+            else:
+                self.previos[k] = p
+                out.append(it)
+        return out
+
+    def sync(self):
+        # Envía lo pendiente y espera confirmación de todas las tandas
+        self.flush()
+        self._drain(0)
+
+    def _drain(self, max_pending):
+        while len(self.futures) > max_pending:
+            done, self.futures = wait(self.futures, return_when=FIRST_COMPLETED)
+            for f in done:
+                f.result()  # propaga ClientError no recuperables
+
+    def _write(self, items):
+        try:
+            self._write_batch(items)
+        finally:
+            if self.detect_changes:
+                with self.lock:
+                    self.en_vuelo.difference_update(self._key(it) for it in items)
+
+    def _write_batch(self, items):
+        name = self.table.name
+        reqs = [{"PutRequest": {"Item": it}} for it in items]
+        intento = 0
+        while reqs:
+            self.budget.take(len(reqs))
+            try:
+                r = llamar("BatchWriteItem", self.client.batch_write_item, {"RequestItems": {name: reqs}},
+                           name, intento=intento)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in THROTTLE_CODES:
+                    raise
+                with self.lock:
+                    self.stats["throttled"] += 1
+                r = {"UnprocessedItems": {name: reqs}}
+            left = r.get("UnprocessedItems", {}).get(name, [])
+            ok = len(reqs) - len(left)
+            with self.lock:
+                self.stats["escritos"] += ok
+                if ok and (self.on_written or self.detect_changes):
+                    done = [x["PutRequest"]["Item"] for x in reqs if x not in left] if left else items
+                    if self.detect_changes:
+                        viejos = [p for p in (self.previos.pop(self._key(x), None) for x in done) if p is not None]
+                        self.stats["actualizados"] += len(viejos)
+                        self.stats["insertados"] += len(done) - len(viejos)
+                        if viejos and self.on_replaced:
+                            self.on_replaced(viejos)
+                    if self.on_written:
+                        self.on_written(done)
+            if not left:
+                return
+            intento += 1
+            if intento > MAX_INTENTOS:
+                with self.lock:
+                    self.stats["descartados"] += len(left)
+                return
+            with self.lock:
+                self.stats["reintentados"] += len(left)
+            items = [x["PutRequest"]["Item"] for x in left]
+            reqs = left
+            sleep_backoff(intento)
+
+GET_BATCH = 100
+
+def _get_chunk(client, name, keys, projection):
+    req = {"Keys": keys}
+    if projection:
+        req["ProjectionExpression"] = ", ".join(f"#p{i}" for i in range(len(projection)))
+        req["ExpressionAttributeNames"] = {f"#p{i}": a for i, a in enumerate(projection)}
+    out, intento = [], 0
+    while req["Keys"]:
+        r = llamar("BatchGetItem", client.batch_get_item, {"RequestItems": {name: req}}, name, intento=intento)
+        out.extend(r.get("Responses", {}).get(name, []))
+        left = r.get("UnprocessedKeys", {}).get(name, {}).get("Keys", [])
+        if not left:
+            break
+        intento += 1
+        if intento > MAX_INTENTOS:
+            raise RuntimeError(f"BatchGetItem: {len(left)} claves sin procesar tras {MAX_INTENTOS} reintentos")
+        req = dict(req, Keys=left)
+        sleep_backoff(intento)
+    return out
+
+def batch_get(table, keys, projection=None, workers=None):
+    # BatchGetItem en tandas de 100 (en paralelo) con reintento de UnprocessedKeys
+    chunks = [keys[i:i + GET_BATCH] for i in range(0, len(keys), GET_BATCH)]
+    if not chunks:
+        return []
+    client, name = table.meta.client, table.name
+    if len(chunks) == 1:
+        return _get_chunk(client, name, chunks[0], projection)
+    with ThreadPoolExecutor(max_workers=min(workers or WORKERS, len(chunks))) as pool:
+        parts = pool.map(lambda c: _get_chunk(client, name, c, projection), chunks)
+        return [it for part in parts for it in part]
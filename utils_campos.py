@@ -0,0 +1,9 @@
+# Campos de contenido de una transacción, por tipo. Los comparten la
+# normalización de ImportTransacciones y las columnas de ExportTransacciones.
+STRING_FIELDS = [
+    "CodigoAutorizacion","Estado","Canal","CodigoMoneda",
+    "NombreComercio","Sector","Producto",
+    "NombreCompleto","DNI","telefono","email","Tarjeta"
+]
+DEC_FIELDS = ["MontoBruto","TasaCambio","Monto"]
+INT_FIELDS = ["IndicadorAprobada","LatenciaAutorizacionMs","Fraude"]
@@ -0,0 +1,65 @@
+import os, json
+import boto3
+from botocore.exceptions import ClientError
+
+# Checkpoints de los procesos que se cortan y se re-invocan (importación desde
+# archivo, MigrarEsquema): un JSON en <uri>.checkpoint.json, en S3
+# (s3://bucket/key) o en disco; y la re-invocación asíncrona que continúa desde él.
+_s3 = None
+
+def s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client("s3")
+    return _s3
+
+def split_s3(uri):
+    bucket, _, key = uri[5:].partition("/")
+    return bucket, key
+
+def cargar(uri):
+    # None si no hay checkpoint (o no se puede leer)
+    try:
+        if uri.startswith("s3://"):
+            b, k = split_s3(uri)
+            body = s3().get_object(Bucket=b, Key=k + ".checkpoint.json")["Body"].read()
+            return json.loads(body)
+        with open(uri + ".checkpoint.json") as f:
+            return json.load(f)
+    except (OSError, ClientError, ValueError):
+        return None
+
+def guardar(uri, data):
+    # Propaga ClientError / OSError: un checkpoint perdido hace repetir trabajo
+    body = json.dumps(data)
+    if uri.startswith("s3://"):
+        b, k = split_s3(uri)
+        s3().put_object(Bucket=b, Key=k + ".checkpoint.json", Body=body.encode())
+    else:
+        with open(uri + ".checkpoint.json", "w") as f:
+            f.write(body)
+
+def borrar(uri):
+    try:
+        if uri.startswith("s3://"):
+            b, k = split_s3(uri)
+            s3().delete_object(Bucket=b, Key=k + ".checkpoint.json")
+        else:
+            os.remove(uri + ".checkpoint.json")
+    except (OSError, ClientError):
+        pass
+
+def remaining_ms(context):
+    return context.get_remaining_time_in_millis() if context is not None else 10 ** 9
+
+def en_lambda(context):
+    return context is not None and bool(getattr(context, "function_name", None))
+
+def reinvocar(context, payload):
+    # Continúa en una nueva invocación asíncrona de la misma Lambda (desde el
+    # checkpoint). False si no corre en Lambda; propaga ClientError
+    if not en_lambda(context):
+        return False
+    boto3.client("lambda").invoke(FunctionName=context.function_name, InvocationType="Event",
+                                  Payload=json.dumps(payload).encode())
+    return True
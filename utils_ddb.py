@@ -0,0 +1,177 @@
+import os, threading
+from decimal import Decimal
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer, DYNAMODB_CONTEXT
+
+# Acceso a DynamoDB compartido por todos los handlers: un único cliente de bajo
+# nivel por contenedor, creado recién en la primera llamada, y tablas con la
+# misma interfaz que usaba el código sobre boto3.resource (query/update_item con
+# condiciones de boto3 y valores Python, meta.client para las operaciones batch).
+POOL          = int(os.environ.get("DDB_POOL", "50"))  # >= hilos de búsqueda + escritura + agregados
+CONNECT_TIMEOUT = float(os.environ.get("DDB_CONNECT_TIMEOUT", "1"))
+READ_TIMEOUT  = float(os.environ.get("DDB_READ_TIMEOUT", "5"))
+RETRY_MODE    = os.environ.get("DDB_RETRY_MODE", "standard")
+MAX_INTENTOS  = int(os.environ.get("DDB_MAX_INTENTOS", "3"))
+
+_cliente = None
+_lock = threading.Lock()
+
+def cliente():
+    global _cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                import botocore.session
+                from botocore.config import Config
+                cfg = Config(max_pool_connections=POOL, tcp_keepalive=True,
+                             connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                             retries={"mode": RETRY_MODE, "max_attempts": MAX_INTENTOS})
+                _cliente = botocore.session.get_session().create_client("dynamodb", config=cfg)
+    return _cliente
+
+# ---- (de)serialización: caminos directos para los tipos frecuentes ----
+_ser_lento = TypeSerializer().serialize
+_des_lento = TypeDeserializer().deserialize
+_create_decimal = DYNAMODB_CONTEXT.create_decimal
+
+def ser(v):
+    t = type(v)
+    if t is str:
+        return {"S": v}
+    if t is int or t is Decimal:
+        n = str(_create_decimal(v))  # mismas validaciones que TypeSerializer
+        if n in ("Infinity", "NaN"):
+            raise TypeError("Infinity and NaN not supported")
+        return {"N": n}
+    if t is bool:
+        return {"BOOL": v}
+    if v is None:
+        return {"NULL": True}
+    if t is dict:
+        return {"M": {k: ser(x) for k, x in v.items()}}
+    if t is list:
+        return {"L": [ser(x) for x in v]}
+    return _ser_lento(v)
+
+def des(av):
+    if "S" in av:
+        return av["S"]
+    if "N" in av:
+        return Decimal(av["N"])
+    if "M" in av:
+        return {k: des(x) for k, x in av["M"].items()}
+    if "L" in av:
+        return [des(x) for x in av["L"]]
+    if "BOOL" in av:
+        return av["BOOL"]
+    if "NULL" in av:
+        return None
+    return _des_lento(av)
+
+def ser_item(item):
+    return {k: ser(v) for k, v in item.items()}
+
+def des_item(item):
+    # Ítems planos (el caso de TablaTransaccion): un acceso por atributo, sin despacho
+    out = {}
+    for k, av in item.items():
+        s = av.get("S")
+        if s is not None:
+            out[k] = s
+        else:
+            n = av.get("N")
+            out[k] = Decimal(n) if n is not None else des(av)
+    return out
+
+def _expresiones(kw):
+    # Condiciones de boto3 (Key/Attr) -> texto + placeholders, como hace boto3.resource
+    b = None
+    names = dict(kw.get("ExpressionAttributeNames") or {})
+    values = dict(kw.get("ExpressionAttributeValues") or {})
+    for param, es_clave in (("KeyConditionExpression", True), ("FilterExpression", False),
+                            ("ConditionExpression", False)):
+        c = kw.get(param)
+        if isinstance(c, ConditionBase):
+            b = b or ConditionExpressionBuilder()
+            e = b.build_expression(c, is_key_condition=es_clave)
+            kw[param] = e.condition_expression
+            names.update(e.attribute_name_placeholders)
+            values.update(e.attribute_value_placeholders)
+    if names:
+        kw["ExpressionAttributeNames"] = names
+    if values:
+        kw["ExpressionAttributeValues"] = {k: ser(v) for k, v in values.items()}
+    return kw
+
+class _ClienteTipado:
+    # Operaciones batch con valores Python (lo que antes daba resource.meta.client)
+    def batch_write_item(self, RequestItems, **kw):
+        req = {name: [{"PutRequest": {"Item": ser_item(r["PutRequest"]["Item"])}} for r in reqs]
+               for name, reqs in RequestItems.items()}
+        r = cliente().batch_write_item(RequestItems=req, **kw)
+        r["UnprocessedItems"] = {name: [{"PutRequest": {"Item": des_item(x["PutRequest"]["Item"])}} for x in left]
+                                 for name, left in r.get("UnprocessedItems", {}).items()}
+        return r
+
+    def batch_get_item(self, RequestItems, **kw):
+        req = {name: dict(q, Keys=[ser_item(k) for k in q["Keys"]]) for name, q in RequestItems.items()}
+        r = cliente().batch_get_item(RequestItems=req, **kw)
+        r["Responses"] = {name: [des_item(it) for it in items] for name, items in r.get("Responses", {}).items()}
+        r["UnprocessedKeys"] = {name: dict(q, Keys=[des_item(k) for k in q["Keys"]])
+                                for name, q in r.get("UnprocessedKeys", {}).items()}
+        return r
+
+class _Meta:
+    client = _ClienteTipado()
+
+class Tabla:
+    meta = _Meta()
+
+    def __init__(self, name):
+        self.name = name
+
+    def query(self, **kw):
+        kw = _expresiones(kw)
+        if kw.get("ExclusiveStartKey"):
+            kw["ExclusiveStartKey"] = ser_item(kw["ExclusiveStartKey"])
+        r = cliente().query(TableName=self.name, **kw)
+        r["Items"] = [des_item(it) for it in r.get("Items", [])]
+        if "LastEvaluatedKey" in r:
+            r["LastEvaluatedKey"] = des_item(r["LastEvaluatedKey"])
+        return r
+
+    def scan(self, **kw):
+        kw = _expresiones(kw)
+        if kw.get("ExclusiveStartKey"):
+            kw["ExclusiveStartKey"] = ser_item(kw["ExclusiveStartKey"])
+        r = cliente().scan(TableName=self.name, **kw)
+        r["Items"] = [des_item(it) for it in r.get("Items", [])]
+        if "LastEvaluatedKey" in r:
+            r["LastEvaluatedKey"] = des_item(r["LastEvaluatedKey"])
+        return r
+
+    def get_item(self, Key, **kw):
+        r = cliente().get_item(TableName=self.name, Key=ser_item(Key), **kw)
+        if "Item" in r:
+            r["Item"] = des_item(r["Item"])
+        return r
+
+    def put_item(self, Item, **kw):
+        kw = _expresiones(kw)
+        return cliente().put_item(TableName=self.name, Item=ser_item(Item), **kw)
+
+    def update_item(self, Key, **kw):
+        kw = _expresiones(kw)
+        r = cliente().update_item(TableName=self.name, Key=ser_item(Key), **kw)
+        if "Attributes" in r:
+            r["Attributes"] = des_item(r["Attributes"])
+        return r
+
+_tablas = {}
+
+def tabla(name):
+    # Objeto liviano: no toca la red ni crea el cliente
+    t = _tablas.get(name)
+    if t is None:
+        t = _tablas[name] = Tabla(name)
+    return t
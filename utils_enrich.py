@@ -0,0 +1,91 @@
+import os
+from utils_bulk import batch_get
+from utils_cache import TTLCache
+from utils_ddb import tabla
+
+# Join en lectura con TablaComercio (enrich=comercio): los datos del comercio se
+# toman del detalle que mantiene /import/comercios en lugar de la copia que cada
+# transacción trae desde la importación. Un BatchGetItem por página para los
+# IDComercio únicos que no están en la caché del contenedor.
+TABLE_DET = os.environ.get("TABLA_COMERCIO", "TablaComercio")
+CAMPOS_COMERCIO = [c.strip() for c in os.environ.get("ENRICH_CAMPOS_COMERCIO", "NombreComercio,Sector").split(",")
+                   if c.strip()]
+MODOS = ("comercio",)
+
+# El detalle de un comercio cambia poco: caché por contenedor, también de los
+# comercios sin detalle ({}), para no volver a pedirlos en cada página
+_cache = TTLCache(int(os.environ.get("CACHE_COMERCIO_MAX", "5000")),
+                  float(os.environ.get("CACHE_COMERCIO_TTL_SEG", "600")))
+
+def parse_enrich(params):
+    raw = (params or {}).get("enrich")
+    if raw in (None, ""):
+        return ()
+    vals = raw if isinstance(raw, list) else [raw]  # lista en el body JSON
+    if any(isinstance(v, (list, dict)) for v in vals):
+        raise ValueError("Valor de 'enrich' inválido")
+    modos = tuple(dict.fromkeys(m.strip().lower() for v in vals for m in str(v).split(",") if m.strip()))
+    bad = [m for m in modos if m not in MODOS]
+    if bad:
+        raise ValueError(f"Valor de 'enrich' inválido: {bad[0]} (use {', '.join(MODOS)})")
+    return modos
+
+def _id(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+def comercios(ids):
+    # {IDComercio: {campo: valor}} con los CAMPOS_COMERCIO de cada comercio
+    out, faltan = {}, []
+    for i in ids:
+        d = _cache.get(i)
+        if d is None:
+            faltan.append(i)
+        else:
+            out[i] = d
+    if faltan:
+        for it in batch_get(tabla(TABLE_DET), [{"IDComercio": i} for i in faltan],
+                            projection=["IDComercio"] + CAMPOS_COMERCIO):
+            i = _id(it["IDComercio"])
+            out[i] = {c: it[c] for c in CAMPOS_COMERCIO if c in it}
+        for i in faltan:
+            d = out.setdefault(i, {})
+            _cache.put(i, d)
+    return out
+
+def enriquecer(items):
+    # Completa cada ítem (en el lugar) con el detalle vigente de su comercio
+    ids = {i for i in (_id(it.get("IDComercio")) for it in items) if i is not None}
+    if not ids:
+        return items
+    det = comercios(sorted(ids))
+    for it in items:
+        d = det.get(_id(it.get("IDComercio")))
+        if d:
+            it.update(d)
+    return items
+
+def iter_enriquecidos(items, pagina=500):
+    # Igual que enriquecer, sobre un flujo: de a `pagina` ítems por vez
+    buf = []
+    for it in items:
+        buf.append(it)
+        if len(buf) >= pagina:
+            yield from enriquecer(buf)
+            buf = []
+    if buf:
+        yield from enriquecer(buf)
+
+def campos(fields, modos):
+    # Proyección pedida + lo que necesita el join; None = todos los atributos
+    if not fields or not modos:
+        return fields
+    return list(dict.fromkeys(list(fields) + ["IDComercio"]))
+
+def campos_salida(fields, modos):
+    # Los campos del join se devuelven aunque no estén en fields
+    if not fields or not modos:
+        return fields
+    return list(dict.fromkeys(list(fields) + CAMPOS_COMERCIO))
@@ -0,0 +1,309 @@
+import os, json, gzip, time, uuid, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from utils_ddb import tabla
+from utils_resp import dumps
+
+# Importaciones asíncronas: el POST guarda el payload en chunks, encola un
+# mensaje por chunk y responde 202 con el ID del job; los workers procesan los
+# chunks en paralelo y suman contadores en el registro del job.
+# Las tres piezas son intercambiables (configurar): cola (SQS o hilos locales),
+# payloads (S3 o memoria) y estado (DynamoDB o memoria).
+TABLA_JOBS   = os.environ.get("TABLA_IMPORT_JOBS", "TablaImportJobs")
+CHUNK_FILAS  = int(os.environ.get("JOBS_CHUNK_FILAS", "2000"))
+QUEUE_URL    = os.environ.get("JOBS_QUEUE_URL", "")
+BUCKET       = os.environ.get("JOBS_BUCKET", "")
+IMPORT_BUCKET = os.environ.get("IMPORT_BUCKET", "")  # origen de los archivos importados vía HTTP
+PREFIJO      = os.environ.get("JOBS_PREFIJO", "import-jobs/")
+TTL_DIAS     = int(os.environ.get("JOBS_TTL_DIAS", "7"))
+HILOS_LOCAL  = int(os.environ.get("JOBS_HILOS_LOCAL", "4"))
+
+_pool = ThreadPoolExecutor(max_workers=8)  # subida de chunks al crear el job
+
+def _ahora():
+    # Decimal: DynamoDB no acepta float
+    return Decimal(str(round(time.time(), 3)))
+
+# ---- payloads ----
+class S3Payloads:
+    def __init__(self, bucket, prefijo=PREFIJO):
+        import boto3
+        self.s3 = boto3.client("s3")
+        self.bucket, self.prefijo = bucket, prefijo
+
+    def put(self, job, n, filas):
+        key = f"{self.prefijo}{job}/{n:06d}.json.gz"
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=gzip.compress(dumps(filas), 5),
+                           ContentType="application/json", ContentEncoding="gzip")
+        return key
+
+    def get(self, ref):
+        return json.loads(gzip.decompress(self.s3.get_object(Bucket=self.bucket, Key=ref)["Body"].read()))
+
+    def delete(self, ref):
+        self.s3.delete_object(Bucket=self.bucket, Key=ref)
+
+class MemoriaPayloads:
+    def __init__(self):
+        self.data = {}
+
+    def put(self, job, n, filas):
+        ref = f"{job}/{n:06d}"
+        self.data[ref] = dumps(filas)  # serializado, como en S3
+        return ref
+
+    def get(self, ref):
+        return json.loads(self.data[ref])
+
+    def delete(self, ref):
+        self.data.pop(ref, None)
+
+# ---- colas ----
+class SQSCola:
+    def __init__(self, url):
+        import boto3
+        self.sqs = boto3.client("sqs")
+        self.url = url
+
+    def enviar(self, mensajes):
+        for i in range(0, len(mensajes), 10):
+            entries = [{"Id": str(n), "MessageBody": json.dumps(m)} for n, m in enumerate(mensajes[i:i + 10])]
+            for _ in range(3):
+                r = self.sqs.send_message_batch(QueueUrl=self.url, Entries=entries)
+                fallidos = {f["Id"] for f in r.get("Failed", [])}
+                entries = [e for e in entries if e["Id"] in fallidos]
+                if not entries:
+                    break
+            if entries:
+                raise RuntimeError(f"SQS rechazó {len(entries)} mensajes")
+
+class LocalCola:
+    # En proceso: cada mensaje se procesa en un hilo del pool (tests, bench, desarrollo)
+    def __init__(self, procesar=None, hilos=HILOS_LOCAL):
+        self.procesar = procesar
+        self.pool = ThreadPoolExecutor(max_workers=hilos)
+        self.pendientes = []
+        self.errores = []
+
+    def _uno(self, m):
+        try:
+            self.procesar(m)
+        except Exception as e:
+            self.errores.append((m, e))
+
+    def enviar(self, mensajes):
+        if self.procesar is None:
+            from ImportJobsWorker import procesar  # el worker importa los importadores
+            self.procesar = procesar
+        self.pendientes.extend(self.pool.submit(self._uno, m) for m in mensajes)
+
+    def esperar(self):
+        # Los chunks pueden encolar otros mensajes (dividir): espera hasta vaciar
+        while self.pendientes:
+            fs, self.pendientes = self.pendientes, []
+            wait(fs)
+
+# ---- estado ----
+class JobsDynamo:
+    # Un ítem por job; los workers suman con UpdateItem ADD. Cada chunk se cuenta
+    # una sola vez (conjunto Hechos), aunque SQS entregue el mensaje de nuevo.
+    def __init__(self, nombre=TABLA_JOBS):
+        self.table = tabla(nombre)
+
+    def crear(self, job):
+        self.table.put_item(Item=job)
+
+    def get(self, job_id):
+        return self.table.get_item(Key={"IDJob": job_id}, ConsistentRead=True).get("Item")
+
+    def fijar(self, job_id, **attrs):
+        names = {f"#f{n}": k for n, k in enumerate(attrs)}
+        values = {f":f{n}": v for n, v in enumerate(attrs.values())}
+        r = self.table.update_item(
+            Key={"IDJob": job_id}, ReturnValues="ALL_NEW",
+            UpdateExpression="SET " + ", ".join(f"#f{n} = :f{n}" for n in range(len(attrs))),
+            ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+        return r.get("Attributes")
+
+    def sumar(self, job_id, chunk, contadores, t0, **attrs):
+        # None si el chunk ya estaba contado; attrs (p. ej. Error) se fijan sólo si no
+        names = {f"#c{n}": k for n, k in enumerate(contadores)}
+        values = {f":c{n}": v for n, v in enumerate(contadores.values())}
+        add = [f"#c{n} :c{n}" for n in range(len(contadores))] + ["Hechos :h"]
+        sets = ["Inicio = if_not_exists(Inicio, :t0)", "Ultimo = :ahora"]
+        for n, (k, v) in enumerate(attrs.items()):
+            names[f"#a{n}"], values[f":a{n}"] = k, v
+            sets.append(f"#a{n} = :a{n}")
+        values.update({":h": {str(chunk)}, ":n": str(chunk), ":t0": t0, ":ahora": _ahora()})
+        try:
+            r = self.table.update_item(
+                Key={"IDJob": job_id}, ReturnValues="ALL_NEW",
+                UpdateExpression="ADD " + ", ".join(add) + " SET " + ", ".join(sets),
+                ConditionExpression="attribute_exists(IDJob) AND NOT contains(Hechos, :n)",
+                ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return None
+            raise
+        return r.get("Attributes")
+
+class MemoriaJobs:
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def crear(self, job):
+        with self.lock:
+            self.data[job["IDJob"]] = dict(job)
+
+    def get(self, job_id):
+        with self.lock:
+            j = self.data.get(job_id)
+            return dict(j) if j else None
+
+    def fijar(self, job_id, **attrs):
+        with self.lock:
+            self.data[job_id].update(attrs)
+            return dict(self.data[job_id])
+
+    def sumar(self, job_id, chunk, contadores, t0, **attrs):
+        with self.lock:
+            j = self.data[job_id]
+            hechos = j.setdefault("Hechos", set())
+            if str(chunk) in hechos:
+                return None
+            hechos.add(str(chunk))
+            for k, v in contadores.items():
+                j[k] = j.get(k, 0) + v
+            j.update(attrs)
+            j.setdefault("Inicio", t0)
+            j["Ultimo"] = _ahora()
+            return dict(j)
+
+# ---- configuración ----
+_cola = _payloads = _estado = None
+
+def configurar(cola=None, payloads=None, estado=None):
+    # Reemplaza las piezas por defecto (p. ej. LocalCola + Memoria* en tests)
+    global _cola, _payloads, _estado
+    _cola, _payloads, _estado = cola or _cola, payloads or _payloads, estado or _estado
+
+def cola():
+    global _cola
+    if _cola is None:
+        _cola = SQSCola(QUEUE_URL) if QUEUE_URL else LocalCola()
+    return _cola
+
+def payloads():
+    global _payloads
+    if _payloads is None:
+        _payloads = S3Payloads(BUCKET) if BUCKET else MemoriaPayloads()
+    return _payloads
+
+def estado():
+    global _estado
+    if _estado is None:
+        _estado = JobsDynamo()
+    return _estado
+
+# ---- API ----
+def origen(opciones, http=True):
+    # Objeto referenciado en lugar de filas en el body. Vía HTTP sólo una 'key' de
+    # IMPORT_BUCKET; 'path' (filesystem de la Lambda) y cualquier otro bucket son
+    # para invocación directa. ValueError si el pedido no está permitido.
+    if opciones.get("path"):
+        if http:
+            raise ValueError("'path' sólo se acepta en invocación directa")
+        return opciones["path"]
+    bucket, key = opciones.get("bucket") or IMPORT_BUCKET, opciones.get("key")
+    if not key:
+        return None
+    if not bucket:
+        raise ValueError("Falta 'bucket' (o IMPORT_BUCKET)")
+    if http and bucket != IMPORT_BUCKET:
+        raise ValueError("Vía HTTP sólo se aceptan objetos de IMPORT_BUCKET")
+    return f"s3://{bucket}/{key}"
+
+def crear(tipo, payload):
+    # payload: body del POST (lista, {"data": [...]} o {"bucket", "key"}).
+    # Guarda las filas por chunks y encola el trabajo. Devuelve (status, body).
+    opciones = payload if isinstance(payload, dict) else {}
+    try:
+        src = origen(opciones)
+    except ValueError as e:
+        return 400, {"ok": False, "msg": str(e)}
+    filas = payload if isinstance(payload, list) else opciones.get("data")
+    if src is None and not (isinstance(filas, list) and filas):
+        return 400, {"ok": False, "msg": "El job no tiene filas ('data') ni 'key'"}
+    if isinstance(cola(), SQSCola) and isinstance(payloads(), MemoriaPayloads):
+        # los workers corren en otra Lambda: no verían chunks guardados en memoria
+        return 500, {"ok": False, "msg": "JOBS_BUCKET no configurado: la cola SQS necesita los chunks en S3"}
+    job_id = uuid.uuid4().hex
+    ahora = _ahora()
+    job = {"IDJob": job_id, "Tipo": tipo, "Estado": "PENDIENTE", "Creado": ahora,
+           "Expira": int(ahora) + TTL_DIAS * 86400}
+    if src is None:
+        partes = [filas[i:i + CHUNK_FILAS] for i in range(0, len(filas), CHUNK_FILAS)]
+        job.update(Chunks=len(partes), FilasTotal=len(filas))
+        estado().crear(job)
+        refs = list(_pool.map(lambda np: payloads().put(job_id, *np), enumerate(partes)))
+        mensajes = [{"job": job_id, "tipo": tipo, "chunk": n, "ref": ref} for n, ref in enumerate(refs)]
+    else:
+        # Un primer mensaje recorre el objeto y encola sus chunks
+        job["Origen"] = src
+        estado().crear(job)
+        mensajes = [{"job": job_id, "tipo": tipo, "dividir": src, "formato": opciones.get("formato")}]
+    try:
+        cola().enviar(mensajes)
+    except Exception as e:
+        estado().fijar(job_id, Estado="ERROR", Error=str(e), Fin=_ahora())
+        return 500, {"ok": False, "msg": f"No se pudo encolar el job: {e}", "job": job_id}
+    return 202, {"ok": True, "job": job_id, "estado": "PENDIENTE", "chunks": job.get("Chunks"),
+                 "filas": job.get("FilasTotal"), "origen": src, "url": f"/import/jobs/{job_id}"}
+
+def registrar(job_id, chunk, contadores, t0, **attrs):
+    # Suma un chunk terminado y cierra el job cuando están todos. attrs se fijan en
+    # la misma escritura, sólo si el chunk no estaba contado (una reentrega de un
+    # chunk ya terminado no debe dejar su error en el job)
+    j = estado().sumar(job_id, chunk, contadores, t0, **attrs)
+    if j is not None:
+        _cerrar_si_completo(job_id, j)
+    return j
+
+def _cerrar_si_completo(job_id, j):
+    hechos = int(j.get("ChunksOk", 0)) + int(j.get("ChunksError", 0))
+    if j.get("Chunks") is not None and hechos >= int(j["Chunks"]) and j.get("Estado") == "PENDIENTE":
+        estado().fijar(job_id, Estado="CON_ERRORES" if j.get("ChunksError") else "COMPLETO", Fin=_ahora())
+
+def fijar_chunks(job_id, chunks, filas):
+    # Al terminar de dividir un objeto se conoce el total (los chunks pueden haber terminado antes)
+    j = estado().fijar(job_id, Chunks=chunks, FilasTotal=filas)
+    _cerrar_si_completo(job_id, j)
+
+def vista(j):
+    # Registro del job -> respuesta de /import/jobs/{id}
+    n = lambda k: int(j.get(k, 0))
+    chunks = j.get("Chunks")
+    hechos = n("ChunksOk") + n("ChunksError")
+    estado_job = j.get("Estado", "PENDIENTE")
+    if estado_job == "PENDIENTE" and (hechos or j.get("Inicio")):
+        estado_job = "EN_CURSO"
+    inicio = float(j["Inicio"]) if j.get("Inicio") else None
+    fin = float(j["Fin"]) if j.get("Fin") else None
+    seg = ((fin or time.time()) - inicio) if inicio else None
+    procesadas = n("Insertados") + n("Actualizados") + n("SinCambios") + n("Rechazados")
+    return {
+        "ok": True, "job": j["IDJob"], "tipo": j.get("Tipo"), "estado": estado_job,
+        "progreso": round(100.0 * hechos / int(chunks), 1) if chunks else None,
+        "chunks": int(chunks) if chunks is not None else None,
+        "chunks_ok": n("ChunksOk"), "chunks_error": n("ChunksError"),
+        "filas_total": int(j["FilasTotal"]) if j.get("FilasTotal") is not None else None,
+        "insertados": n("Insertados"), "actualizados": n("Actualizados"), "sin_cambios": n("SinCambios"),
+        "rechazados": n("Rechazados"),
+        "escritura": {"reintentados": n("Reintentados"), "throttled": n("Throttled"),
+                      "descartados": n("Descartados")},
+        "filas_por_seg": round(procesadas / seg, 1) if seg and seg > 0 else None,
+        "creado": float(j["Creado"]) if j.get("Creado") else None, "inicio": inicio, "fin": fin,
+        "origen": j.get("Origen"), "error": j.get("Error"),
+    }
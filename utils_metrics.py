@@ -0,0 +1,89 @@
+import os, sys, json, time, random
+from botocore.exceptions import ClientError
+
+# Instrumentación de llamadas a DynamoDB en formato EMF (CloudWatch Embedded
+# Metric Format): una línea JSON por llamada muestreada en stdout, que en Lambda
+# CloudWatch Logs convierte en métricas y localmente se lee tal cual.
+# Los errores y throttles se emiten siempre, sin muestreo.
+MUESTREO  = float(os.environ.get("METRICAS_MUESTREO", "0.1"))  # 0 = sólo errores
+NAMESPACE = os.environ.get("METRICAS_NAMESPACE", "ApiTransacciones")
+FUNCION   = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+
+THROTTLE_CODES = ("ProvisionedThroughputExceededException", "ThrottlingException",
+                  "RequestLimitExceeded")
+
+_UNIDADES = {"Latencia": "Milliseconds", "RCU": "Count", "WCU": "Count", "Items": "Count",
+             "Escaneados": "Count", "Paginas": "Count", "NoProcesados": "Count", "Reintentos": "Count",
+             "Throttles": "Count", "Errores": "Count", "Escritos": "Count", "Descartados": "Count"}
+
+def muestrear():
+    return MUESTREO >= 1 or (MUESTREO > 0 and random.random() < MUESTREO)
+
+def emitir(operacion, recurso, metricas, **props):
+    # recurso: índice o tabla; es la única dimensión además de la operación
+    linea = {
+        "_aws": {"Timestamp": int(time.time() * 1000), "CloudWatchMetrics": [{
+            "Namespace": NAMESPACE,
+            "Dimensions": [["Funcion", "Operacion", "Recurso"]],
+            "Metrics": [{"Name": k, "Unit": _UNIDADES.get(k, "None")} for k in metricas],
+        }]},
+        "Funcion": FUNCION, "Operacion": operacion, "Recurso": recurso, "Muestreo": MUESTREO,
+    }
+    linea.update(metricas)
+    linea.update((k, v) for k, v in props.items() if v is not None)
+    sys.stdout.write(json.dumps(linea, default=str, separators=(",", ":")) + "\n")
+
+def _capacidad(r):
+    # ConsumedCapacity: dict en Query/GetItem/UpdateItem, lista en las operaciones batch
+    cc = r.get("ConsumedCapacity")
+    if not cc:
+        return None
+    if isinstance(cc, dict):
+        cc = [cc]
+    return sum(c.get("CapacityUnits", 0) for c in cc)
+
+def _conteos(operacion, r, kw):
+    if operacion in ("Query", "Scan"):
+        return {"Items": r.get("Count", len(r.get("Items", []))), "Escaneados": r.get("ScannedCount", 0),
+                "Paginas": 1}
+    if operacion == "BatchWriteItem":
+        pedidos = sum(len(v) for v in kw["RequestItems"].values())
+        return {"Items": pedidos, "NoProcesados": sum(len(v) for v in r.get("UnprocessedItems", {}).values())}
+    if operacion == "BatchGetItem":
+        return {"Items": sum(len(v) for v in r.get("Responses", {}).values()),
+                "NoProcesados": sum(len(v.get("Keys", [])) for v in r.get("UnprocessedKeys", {}).values())}
+    return {"Items": 1}
+
+def llamar(operacion, fn, kw, recurso, clave=None, intento=0):
+    # Ejecuta fn(**kw) midiendo tiempo, capacidad consumida e ítems.
+    # Los ClientError se registran y se propagan sin cambios.
+    muestra = muestrear()
+    if muestra:
+        kw = dict(kw, ReturnConsumedCapacity="TOTAL")
+    t0 = time.perf_counter()
+    try:
+        r = fn(**kw)
+    except ClientError as e:
+        err = e.response.get("Error", {})
+        throttle = err.get("Code") in THROTTLE_CODES
+        emitir(operacion, recurso, {"Latencia": round((time.perf_counter() - t0) * 1000, 2),
+                                    "Errores": 0 if throttle else 1, "Throttles": 1 if throttle else 0,
+                                    "Reintentos": 1 if intento else 0},
+               Clave=clave, Error=err.get("Code"), Mensaje=err.get("Message"), Intento=intento or None)
+        raise
+    if muestra:
+        m = {"Latencia": round((time.perf_counter() - t0) * 1000, 2), "Reintentos": 1 if intento else 0}
+        m.update(_conteos(operacion, r, kw))
+        cu = _capacidad(r)
+        if cu is not None:
+            m["WCU" if operacion in ("BatchWriteItem", "UpdateItem", "PutItem") else "RCU"] = cu
+        emitir(operacion, recurso, m, Clave=clave, Intento=intento or None,
+               Continua=True if r.get("LastEvaluatedKey") else None)
+    return r
+
+def resumen_escritura(tabla, stats, segundos):
+    # Una línea por BulkWriter al cerrar, siempre: totales de la invocación
+    emitir("Escritura", tabla, {"Latencia": round(segundos * 1000, 2), "Escritos": stats["escritos"],
+                                "Reintentos": stats["reintentados"], "Throttles": stats["throttled"],
+                                "Descartados": stats["descartados"]},
+           Duplicados=stats.get("duplicados"), SinCambios=stats.get("sin_cambios"))
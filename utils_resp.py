@@ -0,0 +1,104 @@
+import os, json, zlib, base64
+from decimal import Decimal
+
+try:  # opcional: si está en el paquete/capa, serializa ~4x más rápido
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respuesta HTTP compartida por todos los handlers. Decimal sale como string
+# (mismo formato que json.dumps(default=str)), JSON compacto en UTF-8 y
+# compresión gzip/br según Accept-Encoding cuando el cuerpo lo justifica.
+COMPRIMIR_MIN = int(os.environ.get("RESP_COMPRIMIR_MIN", "1024"))  # bytes; 0 = nunca
+CHUNK_ITEMS   = int(os.environ.get("RESP_CHUNK_ITEMS", "1000"))
+GZIP_NIVEL    = 5
+BROTLI_NIVEL  = 4  # el 11 por defecto es demasiado lento para una respuesta en línea
+
+HEADERS = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return sorted(o, key=str)
+    return str(o)
+
+_enc = json.JSONEncoder(default=_default, separators=(",", ":"))
+
+def _dumps_std(data):
+    return _enc.encode(data).encode("utf-8")
+
+if orjson is not None:
+    def dumps(data):
+        try:
+            return orjson.dumps(data, default=_default)
+        except orjson.JSONEncodeError:
+            # p. ej. enteros de más de 64 bits (IDs recibidos tal cual): json sí los acepta
+            return _dumps_std(data)
+else:
+    dumps = _dumps_std
+
+def _chunks(data):
+    # Lista grande en data["data"]: se codifica por tramos para alimentar el
+    # compresor sin armar nunca el JSON completo sin comprimir
+    rows = data["data"]
+    head = dumps({k: v for k, v in data.items() if k != "data"})
+    yield (b"{" if head == b"{}" else head[:-1] + b",") + b'"data":['
+    for i in range(0, len(rows), CHUNK_ITEMS):
+        part = dumps(rows[i:i + CHUNK_ITEMS])[1:-1]
+        yield (b"," + part) if i else part
+    yield b"]}"
+
+def _accepts(event):
+    # Codificación preferida aceptada por el cliente (br > gzip), o None
+    headers = (event or {}).get("headers") or {}
+    raw = next((v for k, v in headers.items() if k.lower() == "accept-encoding"), "") or ""
+    ok = set()
+    for tok in raw.split(","):
+        name, _, params = tok.partition(";")
+        q = params.strip().replace(" ", "")
+        try:
+            if q.startswith("q=") and float(q[2:]) <= 0:
+                continue
+        except ValueError:
+            continue
+        ok.add(name.strip().lower())
+    if "br" in ok and brotli is not None:
+        return "br"
+    if "gzip" in ok or "*" in ok:
+        return "gzip"
+    return None
+
+def _compressor(enc):
+    if enc == "br":
+        c = brotli.Compressor(quality=BROTLI_NIVEL)
+        return c.process, c.finish
+    z = zlib.compressobj(GZIP_NIVEL, zlib.DEFLATED, 31)
+    return z.compress, z.flush
+
+def _compress(enc, parts):
+    feed, finish = _compressor(enc)
+    out = [feed(p) for p in parts]
+    out.append(finish())
+    return b"".join(out)
+
+def resp(code, data, event=None, headers=None):
+    # event: el evento HTTP original, sólo para leer Accept-Encoding
+    h = dict(HEADERS, **(headers or {}))
+    enc = _accepts(event) if COMPRIMIR_MIN > 0 else None
+    rows = data.get("data") if isinstance(data, dict) else None
+    if enc and isinstance(rows, list) and len(rows) > CHUNK_ITEMS:
+        body = _compress(enc, _chunks(data))
+    else:
+        raw = dumps(data)
+        if not enc or len(raw) < COMPRIMIR_MIN:
+            return {"statusCode": code, "headers": h, "body": raw.decode("utf-8")}
+        body = _compress(enc, [raw])
+    h["Content-Encoding"] = enc
+    h["Vary"] = "Accept-Encoding"
+    return {"statusCode": code, "headers": h, "isBase64Encoded": True,
+            "body": base64.b64encode(body).decode("ascii")}
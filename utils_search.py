@@ -1,9 +1,602 @@
-from boto3.dynamodb.conditions import Key
+import os, json, base64, hmac, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+import re
+from decimal import Decimal, InvalidOperation
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from utils_metrics import llamar
+from utils_shards import shard_count, shard_keys
+from utils_enrich import parse_enrich, enriquecer, campos, campos_salida
 
-def query_range(table, index_name, hash_attr, value, ini, fin, range_attr):
-    cond = Key(hash_attr).eq(value) & Key(range_attr).between(ini, fin)
-    return table.query(IndexName=index_name, KeyConditionExpression=cond, ScanIndexForward=False)
+# Paginación: tamaño de página por defecto y tope duro del servidor
+LIMIT_DEFAULT = int(os.environ.get("BUSQUEDA_LIMIT_DEFAULT", "100"))
+LIMIT_MAX     = int(os.environ.get("BUSQUEDA_LIMIT_MAX", "500"))
+CLAVES_MAX    = int(os.environ.get("BUSQUEDA_CLAVES_MAX", "50"))  # claves por consulta multi-clave
+CURSOR_SECRET = os.environ.get("CURSOR_SECRET", "").encode()
 
-def query_latest(table, index_name, hash_attr, value):
+# Pool compartido por el contenedor para consultar los índices en paralelo.
+# Las llamadas pasan por el cliente de botocore, que es thread-safe.
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("BUSQUEDA_HILOS", "8")))
+
+# Índices por clave de búsqueda: (índice, atributo hash, atributo rango, separador fecha/hora)
+SEARCH_INDEXES = {
+    "IDCliente": [
+        ("GSI_Cliente_Fecha",  "ClienteID",  "FechaHoraISO",   "T"),  # legacy
+        ("GSI_IDCliente_Fecha","IDCliente",  "FechaHoraOrden", "#"),  # nuevo
+    ],
+    "IDComercio": [
+        ("GSI_Comercio_Fecha",  "ComercioID",  "FechaHoraISO",   "T"),  # legacy
+        ("GSI_IDComercio_Fecha","IDComercio",  "FechaHoraOrden", "#"),  # nuevo
+        ("GSI_IDComercioShard_Fecha", "IDComercioShard", "FechaHoraOrden", "#"),  # comercios hot
+    ],
+    "IDTarjeta": [
+        ("GSI_Tarjeta_Fecha",  "TarjetaID",  "FechaHoraISO",   "T"),  # legacy
+        ("GSI_IDTarjeta_Fecha","IDTarjeta",  "FechaHoraOrden", "#"),  # nuevo
+    ],
+}
+
+# Índices sobre los espejos legacy (ClienteID/ComercioID/TarjetaID + FechaHoraISO).
+# Con SOLO_ESQUEMA_NUEVO=1 (tabla ya migrada con MigrarEsquema) no se consultan.
+LEGACY_INDEXES = {"GSI_Cliente_Fecha", "GSI_Comercio_Fecha", "GSI_Tarjeta_Fecha"}
+SOLO_ESQUEMA_NUEVO = os.environ.get("SOLO_ESQUEMA_NUEVO", "0") == "1"
+if SOLO_ESQUEMA_NUEVO:
+    SEARCH_INDEXES = {k: [t for t in tries if t[0] not in LEGACY_INDEXES] for k, tries in SEARCH_INDEXES.items()}
+
+# Índice con shards -> índice que reemplaza para los comercios hot (COMERCIOS_HOT)
+SHARD_INDEXES = {"GSI_IDComercioShard_Fecha": "GSI_IDComercio_Fecha"}
+
+# Índices que DynamoDB reportó como inexistentes (p. ej. legacy en tablas nuevas)
+_MISSING_INDEXES = set()
+
+_ser = TypeSerializer()
+_des = TypeDeserializer()
+
+class CursorInvalido(ValueError):
+    pass
+
+def query_range(table, index_name, hash_attr, value, ini, fin, range_attr, limit=None, start_key=None,
+                filter_expr=None, projection=None):
     cond = Key(hash_attr).eq(value)
-    return table.query(IndexName=index_name, KeyConditionExpression=cond, ScanIndexForward=False, Limit=1)
+    if ini is not None:
+        cond = cond & Key(range_attr).between(ini, fin)
+    kw = {"IndexName": index_name, "KeyConditionExpression": cond, "ScanIndexForward": False}
+    if limit:
+        kw["Limit"] = limit
+    if start_key:
+        kw["ExclusiveStartKey"] = start_key
+    if filter_expr is not None:
+        kw["FilterExpression"] = filter_expr
+    if projection:
+        # placeholders #pN: no chocan con los #nN que genera boto3 para las condiciones
+        kw["ProjectionExpression"] = ", ".join(f"#p{i}" for i in range(len(projection)))
+        kw["ExpressionAttributeNames"] = {f"#p{i}": a for i, a in enumerate(projection)}
+    return llamar("Query", table.query, kw, index_name, clave=value)
+
+def hash_values(index_try, value, con_shards=()):
+    # Valores de la clave hash a consultar en un índice: uno por shard en el
+    # índice con shards (ninguno si el comercio no es hot), y ninguno en el
+    # índice que éste reemplaza cuando el comercio es hot. con_shards son los
+    # índices con shards confirmados por _index_present: el plan no depende de
+    # lo que se descubra a mitad de la consulta.
+    idx = index_try[0]
+    if idx in SHARD_INDEXES:
+        return shard_keys(value) if idx in con_shards else []
+    if shard_count(value) and any(SHARD_INDEXES[s] == idx for s in con_shards):
+        return []
+    return [value]
+
+def _index_missing(e):
+    # Sólo "The table does not have the specified index: ..."; otras
+    # ValidationException que mencionan índices (p. ej. una clave mal tipada)
+    # no deben descartar el índice para todo el contenedor
+    err = e.response.get("Error", {})
+    return (err.get("Code") == "ValidationException"
+            and "does not have the specified index" in err.get("Message", ""))
+
+# Índices confirmados con una consulta de prueba (ver _index_present)
+_PRESENT_INDEXES = set()
+
+def _index_present(table, index_try):
+    # Una consulta Limit=1 por contenedor decide si el índice existe antes de
+    # armar el plan, así el primer pedido ya usa el índice correcto y todos los
+    # contenedores arman el mismo plan (y aceptan los mismos cursores)
+    idx, hattr = index_try[0], index_try[1]
+    if idx in _MISSING_INDEXES or idx in _PRESENT_INDEXES:
+        return idx not in _MISSING_INDEXES
+    kw = {"IndexName": idx, "KeyConditionExpression": Key(hattr).eq("#"), "Limit": 1}
+    try:
+        llamar("Query", table.query, kw, idx)
+        _PRESENT_INDEXES.add(idx)
+    except ClientError as e:
+        if not _index_missing(e):
+            raise  # un throttle no dice nada del índice: no se decide el plan sin saberlo
+        _MISSING_INDEXES.add(idx)
+    return idx not in _MISSING_INDEXES
+
+def _call_index(index_name, fn, *args, **kw):
+    # Ejecuta una consulta sobre un índice; None si el índice no existe. Cualquier
+    # otro ClientError (throttle, permisos) se propaga: tomarlo como índice agotado
+    # devolvería resultados truncados como si estuvieran completos
+    if index_name in _MISSING_INDEXES:
+        return None
+    try:
+        return fn(*args, **kw)
+    except ClientError as e:
+        if not _index_missing(e):
+            raise
+        _MISSING_INDEXES.add(index_name)
+        return None
+
+# Filtros del lado del servidor: parámetro -> (atributo, tipo)
+FILTERS = {
+    "Estado": ("Estado", str),
+    "Canal": ("Canal", str),
+    "Fraude": ("Fraude", int),
+    "IndicadorAprobada": ("IndicadorAprobada", int),
+}
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Atributos que la paginación necesita aunque el cliente no los pida
+_ALWAYS = ("IDTransaccion", "FechaHoraOrden") if SOLO_ESQUEMA_NUEVO else ("IDTransaccion", "FechaHoraOrden", "FechaHoraISO")
+
+def _lista(raw, p):
+    # "a,b" (query string) o ["a", "b"] (body JSON); ValueError con objetos o listas anidadas
+    vals = raw if isinstance(raw, list) else [raw]
+    if any(isinstance(v, (list, dict)) for v in vals):
+        raise ValueError(f"Parámetro '{p}' inválido: se esperan valores simples")
+    return [x.strip() for v in vals for x in str(v).split(",") if x.strip()]
+
+def parse_fields(params):
+    raw = (params or {}).get("fields")
+    if not raw:
+        return None
+    fields = _lista(raw, "fields")
+    bad = [f for f in fields if not _FIELD_RE.match(f)]
+    if bad:
+        raise ValueError(f"Campo inválido en 'fields': {bad[0]}")
+    return fields
+
+_NUM_MIN, _NUM_MAX = Decimal("1E-130"), Decimal("1E126")  # rango de un Number de DynamoDB
+
+def _monto(params, p):
+    # Decimal finito y representable en DynamoDB (38 dígitos); None si no vino
+    raw = params.get(p)
+    if raw in (None, ""):
+        return None
+    if isinstance(raw, bool):
+        raise ValueError(f"Parámetro '{p}' inválido")
+    try:
+        d = Decimal(str(raw).strip())
+    except InvalidOperation:
+        raise ValueError(f"Parámetro '{p}' inválido")
+    digitos = "".join(map(str, d.as_tuple().digits)).strip("0") if d.is_finite() else ""
+    if not d.is_finite() or (d and not _NUM_MIN <= abs(d) < _NUM_MAX) or len(digitos) > 38:
+        raise ValueError(f"Parámetro '{p}' fuera de rango")
+    return d
+
+def parse_filter(params):
+    # FilterExpression a partir de Estado, Canal, Fraude, IndicadorAprobada, monto_min/monto_max.
+    # Estado/Canal aceptan varios valores separados por coma.
+    params = params or {}
+    cond = None
+    def _and(c):
+        return c if cond is None else cond & c
+    for p, (attr, typ) in FILTERS.items():
+        raw = params.get(p)
+        if raw in (None, ""):
+            continue
+        try:
+            vals = [typ(v) for v in _lista(raw, p)]
+        except ValueError:
+            raise ValueError(f"Parámetro '{p}' inválido")
+        if not vals:
+            continue
+        cond = _and(Attr(attr).eq(vals[0]) if len(vals) == 1 else Attr(attr).is_in(vals))
+    lo, hi = _monto(params, "monto_min"), _monto(params, "monto_max")
+    if lo is not None and hi is not None:
+        cond = _and(Attr("Monto").between(lo, hi))
+    elif lo is not None:
+        cond = _and(Attr("Monto").gte(lo))
+    elif hi is not None:
+        cond = _and(Attr("Monto").lte(hi))
+    return cond
+
+def projection_for(index_tries, fields):
+    # Proyección pedida + claves de los índices (para ExclusiveStartKey y el merge)
+    if not fields:
+        return None
+    extra = [a for t in index_tries for a in (t[1], t[2])]
+    return list(dict.fromkeys(list(fields) + list(_ALWAYS) + extra))
+
+def trim_fields(items, fields):
+    if not fields:
+        return items
+    return [{f: it[f] for f in fields if f in it} for it in items]
+
+def parse_limit(params):
+    raw = (params or {}).get("limit")
+    if raw in (None, ""):
+        return LIMIT_DEFAULT
+    try:
+        n = int(str(raw).strip())
+    except ValueError:
+        raise ValueError("Parámetro 'limit' inválido")
+    if n < 1:
+        raise ValueError("Parámetro 'limit' debe ser >= 1")
+    return min(n, LIMIT_MAX)
+
+def _b64e(b):
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+
+def _b64d(s):
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+class SinCursorSecret(RuntimeError):
+    pass
+
+def _sign(raw):
+    # Sin clave cualquiera podría firmar un cursor: no se emiten ni se aceptan
+    if not CURSOR_SECRET:
+        raise SinCursorSecret("CURSOR_SECRET no configurado")
+    return hmac.new(CURSOR_SECRET, raw, hashlib.sha256).digest()[:16]
+
+def query_fingerprint(*parts):
+    # Ata el cursor a la consulta que lo generó (clave + rango)
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()[:12]
+
+def encode_cursor(state):
+    # Las posiciones (ExclusiveStartKey por índice) se guardan en formato tipado
+    state = dict(state)
+    state["p"] = [{a: _ser.serialize(v) for a, v in p.items()} if isinstance(p, dict) else p
+                  for p in state.get("p", [])]
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return _b64e(raw) + "." + _b64e(_sign(raw))
+
+def decode_cursor(token, fingerprint):
+    if not CURSOR_SECRET:
+        raise SinCursorSecret("CURSOR_SECRET no configurado")
+    try:
+        body, sig = str(token).split(".", 1)
+        raw = _b64d(body)
+        if not hmac.compare_digest(_sign(raw), _b64d(sig)):
+            raise CursorInvalido("Cursor inválido")
+        state = json.loads(raw)
+        state["p"] = [{a: _des.deserialize(v) for a, v in p.items()} if isinstance(p, dict) else p
+                      for p in state.get("p", [])]
+    except CursorInvalido:
+        raise
+    except Exception:
+        raise CursorInvalido("Cursor inválido")
+    if state.get("q") != fingerprint:
+        raise CursorInvalido("El cursor no corresponde a esta consulta")
+    return state
+
+def _sort_ts(item):
+    # "YYYY-MM-DD HH:MM:SS" comparable entre FechaHoraOrden y FechaHoraISO
+    v = item.get("FechaHoraOrden") or item.get("FechaHoraISO") or ""
+    return v[:10] + " " + v[11:19]
+
+class _IndexStream:
+    # Flujo descendente sobre un índice, paginado de a `limit` ítems.
+    # pos: None = sin empezar, "x" = agotado, dict = ExclusiveStartKey
+    def __init__(self, table, index_try, value, ini, fin, limit, pos=None, filter_expr=None, projection=None):
+        self.table = table
+        self.filter_expr, self.projection = filter_expr, projection
+        self.idx, self.hattr, self.rattr, _sep = index_try
+        self.value, self.ini, self.fin, self.limit = value, ini, fin, limit
+        self.buf, self.i = [], 0
+        self.start = self.lek = pos
+        self.done = pos == "x" or self.idx in _MISSING_INDEXES
+
+    def needs_fetch(self):
+        return not self.done and self.i >= len(self.buf)
+
+    def fetch(self):
+        self.start = self.lek
+        r = _call_index(self.idx, query_range, self.table, self.idx, self.hattr, self.value,
+                        self.ini, self.fin, self.rattr, limit=self.limit, start_key=self.lek,
+                        filter_expr=self.filter_expr, projection=self.projection)
+        if r is None:
+            self.buf, self.i, self.done = [], 0, True
+            return
+        self.buf, self.i = r.get("Items", []), 0
+        self.lek = r.get("LastEvaluatedKey")
+        if not self.lek:
+            self.done = True
+
+    def head(self):
+        return self.buf[self.i] if self.i < len(self.buf) else None
+
+    def pop(self):
+        self.i += 1
+        return self.buf[self.i - 1]
+
+    def position(self):
+        # Desde dónde continuar en la página siguiente
+        if self.i < len(self.buf):
+            if self.i == 0:
+                return self.start
+            last = self.buf[self.i - 1]
+            return {"IDTransaccion": last["IDTransaccion"], self.hattr: last[self.hattr], self.rattr: last[self.rattr]}
+        return self.lek or "x"
+
+FILL_ROUNDS = 5
+# Con varias claves cada flujo pide una fracción de la página (con este mínimo
+# para no multiplicar las rondas cuando una clave concentra los resultados)
+STREAM_LIMIT_MIN = 25
+
+def _stream_limit(limit, n_keys):
+    if n_keys <= 1:
+        return limit
+    return min(limit, max(-(-limit // n_keys), STREAM_LIMIT_MIN))
+
+def _shard_limit(limit, n_shards):
+    # Los shards se reparten por hash: cada uno aporta ~limit/n por página (+ holgura)
+    return min(limit, -(-limit * 3 // (2 * n_shards)) + 2)
+
+def _plan(table, index_tries, values, ranges, limit):
+    # (índice, valor hash, rango, límite por página) de cada flujo, en orden estable
+    per_key = _stream_limit(limit, len(values))
+    hot = any(shard_count(v) for v in values)
+    con_shards = {t[0] for t in index_tries if hot and t[0] in SHARD_INDEXES and _index_present(table, t)}
+    plan = []
+    for v in values:
+        for n, t in enumerate(index_tries):
+            hvs = hash_values(t, v, con_shards)
+            lim = _shard_limit(per_key, len(hvs)) if hvs and t[0] in SHARD_INDEXES else per_key
+            plan.extend((t, hv, ranges[n], lim) for hv in hvs)
+    return plan
+
+def _fill(streams):
+    # Con FilterExpression una página puede volver vacía: se reintenta unas
+    # pocas rondas; si sigue vacía, la página se corta y el cursor continúa.
+    for _ in range(FILL_ROUNDS):
+        need = [s for s in streams if s.needs_fetch()]
+        if not need:
+            return
+        if len(need) == 1:
+            need[0].fetch()
+        else:
+            list(_pool.map(lambda s: s.fetch(), need))
+
+def merged_page(table, index_tries, value, ranges, limit, state=None, filter_expr=None, projection=None):
+    # Consulta todos los índices en paralelo y mezcla los flujos por fecha
+    # descendente, sin repetir IDTransaccion. Devuelve (items, siguiente_estado).
+    # value puede ser una lista de claves: un flujo por (clave, índice), en ese
+    # orden, y un solo orden temporal para todas. Los comercios hot se leen con
+    # un flujo por shard (scatter-gather) en lugar del índice sin shards.
+    # ranges=None: sin rango, lee desde el ítem más reciente y se detiene al
+    # cambiar de mes; el mes resuelto queda en siguiente_estado["r"].
+    values = value if isinstance(value, list) else [value]
+    state = state or {}
+    if ranges is None:
+        ranges = [(None, None)] * len(index_tries)
+    plan = _plan(table, index_tries, values, ranges, limit)
+    pos = state.get("p") or [None] * len(plan)
+    if len(pos) != len(plan):
+        raise CursorInvalido("El cursor no corresponde a esta consulta")  # cambió COMERCIOS_HOT
+    floor = None
+    streams = [_IndexStream(table, t, hv, r[0], r[1], lim, pos[n], filter_expr, projection)
+               for n, (t, hv, r, lim) in enumerate(plan)]
+    seen = set(state.get("s") or [])
+    out = []
+    while len(out) < limit:
+        _fill(streams)
+        if any(s.needs_fetch() for s in streams):
+            break  # no se puede ordenar sin la cabeza de cada índice
+        heads = [s for s in streams if s.head() is not None]
+        if not heads:
+            break
+        s = max(heads, key=lambda s: (_sort_ts(s.head()), s.head()["IDTransaccion"]))
+        if floor is None and ranges[0][0] is None:
+            floor = _sort_ts(s.head())[:7] + "-01 00:00:00"
+        if floor is not None and _sort_ts(s.head()) < floor:
+            # el ítem más nuevo de este índice ya es de un mes anterior
+            for o in heads:
+                if _sort_ts(o.head()) < floor:
+                    o.buf, o.i, o.lek, o.done = [], 0, None, True
+            continue
+        it = s.pop()
+        tid = it["IDTransaccion"]
+        if tid in seen:
+            continue
+        seen.add(tid)
+        out.append(it)
+        # el mismo ítem en otro índice (espejos legacy/nuevo) se consume a la vez
+        for o in streams:
+            h = o.head()
+            if o is not s and h is not None and h["IDTransaccion"] == tid:
+                o.pop()
+    if all(s.done and s.head() is None for s in streams):
+        return out, None
+    # IDs ya emitidos con la última marca de tiempo, para no repetirlos en empates
+    edge = [x["IDTransaccion"] for x in out if _sort_ts(x) == _sort_ts(out[-1])] if out else []
+    nxt = {"p": [s.position() for s in streams], "s": edge}
+    if floor is not None:
+        nxt["r"] = list(_mes(floor))
+    return out, nxt
+
+def _mes(ts):
+    # ("YYYY-MM-01", último día) del mes de un _sort_ts
+    start, end = month_bounds(datetime.strptime(ts[:7] + "-01", "%Y-%m-%d"))
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+def month_bounds(dt):
+    start = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    nm = start.replace(year=start.year+1, month=1) if start.month == 12 else start.replace(month=start.month+1)
+    end = nm - timedelta(seconds=1)
+    return start, end
+
+def index_ranges(index_tries, ini, fin):
+    # Completa "YYYY-MM-DD" con la hora y el separador de cada índice
+    ranges = []
+    for _idx, _hattr, _rattr, sep in index_tries:
+        ranges.append((ini if sep in ini else f"{ini}{sep}00:00:00", fin if sep in fin else f"{fin}{sep}23:59:59"))
+    return ranges
+
+def parse_key(params, key_name):
+    key = params.get(key_name)
+    if key is None or str(key).strip() == "":
+        raise ValueError(f"Falta {key_name}")
+    if isinstance(key, (list, dict, bool)):
+        raise ValueError(f"Parámetro '{key_name}' inválido: se espera un solo valor")
+    key = str(key).strip()
+    return int(key) if key.isdigit() else key
+
+def parse_keys(params, key_name):
+    # Una o varias claves: "1,2,3" en query string o lista en el body
+    raw = params.get(key_name)
+    if raw is None:
+        raise ValueError(f"Falta {key_name}")
+    if isinstance(raw, (dict, bool)) or (isinstance(raw, list) and any(isinstance(x, (list, dict, bool)) for x in raw)):
+        raise ValueError(f"Parámetro '{key_name}' inválido: se espera un valor o una lista de valores")
+    raw = raw if isinstance(raw, list) else str(raw).split(",")
+    keys = []
+    for x in raw:
+        x = str(x).strip()
+        if not x:
+            continue
+        k = int(x) if x.isdigit() else x
+        if k not in keys:
+            keys.append(k)
+    if not keys:
+        raise ValueError(f"Falta {key_name}")
+    if len(keys) > CLAVES_MAX:
+        raise ValueError(f"Máximo {CLAVES_MAX} valores de {key_name} por consulta")
+    return keys
+
+def search_params(event):
+    # Query string más, en POST, el body JSON ({"IDTarjeta": [...], "desde": ..., ...})
+    params = dict(event.get("queryStringParameters") or {})
+    body = event.get("body")
+    if body:
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise ValueError(f"JSON inválido: {e}")
+        if not isinstance(payload, dict):
+            raise ValueError("El body debe ser un objeto JSON")
+        params.update(payload)
+    return params
+
+_MES_RE = re.compile(r"^\d{4}-\d{2}$")
+_DIA_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def _fecha_param(params, p, regex, fmt, uso):
+    # Texto con el formato exacto (en el body JSON puede llegar cualquier tipo); None si no vino
+    raw = params.get(p)
+    if raw in (None, ""):
+        return None
+    try:
+        if not (isinstance(raw, str) and regex.match(raw)):
+            raise ValueError
+        return datetime.strptime(raw, fmt).replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError(f"Formato '{p}' inválido. Use {uso}")
+
+def resolve_range(params):
+    # (ini, fin) como "YYYY-MM-DD"; (None, None) = mes del último movimiento
+    fecha = _fecha_param(params, "fecha", _MES_RE, "%Y-%m", "YYYY-MM")
+    desde = _fecha_param(params, "desde", _DIA_RE, "%Y-%m-%d", "YYYY-MM-DD")
+    hasta = _fecha_param(params, "hasta", _DIA_RE, "%Y-%m-%d", "YYYY-MM-DD")
+    if fecha:
+        start, end = month_bounds(fecha)
+        return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    if desde and hasta:
+        return params["desde"], params["hasta"]
+    return None, None
+
+def iter_items(table, index_tries, value, ini, fin, page_size=None, filter_expr=None, projection=None,
+               rango=None):
+    # Recorre todo el rango página a página (memoria acotada a una página).
+    # Sin ini/fin, el dict rango (si se pasa) recibe el mes resuelto en "desde"/"hasta":
+    # el del ítem más reciente, como el piso de merged_page
+    page_size = page_size or LIMIT_MAX
+    ranges = index_ranges(index_tries, ini, fin) if ini and fin else None
+    state = None
+    while True:
+        out, nxt = merged_page(table, index_tries, value, ranges, page_size, state, filter_expr, projection)
+        if rango is not None and ranges is None and state is None and out:
+            rango["desde"], rango["hasta"] = _mes(_sort_ts(out[0]))
+        yield from out
+        if not nxt:
+            return
+        if ranges is None and nxt.get("r"):
+            ranges = index_ranges(index_tries, *nxt["r"])
+        state = nxt
+
+_FP_PARAMS = ("fecha", "desde", "hasta", "monto_min", "monto_max") + tuple(FILTERS)
+
+def _group(items, index_tries, keys):
+    # Vista por clave de una página ya mezclada (mismo orden dentro de cada grupo)
+    by_key = {str(k): [] for k in keys}
+    for it in items:
+        v = next((it[t[1]] for t in index_tries if t[1] in it), None)
+        by_key.setdefault(str(v), []).append(it)
+    return [{"clave": k, "count": len(by_key[str(k)]), "data": by_key[str(k)]} for k in keys]
+
+def buscar(table, index_tries, key_name, params):
+    # Flujo común de BusquedaCliente/Comercio/Tarjeta. Devuelve (status, body).
+    # Con varias claves (hasta CLAVES_MAX) todas se consultan en la misma
+    # invocación, con el pool acotado del contenedor, y comparten rango y cursor.
+    try:
+        keys = parse_keys(params, key_name)
+        limit = parse_limit(params)
+        fields = parse_fields(params)
+        filter_expr = parse_filter(params)
+        enrich = parse_enrich(params)
+    except ValueError as e:
+        return 400, {"ok": False, "msg": str(e)}
+    multi = len(keys) > 1 or isinstance(params.get(key_name), list)
+    key = keys if multi else keys[0]
+    grouped = str(params.get("agrupar", "")).strip().lower() == "clave"
+
+    # El cursor fija el rango resuelto en la primera página y sólo vale con los mismos filtros
+    fp = query_fingerprint(key_name, key, fields, *(params.get(p) for p in _FP_PARAMS))
+    state = None
+    if params.get("cursor"):
+        try:
+            state = decode_cursor(params["cursor"], fp)
+        except CursorInvalido as e:
+            return 400, {"ok": False, "msg": str(e)}
+        except SinCursorSecret as e:
+            return 500, {"ok": False, "msg": str(e)}
+
+    if state:
+        ini, fin = state["r"]
+    else:
+        try:
+            ini, fin = resolve_range(params)
+        except ValueError as e:
+            return 400, {"ok": False, "msg": str(e)}
+
+    # Sin fechas: el mes del último movimiento se resuelve en la misma lectura
+    ranges = index_ranges(index_tries, ini, fin) if ini and fin else None
+    try:
+        out, nxt = merged_page(table, index_tries, key, ranges, limit, state,
+                               filter_expr, projection_for(index_tries, campos(fields, enrich)))
+    except CursorInvalido as e:
+        return 400, {"ok": False, "msg": str(e)}
+    except ClientError as e:
+        return 500, {"ok": False, "msg": e.response.get("Error", {}).get("Message", str(e))}
+    if enrich:
+        enriquecer(out)
+    fields = campos_salida(fields, enrich)
+    cursor = None
+    if nxt:
+        nxt.setdefault("r", [ini, fin])
+        try:
+            cursor = encode_cursor(dict(nxt, q=fp))
+        except SinCursorSecret as e:
+            return 500, {"ok": False, "msg": str(e)}
+    if grouped:
+        groups = _group(out, index_tries, keys)
+        for g in groups:
+            g["data"] = trim_fields(g["data"], fields)
+        return 200, {"ok": True, "count": len(out), "grupos": groups, "cursor": cursor}
+    out = trim_fields(out, fields)
+    body = {"ok": True, "count": len(out), "data": out, "cursor": cursor}
+    if multi:
+        body["claves"] = keys
+    return 200, body
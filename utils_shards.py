@@ -0,0 +1,38 @@
+import os, zlib
+
+# Comercios "hot": sus transacciones llevan además IDComercioShard = "<IDComercio>#<n>",
+# repartidas por hash de IDTransaccion en n particiones de GSI_IDComercioShard_Fecha.
+# COMERCIOS_HOT = "123:16,456" (IDComercio[:shards]); sin shards explícitos, COMERCIO_SHARDS.
+SHARDS_DEFAULT = int(os.environ.get("COMERCIO_SHARDS", "8"))
+
+def _parse_hot(raw):
+    hot = {}
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        cid, _, n = part.partition(":")
+        hot[int(cid)] = int(n) if n.strip() else SHARDS_DEFAULT
+    return hot
+
+HOT = _parse_hot(os.environ.get("COMERCIOS_HOT", ""))
+
+def shard_count(id_comercio):
+    # 0 = comercio sin shards
+    try:
+        return HOT.get(int(id_comercio), 0)
+    except (TypeError, ValueError):
+        return 0
+
+def shard_key(id_comercio, id_transaccion):
+    # Estable por transacción: re-importar una fila la deja en el mismo shard.
+    # Subir la cantidad de shards de un comercio no pierde filas (se leen 0..n-1);
+    # bajarla sí, hasta re-importarlas.
+    n = HOT.get(id_comercio)
+    if not n:
+        return None
+    return f"{id_comercio}#{zlib.crc32(id_transaccion.encode()) % n}"
+
+def shard_keys(id_comercio):
+    n = shard_count(id_comercio)
+    return [f"{int(id_comercio)}#{i}" for i in range(n)]
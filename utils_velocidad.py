@@ -0,0 +1,94 @@
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from utils_agregados import add_counter
+
+# Contadores de velocidad por tarjeta (TablaVelocidadTarjeta): un ítem por
+# IDTarjeta y Dia ("YYYY-MM-DD") con la cantidad, el monto y los fraudes del día
+# (C, M, F), de cada hora (C10, M10, F10) y de cada minuto con actividad
+# (C1031, M1031, F1031). La importación hace un UpdateItem ADD por tarjeta/día
+# y lote; cualquier ventana de minutos, horas o días se responde con un Query
+# de a lo sumo dias+1 ítems, sin importar el largo del historial.
+TABLE_VEL      = os.environ.get("TABLA_VELOCIDAD_TARJETA", "TablaVelocidadTarjeta")
+RETENCION_DIAS = int(os.environ.get("VELOCIDAD_RETENCION_DIAS", "90"))  # TTL (Expira) de cada día
+
+# unidad -> (duración, máximo de unidades por ventana)
+UNIDADES = {
+    "minutos": (timedelta(minutes=1), 1440),
+    "horas": (timedelta(hours=1), RETENCION_DIAS * 24),
+    "dias": (timedelta(days=1), RETENCION_DIAS),
+}
+VENTANAS_DEFAULT = {"minutos": 60, "horas": 24, "dias": 7}
+
+@lru_cache(maxsize=1024)
+def _expira(dia):
+    d = datetime.strptime(dia, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return int((d + timedelta(days=RETENCION_DIAS + 1)).timestamp())
+
+def acumular(acc, row, prefijo=(), signo=1):
+    # Suma una fila confirmada a los contadores de su tarjeta/día (signo=-1: la resta)
+    idt = row.get("IDTarjeta")
+    if idt is None:
+        return
+    f = row["FechaHoraOrden"]  # YYYY-MM-DD#HH:MM:SS
+    dia, hh, hm = f[:10], f[11:13], f[11:13] + f[14:16]
+    monto = (row.get("Monto") or Decimal(0)) * signo
+    adds = {"C": signo, "M": monto, f"C{hh}": signo, f"M{hh}": monto, f"C{hm}": signo, f"M{hm}": monto}
+    if row.get("Fraude"):
+        adds.update({"F": signo, f"F{hh}": signo, f"F{hm}": signo})
+    add_counter(acc, prefijo + (idt, dia), adds, {"Expira": _expira(dia)})
+
+def parse_ventanas(params):
+    # {"minutos": n, ...} con lo pedido; sin nada, VENTANAS_DEFAULT
+    out = {}
+    for u, (_, maximo) in UNIDADES.items():
+        raw = (params or {}).get(u)
+        if raw in (None, ""):
+            continue
+        try:
+            n = int(str(raw).strip())
+        except ValueError:
+            raise ValueError(f"Parámetro '{u}' inválido")
+        if not 1 <= n <= maximo:
+            raise ValueError(f"Parámetro '{u}' debe estar entre 1 y {maximo}")
+        out[u] = n
+    return out or dict(VENTANAS_DEFAULT)
+
+def parse_hasta(params):
+    # Instante de referencia (UTC); por defecto, ahora
+    raw = (params or {}).get("hasta")
+    if raw in (None, ""):
+        return datetime.now(timezone.utc).replace(microsecond=0)
+    try:
+        return datetime.fromisoformat(str(raw).strip().replace(" ", "T")).replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError("Parámetro 'hasta' inválido. Use YYYY-MM-DDTHH:MM:SS")
+
+def _truncar(ref, unidad):
+    if unidad == "minutos":
+        return ref.replace(second=0, microsecond=0)
+    if unidad == "horas":
+        return ref.replace(minute=0, second=0, microsecond=0)
+    return ref.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def inicio(ref, unidad, n):
+    # Las n últimas unidades de calendario, incluida la que contiene a ref
+    paso, _ = UNIDADES[unidad]
+    return _truncar(ref, unidad) - paso * (n - 1)
+
+def sumar(dias, ref, unidad, n):
+    # dias: {"YYYY-MM-DD": ítem}. Devuelve cantidad, monto y fraudes de la ventana
+    paso, _ = UNIDADES[unidad]
+    t = inicio(ref, unidad, n)
+    c = f = 0
+    m = Decimal(0)
+    for _ in range(n):
+        it = dias.get(t.strftime("%Y-%m-%d"))
+        if it:
+            sufijo = "" if unidad == "dias" else t.strftime("%H" if unidad == "horas" else "%H%M")
+            c += int(it.get(f"C{sufijo}", 0))
+            m += it.get(f"M{sufijo}", 0)
+            f += int(it.get(f"F{sufijo}", 0))
+        t += paso
+    return {"cantidad": c, "monto": m, "fraude": f}